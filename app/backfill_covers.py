@@ -0,0 +1,97 @@
+import argparse
+import asyncio
+import time
+
+from . import sql_models
+from .cover_store import load_cover, save_cover, mirrored_recipe_ids, popular_recipe_ids
+from core.config import INGEST_SOURCE_FILE, LLM_MODEL_NAME, IMAGE_CONCURRENCY, IMAGE_RATE_PER_SEC
+from core.database import engine, ensure_column
+from core.generator import arefine_prompt_with_llm
+from core.image_scheduler import ImageScheduler
+from core.image_store import save_image
+from core.precompute_prompts import iter_recipes
+from core.recipe_store import recipe_store, prompt_source_hash
+
+
+async def backfill_one(recipe_id: str, name: str, tags: list, scheduler: ImageScheduler) -> bool:
+    # Prompt 优先级与在线一致：封面缓存 > 离线预计算 > LLM 优化 (带记忆)
+    prompt, _ = load_cover(recipe_id)
+    prompt = (prompt
+              or recipe_store.get_image_prompt(recipe_id, prompt_source_hash(name, tags, LLM_MODEL_NAME))
+              or await arefine_prompt_with_llm(name, tags, fallback=False))
+    # LLM 不可用 / 失败时用兜底 Prompt，交给生图请求套风格模板；兜底 Prompt 不写进封面缓存
+    is_refined = bool(prompt)
+    if not is_refined:
+        prompt = f"{name}, {', '.join(tags)}"
+    cached_prompt = prompt if is_refined else None
+
+    image_url = await scheduler.generate(prompt, is_refined=is_refined)
+    if not image_url:
+        return False
+    try:
+        data, content_type = await scheduler.download(image_url)
+    except Exception as e:
+        print(f"⚠️ [Backfill] 下载失败 {name}: {e}")
+        # 远程链接先存着，在线请求在过期前还能用
+        save_cover(recipe_id, cached_prompt, image_url)
+        return False
+
+    # 单条完成即落库：进程随时被杀，重跑时已完成的会被跳过
+    save_cover(recipe_id, cached_prompt, image_url, image_file=save_image(data, content_type))
+    return True
+
+
+async def backfill_covers(source_file: str = INGEST_SOURCE_FILE, limit: int = None,
+                          concurrency: int = IMAGE_CONCURRENCY, rate: float = IMAGE_RATE_PER_SEC):
+    """
+    离线回填封面图：按搜索热度排序，生成 -> 下载到本地 -> 写入封面缓存
+    """
+    catalog = {recipe_id: (name, tags) for recipe_id, name, tags in iter_recipes(source_file)}
+    done_ids = mirrored_recipe_ids()
+
+    # 搜索过的热门菜谱优先，其余按原顺序
+    popular = [rid for rid in popular_recipe_ids() if rid in catalog]
+    popular_set = set(popular)
+    order = popular + [rid for rid in catalog if rid not in popular_set]
+    pending = [rid for rid in order if rid not in done_ids]
+    if limit:
+        pending = pending[:limit]
+    print(f"📋 共 {len(catalog)} 道菜，已有本地封面 {len(done_ids)} 张，本次待处理 {len(pending)} 张 (并发 {concurrency}, 限速 {rate}/s)")
+
+    scheduler = ImageScheduler(concurrency=concurrency, rate=rate, burst=1)
+    window = max(1, concurrency * 4)  # 同时在途的任务数，防止一次性创建几万个协程
+    start = time.time()
+    succeeded, failed = 0, 0
+    try:
+        for i in range(0, len(pending), window):
+            batch = pending[i:i + window]
+            results = await asyncio.gather(
+                *(backfill_one(rid, *catalog[rid], scheduler) for rid in batch),
+                return_exceptions=True
+            )
+            for rid, ok in zip(batch, results):
+                if ok is True:
+                    succeeded += 1
+                else:
+                    failed += 1
+                    if isinstance(ok, Exception):
+                        print(f"❌ [Backfill] {rid} 出错: {ok}")
+            elapsed = max(time.time() - start, 1e-6)
+            print(f"   ✅ {succeeded + failed}/{len(pending)} 已处理 (成功 {succeeded}，失败 {failed})，{succeeded / elapsed * 60:.1f} 张/分钟")
+    finally:
+        await scheduler.aclose()
+
+    print(f"🎉 封面回填结束：成功 {succeeded} 张，失败 {failed} 张 (失败的下次运行会重试)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="离线回填菜谱封面图 (按搜索热度优先，可随时中断续跑)")
+    parser.add_argument("--source", default=INGEST_SOURCE_FILE, help="入库源文件")
+    parser.add_argument("--limit", type=int, default=None, help="本次最多生成多少张")
+    parser.add_argument("--concurrency", type=int, default=IMAGE_CONCURRENCY, help="并发生图数")
+    parser.add_argument("--rate", type=float, default=IMAGE_RATE_PER_SEC, help="每秒最多发起的生图请求数")
+    args = parser.parse_args()
+
+    sql_models.Base.metadata.create_all(bind=engine)
+    ensure_column("cover_images", "image_file", "VARCHAR")
+    asyncio.run(backfill_covers(args.source, args.limit, args.concurrency, args.rate))
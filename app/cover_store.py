@@ -0,0 +1,184 @@
+"""
+封面图缓存的读写 (users.db 中的 cover_images / recipe_search_stats 表)
+在线搜索和离线回填任务 (app.backfill_covers) 共用
+"""
+from datetime import datetime, timedelta
+from typing import Optional
+
+from . import sql_models
+from core.database import SessionLocal
+from core.config import IMAGE_MODEL_NAME, COVER_URL_TTL_SECONDS
+from core.image_store import find_image, local_image_url
+
+
+def load_cover(recipe_id: str):
+    """
+    读取封面缓存，返回 (prompt, image_url)
+    - 有本地镜像时返回本地地址，永不过期
+    - 远程链接已过期时只返回 prompt，省掉 LLM 优化这一步
+    """
+    if not recipe_id or recipe_id == 'unknown':
+        return None, None
+
+    db = SessionLocal()
+    try:
+        row = db.query(sql_models.CoverImage).filter(
+            sql_models.CoverImage.recipe_id == recipe_id,
+            sql_models.CoverImage.model_name == IMAGE_MODEL_NAME
+        ).first()
+        if not row:
+            return None, None
+        return row.prompt, _cover_url(row)
+    except Exception as e:
+        print(f"⚠️ [Cover] 读取缓存失败: {e}")
+        return None, None
+    finally:
+        db.close()
+
+
+def _cover_url(row) -> Optional[str]:
+    """本地镜像优先；远程链接超过有效期视为没有"""
+    if row.image_file and find_image(row.image_file):
+        return local_image_url(row.image_file)
+    image_url = row.image_url
+    if image_url and datetime.utcnow() - row.created_at > timedelta(seconds=COVER_URL_TTL_SECONDS):
+        image_url = None
+    return image_url
+
+
+def load_covers(recipe_ids: list) -> dict:
+    """
+    批量读取封面地址 {recipe_id: image_url}，只读缓存不生图 (收藏夹等按 ID 查询的场景)
+    """
+    recipe_ids = [rid for rid in recipe_ids if rid and rid != 'unknown']
+    if not recipe_ids:
+        return {}
+
+    db = SessionLocal()
+    try:
+        rows = db.query(sql_models.CoverImage).filter(
+            sql_models.CoverImage.recipe_id.in_(recipe_ids),
+            sql_models.CoverImage.model_name == IMAGE_MODEL_NAME
+        ).all()
+        covers = {}
+        for row in rows:
+            url = _cover_url(row)
+            if url:
+                covers[row.recipe_id] = url
+        return covers
+    except Exception as e:
+        print(f"⚠️ [Cover] 批量读取缓存失败: {e}")
+        return {}
+    finally:
+        db.close()
+
+
+def remote_cover_ttl(covers: dict) -> float:
+    """
+    远程封面链接还能用多少秒 (取最早过期的一条)，covers 为 {recipe_id: 远程图片地址}
+    查不到记录或链接已被新图替换时视为 0
+    """
+    if not covers:
+        return float(COVER_URL_TTL_SECONDS)
+
+    db = SessionLocal()
+    try:
+        rows = db.query(sql_models.CoverImage).filter(
+            sql_models.CoverImage.recipe_id.in_(list(covers)),
+            sql_models.CoverImage.model_name == IMAGE_MODEL_NAME
+        ).all()
+        created = {row.recipe_id: row.created_at for row in rows if row.image_url == covers.get(row.recipe_id)}
+        if len(created) < len(covers):
+            return 0.0
+        oldest = min(created.values())
+        return COVER_URL_TTL_SECONDS - (datetime.utcnow() - oldest).total_seconds()
+    except Exception as e:
+        print(f"⚠️ [Cover] 读取封面时间失败: {e}")
+        return 0.0
+    finally:
+        db.close()
+
+
+def save_cover(recipe_id: str, prompt: str, image_url: Optional[str], image_file: Optional[str] = None):
+    """
+    写回封面缓存 (按 recipe_id + 生图模型 覆盖更新)
+    生图失败时也保存 prompt，下次只需重新生图
+    """
+    if not recipe_id or recipe_id == 'unknown':
+        return
+
+    db = SessionLocal()
+    try:
+        row = db.query(sql_models.CoverImage).filter(
+            sql_models.CoverImage.recipe_id == recipe_id,
+            sql_models.CoverImage.model_name == IMAGE_MODEL_NAME
+        ).first()
+        if not row:
+            row = sql_models.CoverImage(recipe_id=recipe_id, model_name=IMAGE_MODEL_NAME)
+            db.add(row)
+        row.prompt = prompt
+        row.image_url = image_url
+        if image_file:
+            row.image_file = image_file
+        row.created_at = datetime.utcnow()
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"⚠️ [Cover] 写入缓存失败: {e}")
+    finally:
+        db.close()
+
+
+def mirrored_recipe_ids() -> set:
+    """已经有本地封面的菜谱 ID (离线回填断点续跑用)"""
+    db = SessionLocal()
+    try:
+        rows = db.query(sql_models.CoverImage.recipe_id).filter(
+            sql_models.CoverImage.model_name == IMAGE_MODEL_NAME,
+            sql_models.CoverImage.image_file.isnot(None)
+        ).all()
+        return {r[0] for r in rows}
+    finally:
+        db.close()
+
+
+def record_search_hits(recipe_ids: list):
+    """累加菜谱被搜索到的次数"""
+    recipe_ids = [rid for rid in dict.fromkeys(recipe_ids) if rid and rid != 'unknown']
+    if not recipe_ids:
+        return
+
+    db = SessionLocal()
+    try:
+        existing = {
+            row.recipe_id: row for row in db.query(sql_models.RecipeSearchStat).filter(
+                sql_models.RecipeSearchStat.recipe_id.in_(recipe_ids)
+            )
+        }
+        now = datetime.utcnow()
+        for rid in recipe_ids:
+            row = existing.get(rid)
+            if row is None:
+                db.add(sql_models.RecipeSearchStat(recipe_id=rid, hits=1, last_seen=now))
+            else:
+                row.hits = (row.hits or 0) + 1
+                row.last_seen = now
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"⚠️ [Cover] 记录搜索热度失败: {e}")
+    finally:
+        db.close()
+
+
+def popular_recipe_ids() -> list:
+    """按搜索热度从高到低返回菜谱 ID"""
+    db = SessionLocal()
+    try:
+        rows = db.query(sql_models.RecipeSearchStat.recipe_id).order_by(
+            sql_models.RecipeSearchStat.hits.desc(),
+            sql_models.RecipeSearchStat.last_seen.desc()
+        ).all()
+        return [r[0] for r in rows]
+    finally:
+        db.close()
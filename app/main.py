@@ -1,26 +1,93 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, FileResponse, Response, JSONResponse
+from contextlib import asynccontextmanager
+from typing import Optional
+import asyncio
+import json
+import time
 import uvicorn
 
 # 引入我们定义好的模型和服务
 from .models import QueryRequest, RecipeResponse, RecipeListResponse, ConsultRequest
 from .services import recipe_service
+from core.image_scheduler import image_scheduler
+from core.retriever import VectorDBManager, awarmup
+from core.generator import get_llm
+from core.memo import llm_memo
+from core.config import WARMUP_ON_STARTUP
+from core.image_store import find_image, find_thumbnail, content_type_for, image_etag, THUMBNAIL_SIZES
+
+class Readiness:
+    """
+    服务就绪状态：starting -> warming -> ready / failed
+    预热完成前 /readyz 返回 503，滚动发布时负载均衡只把流量切给已经预热好的 worker
+    """
+
+    def __init__(self):
+        self.status = "starting"
+        self.error = None
+        self.warmup_seconds = None
+
+    @property
+    def ready(self) -> bool:
+        return self.status == "ready"
+
+
+readiness = Readiness()
+
+
+async def warmup_models():
+    """后台预热：创建 LLM 客户端，加载向量库 / Embedding 模型 (及 BM25、精排模型) 并跑一次查询"""
+    readiness.status = "warming"
+    started = time.perf_counter()
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, get_llm)
+        if not await awarmup():
+            raise RuntimeError("向量库不可用")
+        readiness.status = "ready"
+        print(f"✅ [Startup] 预热完成，用时 {time.perf_counter() - started:.1f} 秒")
+    except Exception as e:
+        readiness.status, readiness.error = "failed", str(e)
+        print(f"❌ [Startup] 预热失败: {e}")
+    readiness.warmup_seconds = round(time.perf_counter() - started, 2)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 建表 / 默认用户在启动时完成 (导入模块不再有副作用)
+    init_database()
+    warmup_task = None
+    if WARMUP_ON_STARTUP:
+        # 不阻塞启动：服务先开始监听 (/healthz 可用)，模型在后台加载
+        warmup_task = asyncio.create_task(warmup_models())
+    else:
+        readiness.status = "ready"
+    yield
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+    # 退出时关闭生图连接池
+    await image_scheduler.aclose()
 
 # 初始化 APP
 app = FastAPI(
     title="AIChef RAG API",
     description="智能菜谱检索接口 - 返回包含步骤图的结构化数据",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # --- 数据库初始化 ---
 from . import sql_models
-from core.database import engine, SessionLocal, get_db
+from core.database import engine, SessionLocal, get_db, ensure_column
 from sqlalchemy.orm import Session
 from fastapi import Depends
 
-# 自动创建表结构 (如果不存在)
-sql_models.Base.metadata.create_all(bind=engine)
+def init_database():
+    """启动时执行：自动创建表结构 (如果不存在)、旧库补列、初始化默认用户"""
+    sql_models.Base.metadata.create_all(bind=engine)
+    ensure_column("cover_images", "image_file", "VARCHAR")
+    init_default_user()
 
 # 初始化默认用户 (方案 A)
 def init_default_user():
@@ -37,8 +104,6 @@ def init_default_user():
     finally:
         db.close()
 
-init_default_user()
-
 # --- 用户身份依赖 (User Dependency) ---
 from fastapi import Header
 
@@ -63,6 +128,7 @@ def get_current_user(
             db.refresh(user)
         except Exception as e:
             # 防止并发创建冲突
+            print(f"⚠️ Failed to create user {x_username}, retrying lookup: {e}")
             db.rollback()
             user = db.query(sql_models.User).filter(sql_models.User.username == x_username).first()
             if not user:
@@ -85,8 +151,23 @@ def health_check():
     """健康检查接口"""
     return {"status": "ok", "message": "AIChef API is running!"}
 
+@app.get("/healthz")
+def healthz():
+    """存活探针：进程在、事件循环能响应即可，不依赖模型是否加载完"""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+def readyz():
+    """就绪探针：后台预热完成 (向量库 / Embedding 模型已加载) 才返回 200，否则 503"""
+    body = {"status": readiness.status, "warmup_seconds": readiness.warmup_seconds}
+    if readiness.error:
+        body["error"] = readiness.error
+    if not readiness.ready:
+        return JSONResponse(status_code=503, content=body)
+    return body
+
 @app.post("/api/search", response_model=RecipeListResponse)
-def search_recipe(
+async def search_recipe(
     request: QueryRequest, 
     current_user: sql_models.User = Depends(get_current_user) # 注入当前用户
 ):
@@ -100,7 +181,7 @@ def search_recipe(
     user_prefs = current_user.preferences or {}
     print(f"👤 [Search] User: {current_user.username}, Prefs: {user_prefs}")
 
-    result = recipe_service.get_recipe_list_response(
+    result = await recipe_service.get_recipe_list_response(
         request.query, 
         request.limit, 
         request.refinement,
@@ -116,17 +197,154 @@ def search_recipe(
     
     return result
 
+def sse_event(event: str, data: dict) -> str:
+    """按 Server-Sent Events 格式编码一条消息"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/api/search/stream")
+async def search_recipe_stream(
+    request: QueryRequest, 
+    current_user: sql_models.User = Depends(get_current_user)
+):
+    """
+    🔍 流式搜索接口 (SSE)
+    检索完成后立即推送 candidates 事件，之后逐个推送 cover 事件 (封面图) 和 summary 事件 (AI 综述)，最后推送 done
+    """
+    if not request.query.strip():
+        raise HTTPException(status_code=400, detail="搜索词不能为空")
+
+    user_prefs = current_user.preferences or {}
+    print(f"👤 [Search/Stream] User: {current_user.username}, Prefs: {user_prefs}")
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    cache_key = recipe_service.search_cache_key(request.query, request.limit, request.refinement, user_prefs)
+    cached = recipe_service.get_cached_search(cache_key)
+    if cached:
+        await recipe_service.record_hits(cached.candidates)
+
+        async def cached_stream():
+            async for event, data in recipe_service.stream_cached_search(cached):
+                yield sse_event(event, data)
+        return StreamingResponse(cached_stream(), media_type="text/event-stream", headers=headers)
+
+    candidates = await recipe_service.search_candidates(
+        request.query, 
+        request.limit, 
+        request.refinement,
+        preferences=user_prefs
+    )
+    if not candidates:
+        raise HTTPException(
+            status_code=404, 
+            detail=f"抱歉，暂未收录关于“{request.query}”的菜谱，请尝试其他关键词。"
+        )
+    await recipe_service.record_hits(candidates)
+
+    async def event_stream():
+        async for event, data in recipe_service.stream_recipe_list(request.query, request.refinement, candidates, cache_key):
+            yield sse_event(event, data)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=headers)
+
 @app.post("/api/consult")
-def consult_chef_api(request: ConsultRequest):
+async def consult_chef_api(request: ConsultRequest):
     """
     AI 厨师交互接口
     """
     if not request.query.strip():
         raise HTTPException(status_code=400, detail="问题不能为空")
 
-    reply = recipe_service.consult_chef(request.query, request.context, request.history)
+    reply = await recipe_service.consult_chef(request.query, request.context, request.history)
     return {"reply": reply}
 
+@app.post("/api/consult/stream")
+async def consult_chef_stream_api(request: ConsultRequest, http_request: Request):
+    """
+    AI 厨师交互接口 (SSE 流式)
+    逐段推送 token 事件 ({"content": "..."})，结束时推送 done 事件
+    客户端断开后立即停止读取上游，不再消耗 Token
+    """
+    if not request.query.strip():
+        raise HTTPException(status_code=400, detail="问题不能为空")
+
+    async def event_stream():
+        tokens = recipe_service.stream_consult_chef(request.query, request.context, request.history)
+        try:
+            async for content in tokens:
+                if await http_request.is_disconnected():
+                    print("🔌 [Consult/Stream] 客户端已断开，停止生成")
+                    break
+                yield sse_event("token", {"content": content})
+            else:
+                yield sse_event("done", {})
+        finally:
+            await tokens.aclose()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# 单次批量查询的 ID 上限
+MAX_RECIPE_IDS = 100
+
+@app.get("/api/recipes", response_model=RecipeListResponse)
+def get_recipes(ids: str = ""):
+    """
+    按 ID 批量获取菜谱 (?ids=1,2,3)，收藏夹一次读取，不再逐个搜索
+    不存在的 ID 直接跳过，返回顺序与传入顺序一致
+    """
+    recipe_ids = [rid.strip() for rid in ids.split(",") if rid.strip()]
+    if len(recipe_ids) > MAX_RECIPE_IDS:
+        raise HTTPException(status_code=400, detail=f"一次最多查询 {MAX_RECIPE_IDS} 个菜谱")
+    return RecipeListResponse(candidates=recipe_service.get_recipes_by_ids(recipe_ids))
+
+@app.get("/api/recipes/{recipe_id}", response_model=RecipeResponse)
+def get_recipe(recipe_id: str):
+    """按 ID 获取单个菜谱详情"""
+    recipes = recipe_service.get_recipes_by_ids([recipe_id])
+    if not recipes:
+        raise HTTPException(status_code=404, detail="菜谱不存在")
+    return recipes[0]
+
+@app.get("/api/images/{name}")
+def get_local_image(name: str, request: Request, size: Optional[int] = None):
+    """
+    本地镜像的封面图 (内容寻址，文件内容永不变化，可以长期缓存)
+    size=256/512 返回 WebP 缩略图；未安装 Pillow 时退回原图
+    """
+    if size is not None and size not in THUMBNAIL_SIZES:
+        raise HTTPException(status_code=400, detail=f"size 仅支持 {list(THUMBNAIL_SIZES)}")
+    path = find_image(name)
+    if not path:
+        raise HTTPException(status_code=404, detail="图片不存在")
+
+    media_type = content_type_for(name)
+    if size:
+        thumb_path = find_thumbnail(name, size)
+        if thumb_path:
+            path, media_type = thumb_path, "image/webp"
+        else:
+            size = None
+
+    etag = image_etag(name, size)
+    headers = {"Cache-Control": "public, max-age=31536000, immutable", "ETag": etag}
+    # 浏览器带着 ETag 回来校验时直接 304，不再传输图片内容
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=media_type, headers=headers)
+
+@app.get("/api/cache/stats")
+def cache_stats():
+    """各层缓存的命中统计 (搜索结果 / 查询向量 / LLM 记忆表)"""
+    return {
+        "search": recipe_service.search_cache.stats(),
+        "query_embedding": VectorDBManager.embedding_cache_stats(),
+        "llm_memo": llm_memo.stats(),
+    }
+
 from .models import UserProfile
 # --- 用户相关接口 ---
 @app.get("/api/user/profile")
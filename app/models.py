@@ -25,6 +25,7 @@ class RecipeResponse(BaseModel):
     cover_image: Optional[str]
     steps: List[RecipeStep]
     message: str
+    cover_thumbnail: Optional[str] = None # 列表卡片用的缩略图 (仅本地镜像图才有)
 
 class RecipeListResponse(BaseModel):
     candidates: List[RecipeResponse]
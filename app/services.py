@@ -1,33 +1,53 @@
-import json
-import difflib
-import json
-import difflib
-import time
+import asyncio
+import hashlib
+import numpy as np
 from typing import Optional
 from .models import RecipeStep, RecipeResponse, RecipeListResponse
-from core.retriever import retrieve_docs
+from .cover_store import load_cover, load_covers, save_cover, record_search_hits, remote_cover_ttl
+from core.retriever import aretrieve_docs, afetch_doc_embeddings, is_confident_top
+from core.dedup import canonical_name, dedup_indices
+from core.cache import VersionedCache
+from core.memo import llm_memo, messages_fingerprint
+from core.recipe_store import recipe_store, normalize_tags, normalize_steps, prompt_source_hash
 # ✅ 引入新的优选函数
-from core.generator import smart_select_and_comment, generate_rag_answer, generate_food_image, refine_prompt_with_llm 
-from langchain_openai import ChatOpenAI
-from core.config import LLM_API_KEY, LLM_BASE_URL, LLM_MODEL_NAME
+from core.generator import asmart_select_and_comment, acomment_on_recipe, agenerate_rag_answer, arefine_prompt_with_llm, get_llm
+from core.reranker import reranker
+from core.image_scheduler import image_scheduler
+from core.image_store import save_image, local_image_url, is_local_image_url, thumbnail_url
+from core.config import LLM_MODEL_NAME, SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL, IMAGE_PROMPT_ONLINE_REFINE, RETRIEVAL_MAX_FETCH, HYBRID_RETRIEVAL, DEDUP_COSINE_THRESHOLD, SELECT_CONFIDENT_TOP
 
 class RecipeService:
     def __init__(self):
-        # 初始化 LLM 客户端
-        self.llm = None
-        if LLM_API_KEY:
-            self.llm = ChatOpenAI(model=LLM_MODEL_NAME, api_key=LLM_API_KEY, base_url=LLM_BASE_URL, temperature=0.7)
+        # 整条搜索响应的缓存，重新入库 (索引版本变化) 后自动清空
+        self.search_cache = VersionedCache(maxsize=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL)
 
-    def get_recipe_response(self, query: str) -> Optional[RecipeResponse]:
+        # 后台镜像任务 (持有引用，防止任务被垃圾回收)
+        self._mirror_tasks = set()
+
+    @property
+    def llm(self):
+        # 和 core.generator 共用一个懒加载的客户端，第一次调用 LLM 时才创建
+        return get_llm()
+
+    async def get_recipe_response(self, query: str) -> Optional[RecipeResponse]:
         print(f"🔍 [Service] 用户搜索: {query}")
         
         # 1. 【扩大召回】从数据库拿 Top 3，而不是 Top 1
         # 这样即使向量检索把最佳结果排在了第 2 或 第 3，AI 也能把它捞回来
-        candidates = retrieve_docs(query, top_k=6)
-        
+        # 混合检索 (BM25 + 向量) 的首轮召回更准，候选可以少取一些
+        candidates = await aretrieve_docs(query, top_k=4 if HYBRID_RETRIEVAL else 6)
+        if not candidates:
+            print("⚠️ [Service] 没有找到相关菜谱")
+            return None
+
         # 2. 【AI 优选】让大模型来挑，并生成推荐语
         # 返回值: (选中的索引, 推荐语)
-        selected_index, ai_message = smart_select_and_comment(query, candidates)
+        # 配置了本地精排模型时，候选已经按相关度排好，LLM 只负责写推荐语
+        # 向量和 BM25 两路的第一名一致时同理：直接选它，省掉一次 LLM 优选
+        if reranker.enabled or (SELECT_CONFIDENT_TOP and is_confident_top(candidates)):
+            selected_index, ai_message = 0, await acomment_on_recipe(query, candidates[0])
+        else:
+            selected_index, ai_message = await asmart_select_and_comment(query, candidates)
         
         # 确保索引不越界 (防止 AI 瞎返回 "index: 99")
         if selected_index < 0 or selected_index >= len(candidates):
@@ -38,58 +58,118 @@ class RecipeService:
         print(f"🎯 [Service] AI 选中了第 {selected_index} 项: {best_match['name']}")
 
 
-        # === 数据清洗与解析 ===
-        raw_instructions = best_match.get('instructions', [])
-        if isinstance(raw_instructions, str):
-            try: raw_instructions = json.loads(raw_instructions)
-            except: raw_instructions = []
-
-        raw_tags = best_match.get('tags', [])
-        if isinstance(raw_tags, str):
-            try: raw_tags = json.loads(raw_tags)
-            except: raw_tags = []
+        # === 菜谱详情：按 ID 从详情库取 (入库时已解析好)，旧数据退回解析 metadata ===
+        details = await asyncio.to_thread(recipe_store.get_recipe_details, [best_match.get('id')])
+        raw_tags, formatted_steps = self._recipe_payload(best_match, details.get(str(best_match.get('id'))))
 
-        formatted_steps = []
-        for idx, step in enumerate(raw_instructions):
-            img_link = step.get('image_url') or step.get('imgLink')
-            if not img_link or img_link == "null": img_link = None
-            
-            formatted_steps.append(
-                RecipeStep(
-                    step_index=idx + 1,
-                    description=step.get('description', ''),
-                    image_url=img_link
-                )
-            )
-
-        # === 核心修改：强制现场生成一张，因为数据库里的图不可用 ===
+        # === 核心修改：数据库里的旧图不可用，封面统一走生成图缓存 ===
         # cover_image = best_match.get('image') # 忽略旧图
-        
-        # 构造Prompt: 菜名 + 标签
-        # gen_prompt = f"{best_match.get('name', '')}, {','.join(raw_tags)}"
-         
-        # LLM 优化
-        refined_prompt = refine_prompt_with_llm(best_match.get('name', ''), raw_tags)
-        generated_url = generate_food_image(refined_prompt, is_refined=True)
-        
-        if generated_url:
-            cover_image = generated_url
-        else:
-            # 兜底：如果生图失败，暂时还是返回 None (或者原来的图，看需求)
-            cover_image = None
-                 # TODO: 这里应该异步把 cover_image 存回数据库，避免每次都生成
-                 # 为了演示方便，暂时只返回给前端显示
+        # 命中缓存则直接复用，否则 LLM 优化 Prompt + 生图，并写回缓存
+        cover_image = await self._resolve_cover(
+            str(best_match.get('id', '')), best_match.get('name', ''), raw_tags
+        )
 
         return RecipeResponse(
             recipe_id=str(best_match.get('id', 'unknown')),
             recipe_name=best_match.get('name', '未命名'),
             tags=raw_tags,
             cover_image=cover_image,
+            cover_thumbnail=thumbnail_url(cover_image),
             steps=formatted_steps,
             message=ai_message # 这里是 AI 针对选中菜谱写的推荐语
         )
 
-    def _optimize_query(self, query: str, refinement: str) -> str:
+    def get_recipes_by_ids(self, recipe_ids: list) -> list:
+        """
+        按 ID 直接查菜谱 (收藏夹 / 详情页刷新)：只读详情库和封面缓存，不走 Embedding、不调 LLM、不生图
+        按传入顺序返回，不存在的 ID 跳过
+        """
+        recipe_ids = [str(rid) for rid in dict.fromkeys(recipe_ids) if rid not in (None, "")]
+        details = recipe_store.get_recipe_details(recipe_ids)
+        covers = load_covers([rid for rid in recipe_ids if rid in details])
+
+        recipes = []
+        for rid in recipe_ids:
+            detail = details.get(rid)
+            if detail is None:
+                continue
+            tags, steps = self._recipe_payload({}, detail)
+            cover_image = covers.get(rid)
+            recipes.append(RecipeResponse.model_construct(
+                recipe_id=rid,
+                recipe_name=detail.get('name') or '未命名',
+                tags=tags,
+                cover_image=cover_image,
+                cover_thumbnail=thumbnail_url(cover_image),
+                steps=steps,
+                message=""
+            ))
+        return recipes
+
+    async def _resolve_cover(self, recipe_id: str, name: str, tags: list) -> Optional[str]:
+        """
+        获取封面图：先查缓存，未命中才 LLM 优化 Prompt + 生图
+        生图统一交给 image_scheduler (并发上限 + 限流)
+        """
+        prompt, cover_url = await asyncio.to_thread(load_cover, recipe_id)
+        if cover_url:
+            print(f"💾 [Cover] 命中缓存: {name}")
+            return cover_url
+
+        # 1. Prompt 优先级：封面缓存 > 离线预计算 (core.precompute_prompts) > 现场 LLM 优化 (防幻觉)
+        is_refined = True
+        if not prompt:
+            prompt = await asyncio.to_thread(
+                recipe_store.get_image_prompt, recipe_id, prompt_source_hash(name, tags, LLM_MODEL_NAME)
+            )
+        if not prompt and IMAGE_PROMPT_ONLINE_REFINE:
+            print(f"🧠 [Cover] Refining prompt for: {name}...")
+            prompt = await arefine_prompt_with_llm(name, tags, fallback=False)
+        if not prompt:
+            # 关闭了现场优化或 LLM 失败：用 "菜名, 标签" 兜底，由生图请求套上风格模板
+            prompt = f"{name}, {', '.join(tags)}"
+            is_refined = False
+        # 封面缓存只存优化过的 Prompt (命中后按已优化使用)，兜底 Prompt 不存，下次还会尝试优化
+        cached_prompt = prompt if is_refined else None
+
+        # 2. 调用生图 (带限流与重试)
+        new_url = await image_scheduler.generate(prompt, is_refined=is_refined)
+        await asyncio.to_thread(save_cover, recipe_id, cached_prompt, new_url)
+
+        # 3. 先把远程链接返回给用户，后台再下载到本地镜像，下次命中缓存就是本地图
+        if new_url:
+            task = asyncio.ensure_future(self._mirror_cover(recipe_id, cached_prompt, new_url))
+            self._mirror_tasks.add(task)
+            task.add_done_callback(self._mirror_tasks.discard)
+        return new_url
+
+    async def _mirror_cover(self, recipe_id: str, prompt: str, image_url: str) -> Optional[str]:
+        """
+        下载生成图到本地内容寻址目录 (core.image_store)，并把文件名写回封面缓存
+        """
+        try:
+            data, content_type = await image_scheduler.download(image_url)
+            image_file = await asyncio.to_thread(save_image, data, content_type)
+            await asyncio.to_thread(save_cover, recipe_id, prompt, image_url, image_file)
+            print(f"📥 [Cover] 已镜像到本地: {recipe_id} -> {image_file}")
+            return local_image_url(image_file)
+        except Exception as e:
+            print(f"⚠️ [Cover] 镜像失败 {recipe_id}: {e}")
+            return None
+
+    async def _fill_covers(self, items: list):
+        """
+        所有候选的 Prompt 优化 + 生图并发进行，限流由调度器统一把控
+        """
+        async def fill(item):
+            new_url = await self._resolve_cover(item.recipe_id, item.recipe_name, item.tags)
+            if new_url:
+                item.cover_image = new_url
+                item.cover_thumbnail = thumbnail_url(new_url)
+
+        await asyncio.gather(*(fill(item) for item in items if not item.cover_image))
+
+    async def _optimize_query(self, query: str, refinement: str) -> str:
         """
         利用 LLM 根据用户反馈优化搜索词
         """
@@ -108,156 +188,251 @@ class RecipeService:
         
         user_prompt = f"初始搜索词：{query}\n用户补充意见：{refinement}\n\n请重写搜索词："
         
+        from langchain_core.messages import SystemMessage, HumanMessage
+        messages = [
+            SystemMessage(content=system_prompt),
+            HumanMessage(content=user_prompt)
+        ]
+
+        # 同样的改写请求直接复用记忆表里的结果
+        memo_payload = messages_fingerprint(messages)
+        cached = await asyncio.to_thread(llm_memo.get, "optimize_query", memo_payload)
+        if cached:
+            print(f"💾 [Service] 搜索词优化命中记忆: '{query}' + '{refinement}' -> '{cached}'")
+            return cached
+
         try:
-             from langchain_core.messages import SystemMessage, HumanMessage
-             response = self.llm.invoke([
-                SystemMessage(content=system_prompt),
-                HumanMessage(content=user_prompt)
-             ])
+             response = await self.llm.ainvoke(messages)
              new_query = response.content.strip()
              print(f"🔄 [Service] 搜索词优化: '{query}' + '{refinement}' -> '{new_query}'")
+             await asyncio.to_thread(llm_memo.set, "optimize_query", memo_payload, new_query)
              return new_query
         except Exception as e:
             print(f"⚠️ Query optimization failed: {e}")
             return query
 
-    def get_recipe_list_response(self, query: str, limit: int = 5, refinement: str = None, preferences: dict = None) -> Optional[RecipeListResponse]:
+    async def record_hits(self, candidates: list):
+        """记录搜索热度，离线封面回填按热度优先处理"""
+        await asyncio.to_thread(record_search_hits, [c.recipe_id for c in candidates])
+
+    def search_cache_key(self, query: str, limit: int, refinement: str = None, preferences: dict = None) -> str:
+        """
+        搜索缓存键：归一化的 query / refinement + 忌口与过敏源的规范化哈希 + limit
+        """
+        preferences = preferences or {}
+        avoid = sorted({
+            str(x).strip().lower()
+            for x in (preferences.get("dislikes", []) or []) + (preferences.get("allergies", []) or [])
+            if x and str(x).strip()
+        })
+        prefs_hash = hashlib.sha1("|".join(avoid).encode("utf-8")).hexdigest()[:16]
+        normalize = lambda text: " ".join(str(text or "").split()).lower()
+        return f"{normalize(query)}\x1f{normalize(refinement)}\x1f{prefs_hash}\x1f{limit}"
+
+    def get_cached_search(self, cache_key: str) -> Optional[RecipeListResponse]:
+        """读取搜索缓存，返回深拷贝，调用方随意修改也不会污染缓存"""
+        cached = self.search_cache.get(cache_key)
+        return cached.model_copy(deep=True) if cached else None
+
+    async def cache_search(self, cache_key: str, result: RecipeListResponse):
+        """
+        写入搜索缓存 (封面为空或已镜像到本地的照常缓存)
+        远程封面链接会过期 (可能在封面缓存里已经放了将近 COVER_URL_TTL_SECONDS)，
+        这条缓存的有效期不超过其中最早过期的链接，不会发出过期的图片地址
+        """
+        if not result or not result.candidates:
+            return
+        remote = {
+            c.recipe_id: c.cover_image for c in result.candidates
+            if c.cover_image and not is_local_image_url(c.cover_image)
+        }
+        ttl = None
+        if remote:
+            ttl = await asyncio.to_thread(remote_cover_ttl, remote)
+            if ttl <= 0:
+                return
+        self.search_cache.set(cache_key, result.model_copy(deep=True), ttl=ttl)
+
+    async def get_recipe_list_response(self, query: str, limit: int = 5, refinement: str = None, preferences: dict = None) -> Optional[RecipeListResponse]:
         """
         获取多个菜谱推荐列表 (支持去重 + 上下文改进 + 用户偏好过滤)
         """
+        cache_key = self.search_cache_key(query, limit, refinement, preferences)
+        cached = self.get_cached_search(cache_key)
+        if cached:
+            print(f"💾 [Service] 命中搜索缓存: {query}")
+            await self.record_hits(cached.candidates)
+            return cached
+
+        formatted_list = await self.search_candidates(query, limit, refinement, preferences)
+        if not formatted_list:
+            return None
+        await self.record_hits(formatted_list)
+
+        # 并发生成图片 + LLM 防幻觉优化 (Concurrent + Anti-Hallucination)
+        # 针对免费模型：由 image_scheduler 的并发上限 + 令牌桶防止限流
+        # 针对幻觉问题：先用 DeepSeek 写 Prompt
+        # 封面生成和综述互不依赖，一起并发
+        _, list_summary = await asyncio.gather(
+            self._fill_covers(formatted_list),
+            self._summarize(query, refinement, formatted_list)
+        )
+
+        result = RecipeListResponse(
+            candidates=formatted_list,
+            ai_message=list_summary
+        )
+        await self.cache_search(cache_key, result)
+        return result
+
+    async def search_candidates(self, query: str, limit: int = 5, refinement: str = None, preferences: dict = None) -> Optional[list]:
+        """
+        只做检索 + 去重 + 格式化，不生图、不写综述 (流式接口可以先把列表推给前端)
+        """
         # 1. 如果有改进意见，先优化搜索词
         search_query = query
         if refinement:
-            search_query = self._optimize_query(query, refinement)
+            search_query = await self._optimize_query(query, refinement)
             
         print(f"🔍 [Service] 执行搜索: {search_query}, 目标数量: {limit}, 原始Query: {query}, 偏好: {preferences}")
         
-        # 2. 扩大召回 (为了去重，且保证数量够，我们取 3 倍)
-        # 此时传入 user preferences 进行底层过滤
-        candidates = retrieve_docs(search_query, top_k=limit * 3, preferences=preferences)
-        if not candidates:
-            # 如果优化后的词搜不到，尝试回退到原始词
-            if search_query != query:
+        # 2. 召回：忌口过滤已下推到向量查询里，这里只为去重多取一点；
+        #    去重后仍不够 limit 条时再按倍数扩大召回 (查询向量有缓存，重查只多一次向量检索)
+        fetch_k = limit + max(2, limit // 2)
+        while True:
+            candidates = await aretrieve_docs(search_query, top_k=fetch_k, preferences=preferences)
+            if not candidates and search_query != query:
+                # 如果优化后的词搜不到，尝试回退到原始词 (忌口过滤照常生效)
                 print("⚠️ 优化后的词无结果，回退到原始搜索词...")
-                candidates = retrieve_docs(query, top_k=limit * 3)
-                
+                search_query = query
+                continue
             if not candidates:
                 return None
-            
-        # 3. 去重与格式化
-        formatted_list = []
-        seen_names = [] # 存 (name, id) 用于比较
-
-        def is_similar(name1, name2):
-            # 简单去空格小写比较
-            n1 = name1.strip().lower()
-            n2 = name2.strip().lower()
-            if n1 == n2: return True
-            #由于菜谱名称往往较短，只要包含关系或相似度高都算重复
-            if n1 in n2 or n2 in n1: return True
-            return difflib.SequenceMatcher(None, n1, n2).ratio() > 0.8
-
-        for doc in candidates:
-            # 如果已经够数了，停止处理
-            if len(formatted_list) >= limit:
+
+            embeddings = await afetch_doc_embeddings([doc.get('id') for doc in candidates])
+            kept = self._dedup(candidates, limit, embeddings)
+            if len(kept) >= limit or len(candidates) < fetch_k or fetch_k >= RETRIEVAL_MAX_FETCH:
                 break
-                
+            fetch_k = min(fetch_k * 2, RETRIEVAL_MAX_FETCH)
+
+        # 3. 只为最终入选的菜谱批量取详情 (一条 SQL)，不在每次请求里解析 JSON
+        details = await asyncio.to_thread(recipe_store.get_recipe_details, [doc.get('id') for doc in kept])
+        return self._format_candidates(kept, details, refinement)
+
+    def _dedup(self, candidates: list, limit: int, embeddings: dict = None) -> list:
+        """
+        去重，最多保留 limit 条
+        去重键：入库时生成的规范化菜名 ("家常红烧肉" / "红烧肉（简易版）" -> "红烧肉")
+        + 文档向量余弦相似度 (一次矩阵乘法算出两两相似度)
+        """
+        keys = [doc.get('canonical_name') or canonical_name(doc.get('name', '')) for doc in candidates]
+        matrix = None
+        if embeddings:
+            dim = len(next(iter(embeddings.values())))
+            # 取不到向量的候选用零向量占位，只按菜名去重
+            zero = np.zeros(dim, dtype=np.float32)
+            matrix = np.stack([embeddings.get(str(doc.get('id')), zero) for doc in candidates])
+        return [candidates[i] for i in dedup_indices(keys, matrix, DEDUP_COSINE_THRESHOLD, limit)]
+
+    def _recipe_payload(self, doc: dict, detail: dict = None) -> tuple:
+        """
+        (标签列表, RecipeStep 列表)
+        详情库里的步骤入库时已规范化，直接 model_construct；没有详情的旧数据才解析 metadata 里的 JSON
+        """
+        if detail is None:
+            detail = {"tags": normalize_tags(doc.get('tags', [])), "steps": normalize_steps(doc.get('instructions', []))}
+        steps = [RecipeStep.model_construct(**step) for step in detail["steps"]]
+        return list(detail["tags"]), steps
+
+    def _format_candidates(self, docs: list, details: dict, refinement: str = None) -> list:
+        """
+        转成响应模型 (details 为按 ID 批量取回的菜谱详情)
+        """
+        formatted_list = []
+        for doc in docs:
             recipe_name = doc.get('name', '未命名')
-            
-            # 检查重复
-            is_dup = False
-            for existing_name in seen_names:
-                if is_similar(recipe_name, existing_name):
-                    is_dup = True
-                    break
-            
-            if is_dup:
-                continue
-                
-            seen_names.append(recipe_name)
-            
-            # --- 数据清洗 (保持原有逻辑) ---
-            raw_instructions = doc.get('instructions', [])
-            if isinstance(raw_instructions, str):
-                try: raw_instructions = json.loads(raw_instructions)
-                except: raw_instructions = []
-
-            raw_tags = doc.get('tags', [])
-            if isinstance(raw_tags, str):
-                try: raw_tags = json.loads(raw_tags)
-                except: raw_tags = []
-
-            # 格式化步骤
-            formatted_steps = []
-            for idx, step in enumerate(raw_instructions):
-                img_link = step.get('image_url') or step.get('imgLink')
-                if not img_link or img_link == "null": img_link = None
-                
-                formatted_steps.append(
-                    RecipeStep(
-                        step_index=idx + 1,
-                        description=step.get('description', ''),
-                        image_url=img_link
-                    )
-                )
-            
+
+            raw_tags, formatted_steps = self._recipe_payload(doc, details.get(str(doc.get('id'))))
+
             # 此处稍微调整得更有 AI 味一点
-            ai_comment = f"匹配度 {int(doc.get('score', 0) * 100)}%"
+            score = doc.get('score')
+            ai_comment = f"匹配度 {int(score * 100)}%" if score is not None else "关键词匹配"
             if refinement and "辣" in refinement and "辣" not in str(raw_tags):
                  ai_comment += " | 已为您筛选不辣的做法"
 
+            # 字段都来自入库时校验过的数据，跳过 pydantic 校验直接构造
             formatted_list.append(
-                RecipeResponse(
+                RecipeResponse.model_construct(
                     recipe_id=str(doc.get('id', 'unknown')),
                     recipe_name=recipe_name,
                     tags=raw_tags,
                     cover_image=None, # 强制置空，忽略数据库坏链，确保下方并发逻辑会为每个菜谱生图
+                    cover_thumbnail=None,
                     steps=formatted_steps,
                     message=ai_comment 
                 )
             )
 
-        # === 4. 并行生成图片 (Parallel Image Generation) ===
-        # === 4. 串行生成图片 + LLM 防幻觉优化 (Serial + Anti-Hallucination) ===
-        # 针对免费模型：必须串行以防限流
-        # 针对幻觉问题：先用 DeepSeek 写 Prompt
-        
-        for item in formatted_list:
-            if not item.cover_image:
-                # 1. LLM 优化 Prompt (防幻觉)
-                print(f"🧠 [List] Refining prompt for: {item.recipe_name}...")
-                refined_prompt = refine_prompt_with_llm(item.recipe_name, item.tags)
-                
-                # 2. 调用生图 (带重试)
-                print(f"🎨 [List] Generating image (Serial)...")
-                new_url = generate_food_image(refined_prompt, is_refined=True)
-                
-                if new_url:
-                    item.cover_image = new_url
-                
-                # 3. 冷却防止限流
-                time.sleep(1.5)
-
-        # 4. 生成综述
-        # 注意：这里传给 summarizer 的是原始 query (或者组合 query)，让 AI 知道用户意图
+        return formatted_list
+
+    async def _summarize(self, query: str, refinement: str, formatted_list: list) -> str:
+        """
+        生成列表综述
+        注意：这里传给 summarizer 的是原始 query (或者组合 query)，让 AI 知道用户意图
+        """
         user_intent = query
         if refinement:
             user_intent = f"{query} ({refinement})"
             
-        list_summary = generate_rag_answer(user_intent, [
+        return await agenerate_rag_answer(user_intent, [
             {'name': c.recipe_name, 'tags': c.tags} for c in formatted_list
         ])
 
-        return RecipeListResponse(
-            candidates=formatted_list,
-            ai_message=list_summary
-        )
+    async def stream_cached_search(self, cached: RecipeListResponse):
+        """命中搜索缓存时，一次性推送完整结果"""
+        yield "candidates", RecipeListResponse(candidates=cached.candidates).model_dump()
+        yield "summary", {"ai_message": cached.ai_message}
+        yield "done", {}
 
-    def consult_chef(self, query: str, context: str, history: list) -> str:
+    async def stream_recipe_list(self, query: str, refinement: str, formatted_list: list, cache_key: str = None):
         """
-        AI 顾问交互接口
+        流式推送搜索结果：先推送候选列表，再按完成顺序推送每张封面图和 AI 综述
+        产出 (event, data) 二元组；全部完成后写入搜索缓存
+        """
+        yield "candidates", RecipeListResponse(candidates=formatted_list).model_dump()
+
+        async def cover(item):
+            item.cover_image = await self._resolve_cover(item.recipe_id, item.recipe_name, item.tags)
+            item.cover_thumbnail = thumbnail_url(item.cover_image)
+            return "cover", {"recipe_id": item.recipe_id, "cover_image": item.cover_image, "cover_thumbnail": item.cover_thumbnail}
+
+        ai_message = None
+
+        async def summary():
+            nonlocal ai_message
+            ai_message = await self._summarize(query, refinement, formatted_list)
+            return "summary", {"ai_message": ai_message}
+
+        tasks = [asyncio.ensure_future(cover(item)) for item in formatted_list if not item.cover_image]
+        tasks.append(asyncio.ensure_future(summary()))
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # 客户端断开时取消还没完成的生图 / 综述
+            for task in tasks:
+                task.cancel()
+
+        if cache_key:
+            await self.cache_search(cache_key, RecipeListResponse(candidates=formatted_list, ai_message=ai_message))
+        yield "done", {}
+
+    def _build_consult_messages(self, query: str, context: str, history: list) -> list:
+        """
+        构建 AI 顾问的对话消息 (同步 / 流式接口共用)
         """
-        # 构建 prompt
+        from langchain_core.messages import SystemMessage, HumanMessage
+
         system_prompt = """
         你是一位高端家庭餐厅的主厨顾问。你的任务是根据当前的“搜索结果上下文”和“对话历史”，回答用户的追问。
         
@@ -282,21 +457,48 @@ class RecipeService:
 
         请主厨作答：
         """
-        
+        return [
+            SystemMessage(content=system_prompt),
+            HumanMessage(content=user_prompt)
+        ]
+
+    async def consult_chef(self, query: str, context: str, history: list) -> str:
+        """
+        AI 顾问交互接口
+        """
         if not self.llm:
              return "👨‍🍳 抱歉，AI 厨师目前无法连接大脑 (API Key Missing)。"
 
         try:
-            from langchain_core.messages import SystemMessage, HumanMessage
-            response = self.llm.invoke([
-                SystemMessage(content=system_prompt),
-                HumanMessage(content=user_prompt)
-            ])
+            response = await self.llm.ainvoke(self._build_consult_messages(query, context, history))
             return response.content.strip()
         except Exception as e:
             print(f"Chat Error: {e}")
             return "👨‍🍳 抱歉，厨房太忙了，请稍后再试。"
 
+    async def stream_consult_chef(self, query: str, context: str, history: list):
+        """
+        AI 顾问流式接口：上游每生成一段文字就立即产出
+        调用方停止迭代 (客户端断开) 时，生成器被关闭，上游连接随之断开，不再继续消耗 Token
+        """
+        if not self.llm:
+            yield "👨‍🍳 抱歉，AI 厨师目前无法连接大脑 (API Key Missing)。"
+            return
+
+        started = False
+        try:
+            async for chunk in self.llm.astream(self._build_consult_messages(query, context, history)):
+                content = chunk.content
+                if isinstance(content, list):
+                    content = "".join(c if isinstance(c, str) else c.get('text', '') for c in content)
+                if content:
+                    started = True
+                    yield content
+        except Exception as e:
+            print(f"Chat Stream Error: {e}")
+            if not started:
+                yield "👨‍🍳 抱歉，厨房太忙了，请稍后再试。"
+
 
 recipe_service = RecipeService()
 
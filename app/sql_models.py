@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, JSON, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, ForeignKey, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from core.database import Base
@@ -27,3 +27,28 @@ class UserFavorite(Base):
     saved_at = Column(DateTime, default=datetime.utcnow)
 
     user = relationship("User", back_populates="favorites")
+
+class CoverImage(Base):
+    """
+    生成封面图缓存：同一道菜 + 同一个生图模型只画一次
+    """
+    __tablename__ = "cover_images"
+    __table_args__ = (UniqueConstraint("recipe_id", "model_name", name="uq_cover_recipe_model"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    recipe_id = Column(String, index=True)  # 对应 ChromaDB 中的 ID
+    model_name = Column(String)             # 生图模型，例如 Kwai-Kolors/Kolors
+    prompt = Column(Text)                   # LLM 优化后的英文 Prompt
+    image_url = Column(String, nullable=True)
+    image_file = Column(String, nullable=True)  # 本地镜像文件名 (core.image_store，内容寻址)，有值时不受链接过期影响
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class RecipeSearchStat(Base):
+    """
+    菜谱被搜索到的次数，离线封面回填按热度排序
+    """
+    __tablename__ = "recipe_search_stats"
+
+    recipe_id = Column(String, primary_key=True)
+    hits = Column(Integer, default=0)
+    last_seen = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,126 @@
+import os
+import pickle
+import re
+
+import numpy as np
+
+try:
+    import jieba
+    jieba.setLogLevel(60)
+except ImportError:  # 可选依赖：没有 jieba 时用单字 + 二元字串切分
+    jieba = None
+
+# 连续的中文 / 连续的字母数字，其余字符 (标点、空白) 都作为分隔
+_RUN_PATTERN = re.compile(r'[一-鿿]+|[a-z0-9]+')
+
+
+def tokenize(text: str) -> list:
+    """
+    中文分词：默认对每段连续中文取单字 + 二元字串 ("土豆牛肉" -> 土, 豆, 牛, 肉, 土豆, 豆牛, 牛肉)
+    安装了 jieba 时改用搜索引擎模式分词，另外保留单字以兼容单字查询 ("鱼")
+    """
+    tokens = []
+    for run in _RUN_PATTERN.findall(str(text or "").lower()):
+        if not ('一' <= run[0] <= '鿿'):
+            tokens.append(run)
+            continue
+        tokens.extend(run)
+        if jieba is not None:
+            tokens.extend(word for word in jieba.lcut_for_search(run) if len(word) > 1)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+class BM25Index:
+    """
+    内存 BM25 倒排索引
+    构建时就把每个 (词, 文档) 的 BM25 权重算好，查询只需要把命中词的权重数组累加 (numpy)
+    """
+
+    def __init__(self, texts: list, k1: float = 1.5, b: float = 0.75):
+        self.size = len(texts)
+        postings = {}
+        lengths = np.zeros(self.size, dtype=np.float32)
+        for doc_id, text in enumerate(texts):
+            tokens = tokenize(text)
+            lengths[doc_id] = len(tokens)
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, tf in counts.items():
+                postings.setdefault(token, ([], []))
+                postings[token][0].append(doc_id)
+                postings[token][1].append(tf)
+
+        avgdl = float(lengths.mean()) if self.size else 1.0
+        norm = k1 * (1 - b + b * lengths / max(avgdl, 1e-6))
+        self._postings = {}
+        for token, (doc_ids, tfs) in postings.items():
+            doc_ids = np.asarray(doc_ids, dtype=np.int32)
+            tfs = np.asarray(tfs, dtype=np.float32)
+            idf = np.log(1 + (self.size - len(doc_ids) + 0.5) / (len(doc_ids) + 0.5))
+            self._postings[token] = (doc_ids, (idf * tfs * (k1 + 1) / (tfs + norm[doc_ids])).astype(np.float32))
+
+    def search(self, query: str, k: int = 10, min_score_ratio: float = 0.0) -> list:
+        """
+        返回 [(文档下标, 分数), ...]，按分数从高到低
+        查询里有多字词 (二元字串 / jieba 词 / 英文单词) 时，文档至少要命中其中一个，只共享单字 ("肉") 的不算命中；
+        min_score_ratio: 分数低于 "每个查询词都取最高权重" 之和的这个比例的文档也丢弃
+        """
+        if not self.size or k <= 0:
+            return []
+        tokens = set(tokenize(query))
+        scores = np.zeros(self.size, dtype=np.float32)
+        phrase_hit = np.zeros(self.size, dtype=bool) if any(len(t) > 1 for t in tokens) else None
+        best = 0.0
+        for token in tokens:
+            posting = self._postings.get(token)
+            if posting is None:
+                continue
+            scores[posting[0]] += posting[1]
+            best += float(posting[1].max())
+            if phrase_hit is not None and len(token) > 1:
+                phrase_hit[posting[0]] = True
+        if phrase_hit is not None:
+            scores[~phrase_hit] = 0
+        if min_score_ratio > 0:
+            scores[scores < min_score_ratio * best] = 0
+
+        hit_count = int(np.count_nonzero(scores))
+        if not hit_count:
+            return []
+        k = min(k, hit_count)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i])) for i in top]
+
+    def __len__(self):
+        return self.size
+
+
+def save_index(path: str, texts: list, metadatas: list):
+    """
+    构建 BM25 索引并连同文档正文 / metadata 一起落盘 (入库时调用)
+    先写临时文件再原子替换，在线进程不会读到半截文件
+    """
+    texts = [text or "" for text in texts]
+    payload = {"index": BM25Index(texts), "texts": texts, "metadatas": [meta or {} for meta in metadatas]}
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def load_index(path: str):
+    """读取入库时落盘的索引，返回 (BM25Index, 正文列表, metadata 列表)；文件不存在或损坏时返回 None"""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            payload = pickle.load(f)
+        return payload["index"], payload["texts"], payload["metadatas"]
+    except Exception as e:
+        print(f"⚠️ [BM25] 索引文件读取失败，将现场重建: {e}")
+        return None
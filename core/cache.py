@@ -0,0 +1,161 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from core.config import INDEX_VERSION_PATH, ACTIVE_COLLECTION_PATH, COLLECTION_NAME, LEXICAL_INDEX_DIR
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    线程安全的内存缓存：LRU 淘汰 + 可选过期时间 (TTL)，自带命中统计
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = None):
+        self.maxsize = max(1, maxsize)
+        self.ttl = ttl if ttl and ttl > 0 else None
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()  # key -> (expire_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                expire_at, value = entry
+                if expire_at is None or expire_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl: float = None):
+        """ttl: 这一条的有效期 (秒)，不超过整个缓存的 ttl"""
+        if ttl is None or (self.ttl and ttl > self.ttl):
+            ttl = self.ttl
+        expire_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (expire_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+    def __len__(self):
+        return len(self._data)
+
+
+class VersionedCache(TTLCache):
+    """
+    绑定数据版本的缓存：每次读取时比对版本号，版本变化 (例如重新入库) 则整层清空
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = None, version_fn=None):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self.version_fn = version_fn or read_index_version
+        self.version = self.version_fn()
+        self.invalidations = 0
+
+    def _check_version(self):
+        current = self.version_fn()
+        if current != self.version:
+            self.clear()
+            self.version = current
+            self.invalidations += 1
+
+    def get(self, key, default=None):
+        self._check_version()
+        return super().get(key, default)
+
+    def set(self, key, value, ttl: float = None):
+        self._check_version()
+        super().set(key, value, ttl)
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats["version"] = self.version
+        stats["invalidations"] = self.invalidations
+        return stats
+
+
+_memo_lock = threading.Lock()
+_file_memo = {}  # path -> (mtime_ns, content)
+
+
+def _read_memoized(path: str) -> str:
+    """读取小文件内容 (按 mtime 记忆，热路径上只有一次 stat)；文件不存在返回空字符串"""
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return ""
+    with _memo_lock:
+        cached = _file_memo.get(path)
+        if cached is None or cached[0] != mtime:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    cached = (mtime, f.read().strip())
+            except OSError:
+                return cached[1] if cached else ""
+            _file_memo[path] = cached
+        return cached[1]
+
+
+def _write_atomic(path: str, content: str):
+    """先写临时文件再原子替换，其他进程不会读到半截内容"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def read_index_version() -> str:
+    """读取向量库版本号"""
+    return _read_memoized(INDEX_VERSION_PATH)
+
+
+def bump_index_version() -> str:
+    """
+    写入新的向量库版本号 (入库完成后调用)
+    """
+    version = f"{int(time.time())}-{uuid.uuid4().hex[:8]}"
+    _write_atomic(INDEX_VERSION_PATH, version)
+    return version
+
+
+def read_active_collection() -> str:
+    """
+    当前在线使用的向量库 collection 名 (入库在影子 collection 里建好后再切换指针)
+    没有指针文件时是旧版全量入库的默认 collection
+    """
+    return _read_memoized(ACTIVE_COLLECTION_PATH) or COLLECTION_NAME
+
+
+def lexical_index_path(collection_name: str) -> str:
+    """collection 对应的 BM25 索引文件 (入库时写入，随旧 collection 一起清理)"""
+    return os.path.join(LEXICAL_INDEX_DIR, f"{collection_name}.pkl")
+
+
+def write_active_collection(name: str):
+    """原子切换在线 collection，需在 bump_index_version 之前调用"""
+    _write_atomic(ACTIVE_COLLECTION_PATH, name)
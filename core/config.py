@@ -25,6 +25,106 @@ LLM_BASE_URL = os.getenv("SILICONFLOW_BASE_URL")
 LLM_MODEL_NAME = (os.getenv("SILICONFLOW_MODEL_NAME") or "").split("#")[0].strip()
 IMAGE_MODEL_NAME = os.getenv("SILICONFLOW_IMAGE_MODEL", "Qwen/Qwen-Image").strip()
 
+# 4. 封面图缓存配置
+# SiliconFlow 返回的图片链接大约 1 小时后失效，超过该时长的缓存只复用 Prompt，图片重新生成
+COVER_URL_TTL_SECONDS = int(os.getenv("COVER_URL_TTL_SECONDS", "3600"))
+
+# 5. 生图调度配置 (并发上限 + 令牌桶限流)
+# 默认值按免费版 Kolors 的限流设置；付费版可以调大并发和速率
+IMAGE_CONCURRENCY = int(os.getenv("IMAGE_CONCURRENCY", "2"))
+IMAGE_RATE_PER_SEC = float(os.getenv("IMAGE_RATE_PER_SEC", "0.6"))   # 每秒允许发起的生图请求数，<=0 表示不限速
+IMAGE_RATE_BURST = int(os.getenv("IMAGE_RATE_BURST", "1"))           # 令牌桶容量 (允许的瞬时突发数)
+IMAGE_MAX_RETRIES = int(os.getenv("IMAGE_MAX_RETRIES", "3"))
+
+# 6. 检索线程池：Embedding + Chroma 查询是 CPU 密集操作，放在独立线程池里，不占用事件循环
+RETRIEVAL_WORKERS = int(os.getenv("RETRIEVAL_WORKERS", "4"))
+
+# 7. 查询向量缓存 (热门搜索词不再重复跑 Embedding)
+QUERY_EMBED_CACHE_SIZE = int(os.getenv("QUERY_EMBED_CACHE_SIZE", "4096"))
+QUERY_EMBED_CACHE_TTL = int(os.getenv("QUERY_EMBED_CACHE_TTL", "86400"))   # 秒，<=0 表示不过期
+# 磁盘层：重启后依然有效，设为空字符串即关闭
+QUERY_EMBED_CACHE_PATH = os.getenv("QUERY_EMBED_CACHE_PATH", os.path.join(ROOT_DIR, "data", "query_embedding_cache.db"))
+QUERY_EMBED_CACHE_DISK_MAX_ROWS = int(os.getenv("QUERY_EMBED_CACHE_DISK_MAX_ROWS", "200000"))
+
+# 8. 搜索结果缓存 (整条 /api/search 响应)
+# 含远程封面链接的结果，有效期不超过链接剩余的有效期 (见 RecipeService.cache_search)
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "1024"))
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", "900"))
+# 向量库版本标记：ingest 完成后更新，依赖向量库的缓存据此自动失效
+INDEX_VERSION_PATH = os.path.join(ROOT_DIR, "data", "index_version")
+# 当前在线的 collection 名 (增量入库先写影子 collection，完成后原子切换)
+ACTIVE_COLLECTION_PATH = os.path.join(ROOT_DIR, "data", "active_collection")
+
+# 9. LLM 小变换记忆表 (搜索词改写 / 生图 Prompt 优化)，SQLite 文件，多个 worker 进程共享
+LLM_MEMO_PATH = os.getenv("LLM_MEMO_PATH", os.path.join(ROOT_DIR, "data", "llm_memo.db"))
+LLM_MEMO_MAX_ROWS = int(os.getenv("LLM_MEMO_MAX_ROWS", "50000"))
+# 命中时刷新 "最近使用时间" 的最小间隔 (秒)，淘汰只需要粗粒度的时间，不必每次命中都写库
+LLM_MEMO_TOUCH_INTERVAL = float(os.getenv("LLM_MEMO_TOUCH_INTERVAL", "3600"))
+
+# 入库源文件 (preprocessing 流水线的最终产物)
+INGEST_SOURCE_FILE = os.getenv("INGEST_SOURCE_FILE", os.path.join(ROOT_DIR, "data", "recipe_rag_ready_fixed.json"))
+
+# 10. 菜谱离线数据 (预计算的生图 Prompt 等)，按菜谱 ID 索引
+RECIPE_STORE_PATH = os.getenv("RECIPE_STORE_PATH", os.path.join(ROOT_DIR, "data", "recipe_store.db"))
+# 在线请求遇到没有预计算 Prompt 的菜谱时，是否现场调用 LLM 优化
+# 默认关闭：直接用 "菜名, 标签" 兜底，Prompt 由入库时的预计算 (core.precompute_prompts) 负责
+IMAGE_PROMPT_ONLINE_REFINE = os.getenv("IMAGE_PROMPT_ONLINE_REFINE", "0") == "1"
+# 解析好的菜谱详情 (标签 / 步骤) 的内存缓存条数
+RECIPE_DETAIL_CACHE_SIZE = int(os.getenv("RECIPE_DETAIL_CACHE_SIZE", "4096"))
+
+# 11. 本地图片镜像 (内容寻址目录)，SiliconFlow 的图片链接会过期，封面需要下载到本地
+IMAGE_STORE_DIR = os.getenv("IMAGE_STORE_DIR", os.path.join(ROOT_DIR, "data", "images"))
+
+# 12. 忌口过滤下推到向量查询；结果不够时按倍数扩大召回，直到凑够或达到上限
+RETRIEVAL_MAX_FETCH = int(os.getenv("RETRIEVAL_MAX_FETCH", "200"))
+# 倒排索引排除的菜谱数不超过该值时，直接以 {"id": {"$nin": [...]}} 下推到向量查询
+RETRIEVAL_NIN_MAX = int(os.getenv("RETRIEVAL_NIN_MAX", "1000"))
+
+# 13. 混合检索：BM25 关键词召回 + 向量召回，用 RRF (倒数排名融合) 合并
+HYBRID_RETRIEVAL = os.getenv("HYBRID_RETRIEVAL", "1") == "1"
+RRF_K = int(os.getenv("RRF_K", "60"))
+# BM25 命中的最低分 (相对于查询能拿到的满分)，低于它的关键词结果不参与融合，避免无关菜谱挤掉 "暂未收录"
+BM25_MIN_SCORE_RATIO = float(os.getenv("BM25_MIN_SCORE_RATIO", "0.25"))
+# BM25 索引在入库时构建并落盘 (按 collection 名存放)，在线各 worker 直接加载，不再全量读向量库重建
+LEXICAL_INDEX_DIR = os.getenv("LEXICAL_INDEX_DIR", os.path.join(ROOT_DIR, "data", "bm25"))
+# 融合后的第一名在向量和 BM25 两路里都排第一时直接选它，不再让 LLM 从候选里挑 (只写推荐语)
+SELECT_CONFIDENT_TOP = os.getenv("SELECT_CONFIDENT_TOP", "1") == "1"
+
+# 14. 本地 Cross-Encoder 精排 (可选)，例如 "BAAI/bge-reranker-base"；留空则不启用，仍由 LLM 挑选
+# 启用后排序在本地完成，LLM 只负责写推荐语
+RERANKER_MODEL_NAME = os.getenv("RERANKER_MODEL_NAME", "")
+RERANKER_MAX_LENGTH = int(os.getenv("RERANKER_MAX_LENGTH", "512"))
+RERANKER_BATCH_SIZE = int(os.getenv("RERANKER_BATCH_SIZE", "16"))
+
+# 15. 候选去重：规范化菜名相同，或文档向量余弦相似度超过阈值，视为同一道菜
+DEDUP_COSINE_THRESHOLD = float(os.getenv("DEDUP_COSINE_THRESHOLD", "0.93"))
+
+# 16. 入库时离线聚类近重复菜谱 (向量近邻 + 菜名相似)，检索时每个簇只返回一条
+CLUSTER_COSINE_THRESHOLD = float(os.getenv("CLUSTER_COSINE_THRESHOLD", "0.92"))
+CLUSTER_NEIGHBORS = int(os.getenv("CLUSTER_NEIGHBORS", "10"))
+# 菜名不完全相同时，只允许增删字 (不允许替换) 且相似度不低于该值才算同一道菜
+CLUSTER_NAME_RATIO = float(os.getenv("CLUSTER_NAME_RATIO", "0.9"))
+# 只把每个簇的代表菜谱写入向量库 (索引更小，其余菜谱不可检索)
+INGEST_REPRESENTATIVES_ONLY = os.getenv("INGEST_REPRESENTATIVES_ONLY", "0") == "1"
+
+# 17. 流式入库：源文件边读边处理，每批解析 / 编码 / 写入的条数
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "256"))
+# CPU 上并行编码的进程数 (每个进程各加载一份模型)，0 = 按 CPU 核数自动选择，1 = 单进程；GPU 上始终单进程
+INGEST_EMBED_WORKERS = int(os.getenv("INGEST_EMBED_WORKERS", "0"))
+
+# 18. Embedding 推理后端："torch" (默认，HuggingFaceEmbeddings) / "onnx" (ONNX Runtime，不加载 torch，CPU 上启动快、占内存少)
+# ONNX 模型需要先导出一次：python -m core.embeddings --export；导出后可用 --parity 对比两个后端的向量
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").strip().lower()
+EMBEDDING_ONNX_DIR = os.getenv("EMBEDDING_ONNX_DIR", os.path.join(ROOT_DIR, "data", "onnx", "bge-small-zh-v1.5"))
+# 使用 INT8 动态量化的模型 (更快更小，向量和 FP32 略有差异)
+EMBEDDING_ONNX_QUANTIZED = os.getenv("EMBEDDING_ONNX_QUANTIZED", "1") == "1"
+# 推理线程数，0 = 由运行时决定
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))
+
+# 19. 启动预热：服务启动后在后台加载向量库 / Embedding 模型并跑一次查询，完成前 /readyz 返回 503
+# 关闭后模型在第一次搜索时才加载，/readyz 启动即就绪
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "1") == "1"
+
 
 
 # 简单检查
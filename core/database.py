@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker, declarative_base
 import os
 from core.config import ROOT_DIR
@@ -26,3 +26,17 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def ensure_column(table: str, column: str, ddl_type: str):
+    """
+    给已存在的表补充新列 (create_all 不会修改旧表结构)
+    """
+    inspector = inspect(engine)
+    if not inspector.has_table(table):
+        return
+    if column in {c["name"] for c in inspector.get_columns(table)}:
+        return
+    with engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+    print(f"🛠️ 数据库表 {table} 新增列 {column}")
@@ -0,0 +1,54 @@
+import re
+
+import numpy as np
+
+# 括号里的多是版本说明："红烧肉（简易版）"、"可乐鸡翅[新手必学]"
+_BRACKET_PATTERN = re.compile(r'[(（\[【《「][^)）\]】》」]*[)）\]】》」]')
+_NON_WORD_PATTERN = re.compile(r'[^0-9a-z一-鿿]+')
+# 不影响 "是哪道菜" 的修饰词，只在开头 / 结尾剥离
+_PREFIXES = ("超简单", "简单", "简易", "家常", "自制", "正宗", "美味", "懒人", "快手", "私房", "秘制", "经典", "营养", "好吃的", "好吃")
+_SUFFIXES = ("的做法", "做法", "简易版", "家常版", "懒人版", "版")
+
+
+def canonical_name(name: str) -> str:
+    """
+    菜名规范化 (入库时写进 metadata，作为去重键)
+    "红烧肉（简易版）" / "家常红烧肉" / "红烧肉的做法" -> "红烧肉"
+    """
+    text = _BRACKET_PATTERN.sub('', str(name or '').lower())
+    text = _NON_WORD_PATTERN.sub('', text)
+    changed = True
+    while changed:
+        changed = False
+        for prefix in _PREFIXES:
+            if text.startswith(prefix) and len(text) - len(prefix) >= 2:
+                text, changed = text[len(prefix):], True
+        for suffix in _SUFFIXES:
+            if text.endswith(suffix) and len(text) - len(suffix) >= 2:
+                text, changed = text[:-len(suffix)], True
+    return text
+
+
+def dedup_indices(keys: list, embeddings=None, threshold: float = 0.93, limit: int = None) -> list:
+    """
+    按顺序贪心去重，返回保留下来的下标
+    - keys: 规范化菜名，相同即重复
+    - embeddings: (n, d) 已归一化的文档向量，一次矩阵乘法得到两两余弦相似度，超过阈值即重复
+    """
+    sims = None
+    if embeddings is not None and len(embeddings):
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        sims = matrix @ matrix.T
+
+    kept, seen_keys = [], set()
+    for i, key in enumerate(keys):
+        if key and key in seen_keys:
+            continue
+        if sims is not None and kept and float(sims[i, kept].max()) >= threshold:
+            continue
+        kept.append(i)
+        if key:
+            seen_keys.add(key)
+        if limit and len(kept) >= limit:
+            break
+    return kept
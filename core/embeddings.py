@@ -0,0 +1,416 @@
+import argparse
+import importlib.util
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from core.cache import TTLCache
+from core.config import (
+    EMBEDDING_MODEL_NAME,
+    EMBEDDING_BACKEND,
+    EMBEDDING_ONNX_DIR,
+    EMBEDDING_ONNX_QUANTIZED,
+    EMBEDDING_THREADS,
+    INGEST_SOURCE_FILE,
+    QUERY_EMBED_CACHE_SIZE,
+    QUERY_EMBED_CACHE_TTL,
+    QUERY_EMBED_CACHE_PATH,
+    QUERY_EMBED_CACHE_DISK_MAX_ROWS,
+)
+
+# ONNX 导出目录里的文件
+ONNX_MODEL_FILE = "model.onnx"
+ONNX_INT8_MODEL_FILE = "model_int8.onnx"
+ONNX_CONFIG_FILE = "embedding_config.json"
+
+
+def detect_device() -> str:
+    """自动检测可用的加速设备 (torch 在这里才导入，ONNX 后端不需要它)"""
+    import torch
+
+    if torch.backends.mps.is_available():
+        return "mps"
+    if torch.cuda.is_available():
+        return "cuda"
+    return "cpu"
+
+
+def _onnx_cache_key(model_name: str, quantized: bool) -> str:
+    return f"{model_name}#onnx{'-int8' if quantized else ''}"
+
+
+def vector_key(embeddings: Embeddings) -> str:
+    """向量的来源 (模型 + 后端 + 精度)：不同来源的向量不能混在一个索引 / 缓存里"""
+    return getattr(embeddings, "cache_key", EMBEDDING_MODEL_NAME)
+
+
+def embedding_cache_key() -> str:
+    """
+    当前配置下 build_embeddings 会用的向量来源 (同 vector_key)，不用加载模型就能算出
+    ONNX 模型还没导出或运行时没装时 build_embeddings 会退回 torch，这里也一样
+    """
+    if EMBEDDING_BACKEND == "onnx" and all(importlib.util.find_spec(m) for m in ("onnxruntime", "tokenizers")):
+        model_file = ONNX_INT8_MODEL_FILE if EMBEDDING_ONNX_QUANTIZED else ONNX_MODEL_FILE
+        try:
+            with open(os.path.join(EMBEDDING_ONNX_DIR, ONNX_CONFIG_FILE), 'r', encoding='utf-8') as f:
+                model_name = json.load(f)["model_name"]
+            if os.path.exists(os.path.join(EMBEDDING_ONNX_DIR, model_file)):
+                return _onnx_cache_key(model_name, EMBEDDING_ONNX_QUANTIZED)
+        except (OSError, ValueError, KeyError):
+            pass
+    return EMBEDDING_MODEL_NAME
+
+
+def embedding_device() -> str:
+    """Embedding 实际运行的设备：ONNX 后端只跑 CPU"""
+    return "cpu" if EMBEDDING_BACKEND == "onnx" else detect_device()
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    ONNX Runtime 推理的 BAAI Embedding，不加载 torch
+    分词用 tokenizers (Rust 实现)，池化 / 截断长度沿用导出时 sentence-transformers 的配置，输出与 torch 版一致 (见 --parity)
+    """
+
+    def __init__(self, model_dir: str = EMBEDDING_ONNX_DIR, quantized: bool = EMBEDDING_ONNX_QUANTIZED,
+                 threads: int = EMBEDDING_THREADS, batch_size: int = 32):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(model_dir, ONNX_CONFIG_FILE), 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        model_file = ONNX_INT8_MODEL_FILE if quantized else ONNX_MODEL_FILE
+        if not os.path.exists(os.path.join(model_dir, model_file)):
+            raise FileNotFoundError(os.path.join(model_dir, model_file))
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads > 0:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, model_file), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=config["max_length"])
+        self.tokenizer.enable_padding(pad_id=config["pad_token_id"], pad_token=config["pad_token"])
+        self.pooling = config["pooling"]
+        self.batch_size = batch_size
+        # 向量来源 (见 vector_key)：查询向量缓存和入库的内容指纹都按它区分，不同后端 / 精度的向量不混用
+        self.cache_key = _onnx_cache_key(config['model_name'], quantized)
+
+    def _encode(self, texts: list) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": mask,
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        hidden = self.session.run(None, {k: v for k, v in feeds.items() if k in self.input_names})[0]
+        if self.pooling == "cls":
+            vectors = hidden[:, 0]
+        else:
+            weights = mask[:, :, None].astype(np.float32)
+            vectors = (hidden * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    def embed_documents(self, texts: list) -> list:
+        # 按长度排序后分批，同一批里补齐的 padding 最少
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            idx = order[start:start + self.batch_size]
+            for i, vector in zip(idx, self._encode([texts[i] for i in idx])):
+                vectors[i] = vector.tolist()
+        return vectors
+
+    def embed_query(self, text: str) -> list:
+        return self._encode([text])[0].tolist()
+
+
+def _build_torch_embeddings(device: str = None, threads: int = EMBEDDING_THREADS) -> Embeddings:
+    import torch
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    if threads > 0:
+        torch.set_num_threads(threads)
+    return HuggingFaceEmbeddings(
+        model_name=EMBEDDING_MODEL_NAME,
+        model_kwargs={'device': device or detect_device()},
+        encode_kwargs={'normalize_embeddings': True}
+    )
+
+
+def build_embeddings(device: str = None, threads: int = None) -> Embeddings:
+    """
+    构建 BAAI Embedding 模型 (检索和入库共用同一套参数)
+    EMBEDDING_BACKEND=onnx 时使用 ONNX Runtime；还没导出模型时提示后退回 torch
+    """
+    threads = EMBEDDING_THREADS if threads is None else threads
+    if EMBEDDING_BACKEND == "onnx":
+        try:
+            return OnnxEmbeddings(threads=threads)
+        except Exception as e:
+            print(f"⚠️ [Embeddings] ONNX 后端不可用，退回 torch (先运行 python -m core.embeddings --export): {e}")
+    return _build_torch_embeddings(device, threads)
+
+
+def export_onnx(output_dir: str = EMBEDDING_ONNX_DIR, quantize: bool = True):
+    """
+    把 sentence-transformers 模型导出成 ONNX (FP32)，再做 INT8 动态量化
+    一并保存分词器和池化配置，推理时不再需要 torch / transformers
+    依赖 torch / sentence-transformers 和 onnx / onnxruntime (pip install ".[onnx]")
+    """
+    required = ["torch", "sentence_transformers", "onnx"] + (["onnxruntime"] if quantize else [])
+    missing = [m for m in required if not importlib.util.find_spec(m)]
+    if missing:
+        raise ImportError(f"导出 ONNX 模型缺少依赖: {', '.join(missing)}，请先安装: pip install \".[onnx]\"")
+
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    print(f"🔄 正在导出 {EMBEDDING_MODEL_NAME} -> {output_dir}")
+    model = SentenceTransformer(EMBEDDING_MODEL_NAME, device="cpu")
+    transformer = model[0].auto_model.eval()
+    transformer.config.return_dict = False
+    tokenizer = model.tokenizer
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer.save_pretrained(output_dir)
+
+    sample = tokenizer(["土豆炖牛肉"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+    model_path = os.path.join(output_dir, ONNX_MODEL_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer, tuple(sample[name] for name in input_names), model_path,
+            input_names=input_names, output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes, opset_version=17, dynamo=False,
+        )
+    print(f"✅ FP32 模型: {model_path}")
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        int8_path = os.path.join(output_dir, ONNX_INT8_MODEL_FILE)
+        quantize_dynamic(model_path, int8_path, weight_type=QuantType.QInt8)
+        print(f"✅ INT8 模型: {int8_path}")
+
+    config = {
+        "model_name": EMBEDDING_MODEL_NAME,
+        "pooling": "cls" if model[1].pooling_mode_cls_token else "mean",
+        "max_length": model.max_seq_length,
+        "pad_token": tokenizer.pad_token,
+        "pad_token_id": tokenizer.pad_token_id,
+    }
+    with open(os.path.join(output_dir, ONNX_CONFIG_FILE), 'w', encoding='utf-8') as f:
+        json.dump(config, f, ensure_ascii=False, indent=2)
+
+
+def normalize_query(text: str) -> str:
+    """查询归一化：去掉首尾及多余空白、统一小写，作为缓存键"""
+    return " ".join(str(text).split()).lower()
+
+
+class _DiskVectorCache:
+    """
+    查询向量的磁盘层 (SQLite)，服务重启后依然有效
+    """
+
+    def __init__(self, path: str, model_name: str, max_rows: int):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.model_name = model_name
+        self.max_rows = max_rows
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS query_embeddings ("
+            " model TEXT NOT NULL, query TEXT NOT NULL, vector BLOB NOT NULL, created_at REAL NOT NULL,"
+            " PRIMARY KEY (model, query))"
+        )
+        self._conn.commit()
+
+    def get(self, query: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT vector FROM query_embeddings WHERE model = ? AND query = ?",
+                (self.model_name, query)
+            ).fetchone()
+        if not row:
+            return None
+        return np.frombuffer(row[0], dtype=np.float32).tolist()
+
+    def set(self, query: str, vector: list):
+        blob = np.asarray(vector, dtype=np.float32).tobytes()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO query_embeddings (model, query, vector, created_at) VALUES (?, ?, ?, ?)",
+                (self.model_name, query, blob, time.time())
+            )
+            self._writes += 1
+            # 定期清理最旧的记录，防止文件无限增长
+            if self.max_rows > 0 and self._writes % 500 == 0:
+                self._conn.execute(
+                    "DELETE FROM query_embeddings WHERE rowid IN ("
+                    " SELECT rowid FROM query_embeddings ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_rows,)
+                )
+            self._conn.commit()
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """
+    查询向量缓存：内存 LRU/TTL + 可选 SQLite 磁盘层
+    只缓存 embed_query (检索用)，embed_documents 直接透传给底层模型 (入库用)
+    """
+
+    def __init__(self, base: Embeddings, model_name: str = None,
+                 maxsize: int = QUERY_EMBED_CACHE_SIZE, ttl: float = QUERY_EMBED_CACHE_TTL,
+                 disk_path: str = QUERY_EMBED_CACHE_PATH, disk_max_rows: int = QUERY_EMBED_CACHE_DISK_MAX_ROWS):
+        self.base = base
+        # 磁盘缓存按模型 + 后端区分 (ONNX INT8 的向量和 torch 版略有差异)
+        model_name = model_name or vector_key(base)
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.disk = None
+        self.disk_hits = 0
+        if disk_path:
+            try:
+                self.disk = _DiskVectorCache(disk_path, model_name, disk_max_rows)
+            except Exception as e:
+                print(f"⚠️ [Embeddings] 磁盘缓存不可用，仅使用内存缓存: {e}")
+
+    def embed_documents(self, texts: list) -> list:
+        return self.base.embed_documents(texts)
+
+    def embed_query(self, text: str) -> list:
+        key = normalize_query(text)
+        vector = self.memory.get(key)
+        if vector is not None:
+            return vector
+
+        if self.disk is not None:
+            vector = self.disk.get(key)
+            if vector is not None:
+                self.disk_hits += 1
+                self.memory.set(key, vector)
+                return vector
+
+        # 用归一化后的文本编码，保证缓存结果和现算结果一致
+        vector = self.base.embed_query(key)
+        self.memory.set(key, vector)
+        if self.disk is not None:
+            try:
+                self.disk.set(key, vector)
+            except Exception as e:
+                print(f"⚠️ [Embeddings] 写入磁盘缓存失败: {e}")
+        return vector
+
+    def stats(self) -> dict:
+        stats = self.memory.stats()
+        stats["disk_enabled"] = self.disk is not None
+        stats["disk_hits"] = self.disk_hits
+        return stats
+
+
+# --- 后端一致性检查 ---
+_PARITY_QUERIES = [
+    "土豆炖牛肉", "不辣的家常菜", "适合减脂的晚餐", "红烧肉怎么做",
+    "快手早餐", "清淡的汤", "番茄炒蛋", "宝宝辅食", "下饭的川菜", "不用烤箱的甜点",
+]
+
+
+def _query_latency_ms(embeddings: Embeddings, queries: list, rounds: int = 3) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for query in queries:
+            embeddings.embed_query(query)
+    return (time.perf_counter() - started) * 1000 / (rounds * len(queries))
+
+
+def check_parity(sample_size: int = 200, min_cosine: float = 0.98, top_k: int = 10):
+    """
+    以 torch 版为基准，对比 ONNX FP32 / INT8 的向量：
+    逐条余弦相似度、查询在样本文档上的 top-k 检索重合率、单条查询耗时；最低余弦低于 min_cosine 视为不一致
+    返回 True / False；torch、ONNX Runtime 或导出的模型缺一样时无法对比，返回 None
+    """
+    missing = [m for m in ("torch", "langchain_huggingface", "onnxruntime", "tokenizers") if not importlib.util.find_spec(m)]
+    if missing:
+        print(f"⏭️ 缺少 {', '.join(missing)}，跳过一致性检查")
+        return None
+    if not os.path.exists(os.path.join(EMBEDDING_ONNX_DIR, ONNX_CONFIG_FILE)):
+        print(f"⏭️ 还没有导出 ONNX 模型 ({EMBEDDING_ONNX_DIR})，跳过一致性检查")
+        return None
+
+    docs = []
+    if os.path.exists(INGEST_SOURCE_FILE):
+        from core.json_stream import iter_records
+
+        for item in iter_records(INGEST_SOURCE_FILE):
+            docs.append(item['page_content'])
+            if len(docs) >= sample_size:
+                break
+    if not docs:
+        print(f"⚠️ 找不到入库源文件 {INGEST_SOURCE_FILE}，只用样例查询做对比")
+        docs = list(_PARITY_QUERIES)
+    queries = _PARITY_QUERIES
+    top_k = min(top_k, len(docs))
+
+    print(f"🔄 torch 基准: {len(docs)} 条文档 + {len(queries)} 条查询")
+    reference = _build_torch_embeddings("cpu")
+    ref_docs = np.asarray(reference.embed_documents(docs), dtype=np.float32)
+    ref_queries = np.asarray([reference.embed_query(q) for q in queries], dtype=np.float32)
+    ref_top = np.argsort(-(ref_queries @ ref_docs.T), axis=1)[:, :top_k]
+    print(f"   torch 单条查询耗时: {_query_latency_ms(reference, queries):.1f} ms")
+
+    ok = None
+    for quantized in (False, True):
+        label = "ONNX INT8" if quantized else "ONNX FP32"
+        try:
+            candidate = OnnxEmbeddings(quantized=quantized)
+        except Exception as e:
+            print(f"⏭️ {label} 不可用，跳过: {e}")
+            continue
+        doc_vectors = np.asarray(candidate.embed_documents(docs), dtype=np.float32)
+        query_vectors = np.asarray([candidate.embed_query(q) for q in queries], dtype=np.float32)
+        cosines = np.concatenate([(ref_docs * doc_vectors).sum(axis=1), (ref_queries * query_vectors).sum(axis=1)])
+        top = np.argsort(-(query_vectors @ doc_vectors.T), axis=1)[:, :top_k]
+        overlap = np.mean([len(set(a) & set(b)) / top_k for a, b in zip(ref_top, top)])
+        passed = float(cosines.min()) >= min_cosine
+        ok = passed if ok is None else ok and passed
+        print(f"{'✅' if passed else '❌'} {label}: 余弦 最低 {cosines.min():.4f} / 平均 {cosines.mean():.4f}，"
+              f"top-{top_k} 重合率 {overlap:.1%}，单条查询耗时 {_query_latency_ms(candidate, queries):.1f} ms")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embedding 后端工具：导出 ONNX 模型 / 检查与 torch 版的一致性")
+    parser.add_argument("--export", action="store_true", help=f"导出 ONNX 模型到 {EMBEDDING_ONNX_DIR}")
+    parser.add_argument("--no-quantize", action="store_true", help="导出时不生成 INT8 量化模型")
+    parser.add_argument("--parity", action="store_true",
+                        help="对比 ONNX 与 torch 的向量，不一致时以非 0 状态码退出 (导出后会自动检查一次)")
+    parser.add_argument("--samples", type=int, default=200, help="参与对比的文档条数 (取自入库源文件)")
+    parser.add_argument("--min-cosine", type=float, default=0.98, help="允许的最低余弦相似度")
+    args = parser.parse_args()
+    if not (args.export or args.parity):
+        parser.print_help()
+    if args.export:
+        try:
+            export_onnx(quantize=not args.no_quantize)
+        except ImportError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+    if args.export or args.parity:
+        # 导出的模型必须和 torch 版对得上，否则换后端后入库向量和查询向量不在同一空间
+        if check_parity(sample_size=args.samples, min_cosine=args.min_cosine) is False:
+            sys.exit(1)
@@ -1,26 +1,41 @@
-from langchain_openai import ChatOpenAI
 from core.config import LLM_API_KEY, LLM_BASE_URL, LLM_MODEL_NAME, IMAGE_MODEL_NAME
+from core.memo import llm_memo, messages_fingerprint
+import asyncio
 import re
 import ast
 import os
 import requests
 import json
 import time # for retry sleep
+import random
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 
-# 初始化客户端 (使用 LangChain 统一接口)
-llm = None
-
-# 1. 优先检查 SiliconFlow / DeepSeek (OpenAI 兼容接口)
-if LLM_API_KEY:
-    print(f"✅ 使用 SiliconFlow/DeepSeek API (model: {LLM_MODEL_NAME})")
-    llm = ChatOpenAI(
-        model=LLM_MODEL_NAME,
-        api_key=LLM_API_KEY,
-        base_url=LLM_BASE_URL,
-        temperature=0.7
-    )
-else:
-    print("⚠️ 未配置 SiliconFlow API Key，生成功能将不可用。")
+# 客户端 (使用 LangChain 统一接口) 在第一次调用 LLM 时才创建，导入本模块不再加载 langchain_openai
+_llm = None
+_llm_lock = threading.Lock()
+
+
+def get_llm():
+    """
+    共享的 LLM 客户端 (懒加载，全进程一个)；未配置 API Key 时返回 None
+    优先使用 SiliconFlow / DeepSeek (OpenAI 兼容接口)
+    """
+    global _llm
+    if _llm is None and LLM_API_KEY:
+        with _llm_lock:
+            if _llm is None:
+                from langchain_openai import ChatOpenAI
+
+                print(f"✅ 使用 SiliconFlow/DeepSeek API (model: {LLM_MODEL_NAME})")
+                _llm = ChatOpenAI(
+                    model=LLM_MODEL_NAME,
+                    api_key=LLM_API_KEY,
+                    base_url=LLM_BASE_URL,
+                    temperature=0.7
+                )
+    return _llm
 
 class MockResponse:
     def __init__(self, content):
@@ -30,6 +45,7 @@ def safe_invoke(messages):
     """
     统一的 LLM 调用封装
     """
+    llm = get_llm()
     if not llm:
         return MockResponse("🤖 (未配置 API Key，请查看下方菜谱)")
 
@@ -40,17 +56,46 @@ def safe_invoke(messages):
         print(f"❌ [SafeInvoke] LLM 调用失败: {e}")
         return MockResponse("🤖 (AI 服务暂时不可用，请检查 API Key 或网络)")
 
-def smart_select_and_comment(query: str, candidates: list):
+async def asafe_invoke(messages):
     """
-    智能优选 Rerank (灵活版)
-    不再死板过滤，而是侧重于“推荐 + 建议”
+    统一的 LLM 调用封装 (异步版，不占用线程池)
     """
+    llm = get_llm()
     if not llm:
-        return 0, "API Key 未配置，默认推荐："
+        return MockResponse("🤖 (未配置 API Key，请查看下方菜谱)")
+
+    try:
+        return await llm.ainvoke(messages)
+    except Exception as e:
+        print(f"❌ [SafeInvoke] LLM 调用失败: {e}")
+        return MockResponse("🤖 (AI 服务暂时不可用，请检查 API Key 或网络)")
+
+def _normalize_content(content) -> str:
+    """
+    --- 增强解析逻辑 ---
+    统一把 LLM 返回的 content 转成纯文本
+    """
+    # 1. 如果是列表 (Multipart)，拼接
+    if isinstance(content, list):
+         content = " ".join([str(c) for c in content])
     
-    if not candidates:
-        return 0, "没有候选菜谱。"
+    # 2. 如果是字典 (或类似结构)，尝试提取 text
+    if isinstance(content, dict):
+        content = content.get('text', str(content))
+        
+    # 3. 如果是字符串但看起来像字典 (Stringified Dict，例如 SiliconFlow/DeepSeek 偶尔返回的格式)
+    content = str(content).strip()
+    if content.startswith("{") and "text" in content:
+        try:
+            val = ast.literal_eval(content)
+            if isinstance(val, dict) and 'text' in val:
+                content = val['text']
+        except:
+            pass # 解析失败就保留原样
 
+    return str(content).strip()
+
+def _build_select_messages(query: str, candidates: list) -> list:
     # 1. 构建候选列表
     candidates_str = ""
     for i, doc in enumerate(candidates):
@@ -93,65 +138,122 @@ def smart_select_and_comment(query: str, candidates: list):
     请做出你的选择：
     """
 
-    try:
-        # LangChain 调用
-        messages = [
-            ("system", system_prompt),
-            ("human", user_prompt),
-        ]
-        
-        response_msg = safe_invoke(messages)
-        content = response_msg.content
-        
-        # --- 增强解析逻辑 ---
-        # 1. 如果是列表 (Multipart)，拼接
-        if isinstance(content, list):
-             content = " ".join([str(c) for c in content])
-        
-        # 2. 如果是字典 (或类似结构)，尝试提取 text
-        if isinstance(content, dict):
-            content = content.get('text', str(content))
-            
-        # 3. 如果是字符串但看起来像字典 (Stringified Dict)
-        content = str(content).strip()
-        if content.startswith("{") and "text" in content:
-            try:
-                val = ast.literal_eval(content)
-                if isinstance(val, dict) and 'text' in val:
-                    content = val['text']
-            except:
-                pass # 解析失败就保留原样
-
-        content = str(content).strip()
-
-        # print(f"🤖 [Generator] AI 建议: {content}") 
-
-        # --- 解析逻辑 (保持鲁棒性) ---
-        if "|||" in content:
-            index_part, reason = content.split("|||", 1)
-            match = re.search(r'\d+', index_part)
-            if match:
-                return int(match.group()), reason.strip()
-        
-        # 兜底：如果 AI 直接说了数字开头
-        match = re.search(r'^\d+', content)
+    return [
+        ("system", system_prompt),
+        ("human", user_prompt),
+    ]
+
+def _parse_select_reply(content, candidates: list):
+    """
+    解析 "索引 ||| 理由" 格式的优选结果 (保持鲁棒性)
+    """
+    content = _normalize_content(content)
+
+    # print(f"🤖 [Generator] AI 建议: {content}") 
+
+    if "|||" in content:
+        index_part, reason = content.split("|||", 1)
+        match = re.search(r'\d+', index_part)
         if match:
-             return int(match.group()), f"为您推荐【{candidates[int(match.group())]['name']}】"
+            return int(match.group()), reason.strip()
+    
+    # 兜底：如果 AI 直接说了数字开头
+    match = re.search(r'^\d+', content)
+    if match:
+         return int(match.group()), f"为您推荐【{candidates[int(match.group())]['name']}】"
 
-        # 彻底无法解析
-        return 0, f"试试这道【{candidates[0]['name']}】，应该不错！"
+    # 彻底无法解析
+    return 0, f"试试这道【{candidates[0]['name']}】，应该不错！"
 
+def smart_select_and_comment(query: str, candidates: list):
+    """
+    智能优选 Rerank (灵活版)
+    不再死板过滤，而是侧重于“推荐 + 建议”
+    """
+    llm = get_llm()
+    if not llm:
+        return 0, "API Key 未配置，默认推荐："
+    
+    if not candidates:
+        return 0, "没有候选菜谱。"
+
+    try:
+        response_msg = safe_invoke(_build_select_messages(query, candidates))
+        return _parse_select_reply(response_msg.content, candidates)
     except Exception as e:
         print(f"❌ [Generator] 报错: {e}")
         return 0, "为您推荐以下菜谱："
 
-def refine_prompt_with_llm(name: str, tags: list) -> str:
+async def asmart_select_and_comment(query: str, candidates: list):
     """
-    使用 DeepSeek 将简单的菜谱信息转化为精准、克制的英文生图 Prompt
+    智能优选 Rerank (异步版)
     """
+    llm = get_llm()
     if not llm:
-        return f"{name}, {', '.join(tags)}"
+        return 0, "API Key 未配置，默认推荐："
     
+    if not candidates:
+        return 0, "没有候选菜谱。"
+
+    try:
+        response_msg = await asafe_invoke(_build_select_messages(query, candidates))
+        return _parse_select_reply(response_msg.content, candidates)
+    except Exception as e:
+        print(f"❌ [Generator] 报错: {e}")
+        return 0, "为您推荐以下菜谱："
+
+def _build_comment_messages(query: str, doc: dict) -> list:
+    snippet = doc.get('content', '')[:300].replace('\n', ' ')
+    system_prompt = """
+    你是一位聪明、幽默且懂变通的私家大厨。菜谱已经选好了，请为用户写一句推荐理由。
+
+    【要求】：
+    1. 如果菜谱缺少用户提到的某个食材，建议用户在哪一步加进去。
+    2. 如果用户有忌口而菜谱里有，告诉用户怎么改（如“把辣椒油换成香油”）。
+    3. **严禁使用 Emoji**，理由要简短（50字以内），直接输出理由本身。
+    """
+    user_prompt = f"""
+    用户需求：【{query}】
+
+    选中的菜谱：{doc.get('name')}
+       - 标签: {doc.get('tags', [])}
+       - 简介: {snippet}...
+
+    请写推荐理由：
+    """
+    return [
+        ("system", system_prompt),
+        ("human", user_prompt),
+    ]
+
+async def acomment_on_recipe(query: str, doc: dict) -> str:
+    """
+    只写推荐语 (排序已由本地精排完成)，同样的查询 + 菜谱直接复用记忆表
+    """
+    fallback = f"试试这道【{doc.get('name')}】，应该不错！"
+    llm = get_llm()
+    if not llm:
+        return fallback
+
+    messages = _build_comment_messages(query, doc)
+    memo_payload = messages_fingerprint(messages)
+    cached = await asyncio.to_thread(llm_memo.get, "recipe_comment", memo_payload)
+    if cached:
+        return cached
+
+    try:
+        response_msg = await llm.ainvoke(messages)
+        comment = _normalize_content(response_msg.content)
+    except Exception as e:
+        print(f"❌ [Generator] 推荐语生成失败: {e}")
+        return fallback
+    if comment:
+        await asyncio.to_thread(llm_memo.set, "recipe_comment", memo_payload, comment)
+    return comment or fallback
+
+def _build_refine_messages(name: str, tags: list) -> list:
+    from langchain_core.messages import SystemMessage, HumanMessage
+
     # 构造防幻觉 Prompt
     system_prompt = """
     You are a professional food photographer's assistant.
@@ -165,24 +267,66 @@ def refine_prompt_with_llm(name: str, tags: list) -> str:
     """
     
     user_prompt = f"Dish Name: {name}\nTags: {', '.join(tags)}\n\nWrite the prompt:"
+    return [
+        SystemMessage(content=system_prompt),
+        HumanMessage(content=user_prompt)
+    ]
+
+def refine_prompt_with_llm(name: str, tags: list, fallback: bool = True) -> str:
+    """
+    使用 DeepSeek 将简单的菜谱信息转化为精准、克制的英文生图 Prompt
+    结果写入记忆表，同样的菜名 + 标签不再重复调用 LLM
+    :param fallback: LLM 不可用时是否返回 "菜名, 标签" 兜底；离线批处理传 False，失败返回 None
+    """
+    llm = get_llm()
+    if not llm:
+        return f"{name}, {', '.join(tags)}" if fallback else None
     
+    messages = _build_refine_messages(name, tags)
+    memo_payload = messages_fingerprint(messages)
+    cached = llm_memo.get("refine_prompt", memo_payload)
+    if cached:
+        return cached
+
     try:
-        from langchain_core.messages import SystemMessage, HumanMessage
-        response = llm.invoke([
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=user_prompt)
-        ])
+        response = llm.invoke(messages)
         polished_prompt = response.content.strip()
         print(f"✨ [Generator] Prompt Refined: {polished_prompt}")
+        llm_memo.set("refine_prompt", memo_payload, polished_prompt)
         return polished_prompt
     except Exception as e:
         print(f"⚠️ [Generator] Prompt refinement failed: {e}")
-        return f"{name}, {', '.join(tags)}"
+        return f"{name}, {', '.join(tags)}" if fallback else None
 
-def generate_food_image(prompt: str, is_refined: bool = False) -> str:
+async def arefine_prompt_with_llm(name: str, tags: list, fallback: bool = True) -> str:
+    """
+    生图 Prompt 优化 (异步版)
+    :param fallback: 同 refine_prompt_with_llm；传 False 时失败返回 None，调用方据此知道 Prompt 没有优化过
+    """
+    llm = get_llm()
+    if not llm:
+        return f"{name}, {', '.join(tags)}" if fallback else None
+    
+    messages = _build_refine_messages(name, tags)
+    memo_payload = messages_fingerprint(messages)
+    cached = await asyncio.to_thread(llm_memo.get, "refine_prompt", memo_payload)
+    if cached:
+        return cached
+
+    try:
+        response = await llm.ainvoke(messages)
+        polished_prompt = response.content.strip()
+        print(f"✨ [Generator] Prompt Refined: {polished_prompt}")
+        await asyncio.to_thread(llm_memo.set, "refine_prompt", memo_payload, polished_prompt)
+        return polished_prompt
+    except Exception as e:
+        print(f"⚠️ [Generator] Prompt refinement failed: {e}")
+        return f"{name}, {', '.join(tags)}" if fallback else None
+
+def build_image_request(prompt: str, is_refined: bool = False):
     """
-    独立生图函数：调用 SiliconFlow 模型生成高质量美食图片
-    增加重试机制 (Retry)
+    构造 SiliconFlow 生图请求，返回 (url, headers, payload)
+    未配置 API Key 时返回 None
     """
     # 优先使用 SiliconFlow 官方地址
     base_url = "https://api.siliconflow.cn/v1"
@@ -218,10 +362,38 @@ def generate_food_image(prompt: str, is_refined: bool = False) -> str:
         "num_inference_steps": 25, 
         "guidance_scale": 7.5
     }
+    return url, headers, payload
+
+def backoff_delay(attempt: int, retry_after: str = None) -> float:
+    """
+    重试等待时间：优先遵守服务端的 Retry-After，否则指数退避 + 随机抖动
+    """
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after)) + random.uniform(0, 0.5)
+        except ValueError:
+            try:
+                # Retry-After 也可能是 HTTP 日期格式
+                wait = (parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)).total_seconds()
+                return max(0.0, wait) + random.uniform(0, 0.5)
+            except Exception:
+                pass
+    return min(30.0, 2 ** attempt) * random.uniform(0.5, 1.5)
+
+def generate_food_image(prompt: str, is_refined: bool = False) -> str:
+    """
+    独立生图函数 (同步版，供离线脚本使用)：调用 SiliconFlow 模型生成高质量美食图片
+    增加重试机制 (Retry)，在线请求请使用 core.image_scheduler
+    """
+    request = build_image_request(prompt, is_refined)
+    if not request:
+        return None
+    url, headers, payload = request
     
     # === 增加重试逻辑 (Max 3 times) ===
     max_retries = 3
     for attempt in range(max_retries):
+        retry_after = None
         try:
             print(f"🎨 [Generator] ({attempt+1}/{max_retries}) Generating with {IMAGE_MODEL_NAME}...")
             response = requests.post(url, headers=headers, json=payload, timeout=60)
@@ -234,28 +406,19 @@ def generate_food_image(prompt: str, is_refined: bool = False) -> str:
                     print(f"✅ [Generator] Success!")
                     return image_url
             
-            # 如果失败 (如 429 Too Many Requests)，打印并等待
+            # 如果失败 (如 429 Too Many Requests)，打印并按 Retry-After 等待
             print(f"⚠️ [Generator] Attempt {attempt+1} failed: {response.status_code} - {response.text}")
-            if attempt < max_retries - 1:
-                time.sleep(2) # 失败后冷却 2 秒再试
+            retry_after = response.headers.get("Retry-After")
                 
         except Exception as e:
             print(f"❌ [Generator] Exception on attempt {attempt+1}: {e}")
-            if attempt < max_retries - 1:
-                time.sleep(2)
-        
-    return None
 
-def generate_rag_answer(query: str, candidates: list) -> str:
-    """
-    为搜索结果列表生成一段 "厨师顾问" 风格的综述
-    """
-    if not llm:
-        return "🤖 AI 厨师正在休息（未配置 API Key），请直接查看下方菜谱。"
+        if attempt < max_retries - 1:
+            time.sleep(backoff_delay(attempt, retry_after))
         
-    if not candidates:
-        return "抱歉，没有找到相关菜谱，我也很难为您提供建议。"
+    return None
 
+def _build_summary_messages(query: str, candidates: list) -> list:
     # 1. 简要构建候选信息
     candidates_summary = ""
     for i, doc in enumerate(candidates[:5]):
@@ -286,35 +449,46 @@ def generate_rag_answer(query: str, candidates: list) -> str:
 
     请给用户一段简短的高级感推荐语：
     """
+    return [
+        ("system", system_prompt),
+        ("human", user_prompt),
+    ]
 
-    try:
-        messages = [
-            ("system", system_prompt),
-            ("human", user_prompt),
-        ]
-        
-        response = safe_invoke(messages)
-        content = response.content
+def generate_rag_answer(query: str, candidates: list) -> str:
+    """
+    为搜索结果列表生成一段 "厨师顾问" 风格的综述
+    """
+    llm = get_llm()
+    if not llm:
+        return "🤖 AI 厨师正在休息（未配置 API Key），请直接查看下方菜谱。"
         
-         # --- 增强解析逻辑 ---
-        if isinstance(content, list):
-             content = " ".join([str(c) for c in content])
-             
-        if isinstance(content, dict):
-            content = content.get('text', str(content))
-
-        content = str(content).strip()
+    if not candidates:
+        return "抱歉，没有找到相关菜谱，我也很难为您提供建议。"
+
+    try:
+        response = safe_invoke(_build_summary_messages(query, candidates))
+        content = _normalize_content(response.content)
+        print(f"✅ AI 响应内容: {content[:50]}...")
+        return content
+            
+    except Exception as e:
+        print(f"❌ [Generator] Summary 报错: {e}")
+        return f"基于您的食材偏好，我为您甄选了以下几道值得尝试的美味佳肴。"
+
+async def agenerate_rag_answer(query: str, candidates: list) -> str:
+    """
+    搜索结果综述 (异步版)
+    """
+    llm = get_llm()
+    if not llm:
+        return "🤖 AI 厨师正在休息（未配置 API Key），请直接查看下方菜谱。"
         
-        # 处理 Stringified Dict (例如 SiliconFlow/DeepSeek 偶尔返回的格式)
-        if content.startswith("{") and "text" in content:
-            try:
-                import ast
-                val = ast.literal_eval(content)
-                if isinstance(val, dict) and 'text' in val:
-                    content = val['text']
-            except:
-                pass
+    if not candidates:
+        return "抱歉，没有找到相关菜谱，我也很难为您提供建议。"
 
+    try:
+        response = await asafe_invoke(_build_summary_messages(query, candidates))
+        content = _normalize_content(response.content)
         print(f"✅ AI 响应内容: {content[:50]}...")
         return content
             
@@ -0,0 +1,147 @@
+import asyncio
+import threading
+import time
+import weakref
+from typing import Optional
+
+import httpx
+
+from core.config import IMAGE_MODEL_NAME, IMAGE_CONCURRENCY, IMAGE_RATE_PER_SEC, IMAGE_RATE_BURST, IMAGE_MAX_RETRIES
+from core.generator import build_image_request, backoff_delay
+
+
+class TokenBucket:
+    """
+    线程安全的令牌桶 (预约式)
+    不依赖某个事件循环，不同请求 / 线程共享同一份限流额度
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self) -> float:
+        """预约一个令牌，返回需要等待的秒数 (令牌可以透支为负数，表示排队)"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            self._refill()
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def penalize(self, seconds: float):
+        """收到 429 时整体冷却：之后所有请求至少再等 seconds 秒"""
+        if self.rate <= 0 or seconds <= 0:
+            return
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, -seconds * self.rate)
+
+    async def acquire(self):
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class ImageScheduler:
+    """
+    异步生图调度器：并发上限 (Semaphore) + 令牌桶限流 + 429 退避重试
+    """
+
+    def __init__(self, concurrency: int = IMAGE_CONCURRENCY, rate: float = IMAGE_RATE_PER_SEC,
+                 burst: int = IMAGE_RATE_BURST, max_retries: int = IMAGE_MAX_RETRIES):
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max(1, max_retries)
+        self.bucket = TokenBucket(rate, burst)
+        # asyncio.Semaphore / httpx.AsyncClient 都绑定事件循环，按 loop 分别创建
+        self._semaphores = weakref.WeakKeyDictionary()
+        self._clients = weakref.WeakKeyDictionary()
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        sem = self._semaphores.get(loop)
+        if sem is None:
+            sem = asyncio.Semaphore(self.concurrency)
+            self._semaphores[loop] = sem
+        return sem
+
+    def _client(self) -> httpx.AsyncClient:
+        """同一个事件循环内共享一个连接池，避免每张图都重新握手"""
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                timeout=60,
+                limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+            )
+            self._clients[loop] = client
+        return client
+
+    async def aclose(self):
+        """关闭当前事件循环的连接池 (应用退出时调用)"""
+        client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+    async def generate(self, prompt: str, is_refined: bool = False) -> Optional[str]:
+        """
+        异步生图，返回图片 URL；重试耗尽返回 None
+        """
+        request = build_image_request(prompt, is_refined)
+        if not request:
+            return None
+        url, headers, payload = request
+
+        async with self._semaphore():
+            client = self._client()
+            for attempt in range(self.max_retries):
+                await self.bucket.acquire()
+                retry_after = None
+                try:
+                    print(f"🎨 [Scheduler] ({attempt+1}/{self.max_retries}) Generating with {IMAGE_MODEL_NAME}...")
+                    response = await client.post(url, headers=headers, json=payload)
+
+                    if response.status_code == 200:
+                        images = response.json().get("images", [])
+                        if images:
+                            print("✅ [Scheduler] Success!")
+                            return images[0].get("url")
+
+                    print(f"⚠️ [Scheduler] Attempt {attempt+1} failed: {response.status_code} - {response.text}")
+                    retry_after = response.headers.get("Retry-After")
+                    # 参数 / 鉴权类错误重试也没用
+                    if 400 <= response.status_code < 500 and response.status_code not in (408, 429):
+                        return None
+                except Exception as e:
+                    print(f"❌ [Scheduler] Exception on attempt {attempt+1}: {e}")
+                    response = None
+
+                if attempt < self.max_retries - 1:
+                    delay = backoff_delay(attempt, retry_after)
+                    # 被限流时让所有排队的生图请求一起冷却 (下一轮 acquire 会等待)
+                    if response is not None and response.status_code == 429 and self.bucket.rate > 0:
+                        self.bucket.penalize(delay)
+                    else:
+                        await asyncio.sleep(delay)
+
+        return None
+
+    async def download(self, image_url: str):
+        """下载生成好的图片 (上游链接约 1 小时后过期，需要落到本地)，复用同一个连接池"""
+        response = await self._client().get(image_url)
+        response.raise_for_status()
+        return response.content, response.headers.get("Content-Type")
+
+
+# 全局单例：所有请求共享同一个限流额度
+image_scheduler = ImageScheduler()
@@ -0,0 +1,121 @@
+import hashlib
+import os
+import re
+from typing import Optional
+
+from core.config import IMAGE_STORE_DIR
+
+# 文件名格式: <sha256>.<ext>，按前两位分目录，避免单目录文件过多
+_NAME_PATTERN = re.compile(r'^[0-9a-f]{64}\.(png|jpg|webp)$')
+
+_CONTENT_TYPES = {
+    "png": "image/png",
+    "jpg": "image/jpeg",
+    "webp": "image/webp",
+}
+
+
+def guess_extension(data: bytes, content_type: str = None) -> str:
+    """根据文件头 (优先) 或 Content-Type 判断图片格式"""
+    if data[:8] == b'\x89PNG\r\n\x1a\n':
+        return "png"
+    if data[:3] == b'\xff\xd8\xff':
+        return "jpg"
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return "webp"
+    content_type = (content_type or "").lower()
+    if "jpeg" in content_type or "jpg" in content_type:
+        return "jpg"
+    if "webp" in content_type:
+        return "webp"
+    return "png"
+
+
+def content_type_for(name: str) -> str:
+    return _CONTENT_TYPES.get(name.rsplit(".", 1)[-1], "application/octet-stream")
+
+
+def _path_for(name: str) -> str:
+    return os.path.join(IMAGE_STORE_DIR, name[:2], name)
+
+
+def save_image(data: bytes, content_type: str = None) -> str:
+    """
+    按内容哈希保存图片，返回文件名；相同内容只存一份
+    先写临时文件再原子改名，进程被杀也不会留下半截图片
+    """
+    name = f"{hashlib.sha256(data).hexdigest()}.{guess_extension(data, content_type)}"
+    path = _path_for(name)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    return name
+
+
+def find_image(name: str) -> Optional[str]:
+    """返回本地图片路径；文件名非法 (防止路径穿越) 或不存在时返回 None"""
+    if not name or not _NAME_PATTERN.match(name):
+        return None
+    path = _path_for(name)
+    return path if os.path.exists(path) else None
+
+
+def local_image_url(name: str) -> str:
+    """本地图片对外访问地址 (由 /api/images 接口提供)"""
+    return f"/api/images/{name}"
+
+
+def is_local_image_url(url: Optional[str]) -> bool:
+    """是否是本地镜像图的地址 (不会过期)，远程生图链接约 1 小时后失效"""
+    return bool(url) and url.startswith("/api/images/")
+
+
+# 缩略图尺寸 (长边像素)，列表卡片用 512，小图 / 移动端用 256
+THUMBNAIL_SIZES = (256, 512)
+
+
+def image_etag(name: str, size: int = None) -> str:
+    """强 ETag：文件名本身就是内容哈希，缩略图再带上尺寸"""
+    digest = name.rsplit(".", 1)[0]
+    return f'"{digest}-{size}"' if size else f'"{digest}"'
+
+
+def find_thumbnail(name: str, size: int) -> Optional[str]:
+    """
+    返回缩略图 (WebP) 路径，首次访问时生成并落盘
+    未安装 Pillow 或转换失败时返回 None，由调用方退回原图
+    """
+    source = find_image(name)
+    if not source or size not in THUMBNAIL_SIZES:
+        return None
+    path = os.path.join(IMAGE_STORE_DIR, "thumbs", str(size), name[:2], f"{name.rsplit('.', 1)[0]}.webp")
+    if os.path.exists(path):
+        return path
+
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with Image.open(source) as img:
+            img = img.convert("RGBA" if img.mode in ("RGBA", "LA", "P") else "RGB")
+            img.thumbnail((size, size))
+            img.save(tmp_path, format="WEBP", quality=80, method=4)
+        os.replace(tmp_path, path)
+        return path
+    except Exception as e:
+        print(f"⚠️ [ImageStore] 生成缩略图失败 {name}@{size}: {e}")
+        return None
+
+
+def thumbnail_url(cover_url: Optional[str], size: int = 512) -> Optional[str]:
+    """本地镜像图才有缩略图；远程链接原样返回"""
+    if is_local_image_url(cover_url):
+        return f"{cover_url}?size={size}"
+    return cover_url
@@ -1,84 +1,459 @@
+import argparse
+import hashlib
 import json
 import os
-import shutil
-import torch
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_chroma import Chroma
-from langchain_core.documents import Document
-from core.config import DB_PATH_V3, EMBEDDING_MODEL_NAME, COLLECTION_NAME
+import re
+import time
+import uuid
+import difflib
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+import numpy as np
+import chromadb
+from core.config import (
+    DB_PATH_V3, EMBEDDING_MODEL_NAME, COLLECTION_NAME, INGEST_SOURCE_FILE,
+    CLUSTER_COSINE_THRESHOLD, CLUSTER_NEIGHBORS, CLUSTER_NAME_RATIO, INGEST_REPRESENTATIVES_ONLY,
+    INGEST_BATCH_SIZE, INGEST_EMBED_WORKERS, HYBRID_RETRIEVAL,
+)
+from core.embeddings import build_embeddings, embedding_device, embedding_cache_key, vector_key
+from core.json_stream import iter_records
+from core.cache import bump_index_version, read_active_collection, write_active_collection, lexical_index_path
+from core.bm25 import save_index
+from core.ingredient_index import normalize_term
+from core.dedup import canonical_name
+from core.recipe_store import recipe_store, normalize_tags, normalize_steps
 
 # 1. 配置路径
-SOURCE_FILE = "data/recipe_rag_ready_fixed.json"
+SOURCE_FILE = INGEST_SOURCE_FILE
 
-def ingest_data():
+# 序列化文本里的食材 / 调料行 (见 preprocessing_tags/data_trans_rag.py 的 serialize_recipe)
+_SECTION_PATTERN = re.compile(r'^(主要食材|调料):[ \t]*(.*)$', re.MULTILINE)
+# 去掉用量: "虾(200g)" / "盐（适量）" -> "虾" / "盐"
+_AMOUNT_PATTERN = re.compile(r'[(（][^()（）]*[)）]')
+
+
+def _clean_ingredient_names(values) -> list:
+    names = []
+    for value in values or []:
+        if isinstance(value, dict):
+            value = value.get('name', '')
+        name = _AMOUNT_PATTERN.sub('', str(value or '')).strip()
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def extract_ingredients(item: dict) -> tuple:
+    """
+    提取结构化的 (食材, 调料) 名称列表
+    新版预处理会直接写进 metadata；旧文件则从序列化文本的 "主要食材 / 调料" 两行解析
+    """
+    meta = item.get('metadata', {})
+    if 'ingredients' in meta or 'seasonings' in meta:
+        return _clean_ingredient_names(meta.get('ingredients')), _clean_ingredient_names(meta.get('seasonings'))
+
+    sections = {key: value for key, value in _SECTION_PATTERN.findall(item.get('page_content', ''))}
+    split = lambda text: [part for part in re.split(r'[,，、]\s*', text) if part.strip()]
+    return (
+        _clean_ingredient_names(split(sections.get('主要食材', ''))),
+        _clean_ingredient_names(split(sections.get('调料', ''))),
+    )
+
+
+def _names_match(a: str, b: str) -> bool:
+    """
+    规范化菜名是否指同一道菜：完全相同，或者只差几个增删的字且整体极其相似
+    有字被替换的一律不算 (红烧肉 / 红烧鱼、清蒸鲈鱼 / 清蒸鳜鱼)，短菜名差一个字也不算 (炒饭 / 蛋炒饭)
+    """
+    if not a or not b:
+        return False
+    if a == b:
+        return True
+    matcher = difflib.SequenceMatcher(None, a, b)
+    if any(tag == 'replace' for tag, *_ in matcher.get_opcodes()):
+        return False
+    return matcher.ratio() >= CLUSTER_NAME_RATIO
+
+
+def cluster_recipes(vectors, names: list, threshold: float = CLUSTER_COSINE_THRESHOLD,
+                    neighbors: int = CLUSTER_NEIGHBORS, block_size: int = 512) -> list:
+    """
+    离线聚类近重复菜谱：向量近邻 (分块矩阵乘法取每条的前 neighbors 个近邻) + 规范化菜名匹配，两者都满足才连边
+    不做传递合并 (A~B、B~C 不会把 A 和 C 并到一起)：连边最多的菜谱优先当代表，每个成员都必须和自己的代表直接相连
+    返回每条记录的代表下标 (代表自己指向自己)
+    """
+    matrix = np.asarray(vectors, dtype=np.float32)
+    size = len(matrix)
+    links = [set() for _ in range(size)]
+    k = min(neighbors + 1, size)
+    for start in range(0, size, block_size):
+        sims = matrix[start:start + block_size] @ matrix.T
+        top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        for row, candidates in enumerate(top):
+            i = start + row
+            for j in candidates:
+                j = int(j)
+                if j != i and sims[row, j] >= threshold and _names_match(names[i], names[j]):
+                    links[i].add(j)
+                    links[j].add(i)
+
+    representative = [-1] * size
+    for i in sorted(range(size), key=lambda i: (-len(links[i]), i)):
+        if representative[i] != -1:
+            continue
+        representative[i] = i
+        for j in links[i]:
+            if representative[j] == -1:
+                representative[j] = i
+    return representative
+
+
+def content_hash(page_content: str, meta: dict, embedding_key: str = EMBEDDING_MODEL_NAME) -> str:
+    """
+    文档指纹：正文 + metadata + 向量来源 (模型 + 后端 + 精度，见 embedding_cache_key)，任何一项变化都需要重新编码
+    切换 EMBEDDING_BACKEND 后旧向量全部作废，索引里不会混着 torch FP32 和 ONNX INT8 两种向量
+    """
+    payload = json.dumps([embedding_key, page_content, meta], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def lookup_existing_vectors(collection, doc_ids: list) -> dict:
+    """按 ID 取回在线 collection 里的 {文档 ID: (content_hash, 向量)}，没有指纹的旧数据不复用"""
+    existing = {}
+    if collection is None or not doc_ids:
+        return existing
+    data = collection.get(ids=list(dict.fromkeys(doc_ids)), include=["metadatas", "embeddings"])
+    for doc_id, meta, vector in zip(data["ids"], data["metadatas"], data["embeddings"]):
+        if meta and meta.get('content_hash'):
+            existing[doc_id] = (meta['content_hash'], np.asarray(vector, dtype=np.float32))
+    return existing
+
+
+def prepare_record(item: dict, embedding_key: str = EMBEDDING_MODEL_NAME) -> tuple:
+    """
+    单条源记录 -> (page_content, metadata, 食材索引行, 详情行)
+    没有菜谱 ID 的记录不进食材索引和详情表 (两行都为 None)
+    """
+    meta = item['metadata'].copy()
+    # ID 统一成字符串，检索时可以直接用 {"id": {"$nin": [...]}} 排除
+    if meta.get('id') is not None:
+        meta['id'] = str(meta['id'])
+
+    # 规范化菜名，检索结果去重用 ("家常红烧肉" / "红烧肉（简易版）" -> "红烧肉")
+    meta['canonical_name'] = canonical_name(meta.get('name', ''))
+
+    # 0. 结构化食材 / 调料 (JSON 字符串，Chroma 的 metadata 只支持标量)
+    ingredients, seasonings = extract_ingredients(item)
+    meta['ingredients'] = json.dumps(ingredients, ensure_ascii=False)
+    meta['seasonings'] = json.dumps(seasonings, ensure_ascii=False)
+    index_row = None
+    if meta.get('id'):
+        index_row = (meta['id'], {normalize_term(n) for n in ingredients + seasonings} - {""})
+
+    # 菜谱详情 (标签 / 步骤) 在这里解析一次，存进 recipe_store，在线请求按 ID 批量取回
+    # 步骤列表不再塞进向量库 metadata
+    instructions = meta.pop('instructions', [])
+    detail_row = None
+    if meta.get('id'):
+        detail_row = (meta['id'], meta.get('name'), normalize_tags(meta.get('tags', [])), normalize_steps(instructions))
+
+    # -------------------------------------------------------
+    # ✅ 核心修复：把 List/Dict 类型的数据转成 JSON 字符串
+    # -------------------------------------------------------
+
+    # 处理 tags (List -> String)，检索时的忌口过滤还要用
+    # 例如: ['菌菇', '海鲜'] -> "['菌菇', '海鲜']"
+    if 'tags' in meta and isinstance(meta['tags'], list):
+        meta['tags'] = json.dumps(meta['tags'], ensure_ascii=False)
+
+    meta['content_hash'] = content_hash(item['page_content'], meta, embedding_key)
+    return item['page_content'], meta, index_row, detail_row
+
+
+def iter_documents(path: str, embedding_key: str = EMBEDDING_MODEL_NAME):
+    """
+    流式读取源文件 (JSON 数组 / JSONL)，逐条产出 (文档 ID, page_content, metadata, 食材索引行, 详情行)
+    同一个菜谱 ID 只保留第一条，ID 同时作为向量库的文档 ID (没有 ID 的用内容指纹，保证重跑时稳定)
+    """
+    seen_ids = set()
+    for item in iter_records(path):
+        page_content, meta, index_row, detail_row = prepare_record(item, embedding_key)
+        doc_id = meta.get('id') or meta['content_hash']
+        if doc_id in seen_ids:
+            continue
+        seen_ids.add(doc_id)
+        yield doc_id, page_content, meta, index_row, detail_row
+
+
+def _batched(iterable, size: int):
+    batch = []
+    for value in iterable:
+        batch.append(value)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# --- 编码进程 (每个进程加载一份模型，只在进程启动时加载一次) ---
+_worker_embeddings = None
+
+
+def _build_checked(device: str, embedding_key: str, threads: int = None):
+    """加载模型，并确认向量来源和写进内容指纹的一致 (例如 ONNX 模型加载失败退回了 torch 时中止入库)"""
+    model = build_embeddings(device, threads=threads)
+    if vector_key(model) != embedding_key:
+        raise RuntimeError(f"Embedding 后端是 {vector_key(model)}，与内容指纹里的 {embedding_key} 不一致")
+    return model
+
+
+def _init_embed_worker(threads: int, embedding_key: str):
+    global _worker_embeddings
+    _worker_embeddings = _build_checked("cpu", embedding_key, threads)
+
+
+def _embed_in_worker(texts: list):
+    return np.asarray(_worker_embeddings.embed_documents(texts), dtype=np.float32)
+
+
+class BatchEmbedder:
+    """
+    分批编码：CPU 上把批次分给多个进程并行算 (单进程推理吃不满多核)，GPU 上在本进程里算
+    模型 / 进程池在第一次真正需要编码时才创建，全部复用旧向量的增量入库不用加载模型
+    """
+
+    def __init__(self, workers: int = INGEST_EMBED_WORKERS, embedding_key: str = EMBEDDING_MODEL_NAME):
+        self.device = embedding_device()
+        self.embedding_key = embedding_key
+        cpu_count = os.cpu_count() or 1
+        if self.device != "cpu":
+            print(f"⚡️ 检测到 GPU ({self.device})，已启用加速模式！")
+            workers = 1
+        else:
+            if workers <= 0:
+                workers = max(1, min(4, cpu_count // 2))
+            print(f"🐢 未检测到 GPU，使用 CPU 编码 ({workers} 个进程)")
+        self.workers = workers
+        self.threads = max(1, cpu_count // workers)
+        self._pool = None
+        self._model = None
+
+    def submit(self, texts: list) -> Future:
+        """提交一批文本，返回 Future (结果为 (n, dim) 的 float32 矩阵)"""
+        if self.workers > 1:
+            if self._pool is None:
+                print(f"🚀 启动 {self.workers} 个编码进程，加载 Embedding 模型 (每个进程 {self.threads} 线程)...")
+                # spawn 而不是 fork：父进程里已经有 chromadb / 推理运行时的线程，fork 出来的子进程可能死锁
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_embed_worker, initargs=(self.threads, self.embedding_key)
+                )
+            return self._pool.submit(_embed_in_worker, texts)
+
+        future = Future()
+        try:
+            if self._model is None:
+                print("🚀 开始加载 Embedding 模型 (BAAI)...")
+                self._model = _build_checked(self.device, self.embedding_key)
+            future.set_result(np.asarray(self._model.embed_documents(texts), dtype=np.float32))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+
+def embed_batches(batches, embedder: BatchEmbedder, active=None):
+    """
+    为每批文档准备向量：按本批 ID 到在线 collection (active) 里查指纹，没变的复用旧向量，其余交给 embedder
+    在途批次不超过 2 倍进程数，内存不随数据量增长；按输入顺序产出 (batch, 向量矩阵, 复用条数)
+    """
+    pending = deque()
+
+    def finish():
+        batch, reused, todo, future = pending.popleft()
+        new_vectors = future.result() if future is not None else None
+        dim = new_vectors.shape[1] if new_vectors is not None else len(next(iter(reused.values())))
+        vectors = np.empty((len(batch), dim), dtype=np.float32)
+        for i, vector in reused.items():
+            vectors[i] = vector
+        if new_vectors is not None:
+            vectors[todo] = new_vectors
+        return batch, vectors, len(reused)
+
+    for batch in batches:
+        existing = lookup_existing_vectors(active, [row[0] for row in batch])
+        reused, todo = {}, []
+        for i, (doc_id, _, meta, _, _) in enumerate(batch):
+            hit = existing.get(doc_id)
+            if hit is not None and hit[0] == meta['content_hash']:
+                reused[i] = hit[1]
+            else:
+                todo.append(i)
+        future = embedder.submit([batch[i][1] for i in todo]) if todo else None
+        pending.append((batch, reused, todo, future))
+        if len(pending) > embedder.workers * 2:
+            yield finish()
+    while pending:
+        yield finish()
+
+
+def _in_chunks(values: list, size: int):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def ingest_data(full: bool = False, prompts: bool = True):
+    """
+    增量入库：按内容指纹只为新增 / 变化的菜谱计算向量，未变化的直接复用在线 collection 里的向量
+    源文件流式读取、分批编码、分批写入，内存里只常驻向量和 ID (聚类要用)，不随正文 / 步骤的体积增长
+    新数据写进影子 collection，全部写完后原子切换指针，在线服务不会看到建了一半的库
+    :param full: 忽略已有向量，全部重新编码
+    :param prompts: 入库后为新增 / 菜名或标签变化的菜谱预计算生图 Prompt (未配置 LLM 时跳过)
+    """
     # 检查源文件
     if not os.path.exists(SOURCE_FILE):
         print(f"❌ 错误：找不到源文件 {SOURCE_FILE}")
         return
 
-    # 检查数据库是否已存在
-    if os.path.exists(DB_PATH_V3):
-        print(f"🗑️ 发现旧数据库 {DB_PATH_V3}，正在删除以进行重建...")
-        shutil.rmtree(DB_PATH_V3)
-    
-    print("🚀 开始加载 Embedding 模型 (BAAI)...")
-    
-    # 自动检测设备
-    if torch.backends.mps.is_available():
-        device = "mps"
-        print("⚡️ 检测到 Mac GPU (MPS)，已启用加速模式！")
-    elif torch.cuda.is_available():
-        device = "cuda"
-        print("⚡️ 检测到 NVIDIA GPU (CUDA)，已启用加速模式！")
-    else:
-        device = "cpu"
-        print("🐢 未检测到 GPU，正在使用 CPU 模式...")
-
-    embeddings = HuggingFaceEmbeddings(
-        model_name=EMBEDDING_MODEL_NAME,
-        model_kwargs={'device': device},
-        encode_kwargs={'normalize_embeddings': True}
-    )
+    # 对比在线 collection：指纹相同的直接复用向量
+    client = chromadb.PersistentClient(path=DB_PATH_V3)
+    active_name = read_active_collection()
+    active = None
+    if not full:
+        try:
+            active = client.get_collection(active_name)
+        except Exception:
+            print(f"ℹ️ 没有可复用的在线 collection ({active_name})，将全部重新编码")
+
+    # 写入影子 collection (在线服务此时仍在读旧的 collection)
+    shadow_name = f"{COLLECTION_NAME}__{time.strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:6]}"
+    collection = client.create_collection(shadow_name)
+    max_batch = client.get_max_batch_size()
+    # 食材倒排索引 (忌口过滤用) 和菜谱详情先写暂存表，切换前再整体换上线
+    recipe_store.begin_replace()
+    # 向量来源 (模型 + 后端 + 精度) 写进内容指纹，切换后端后旧向量不再复用
+    embedding_key = embedding_cache_key()
+    embedder = BatchEmbedder(embedding_key=embedding_key)
+
+    print(f"📖 正在流式读取数据: {SOURCE_FILE} (每批 {INGEST_BATCH_SIZE} 条)")
+    print(f"📦 写入影子 collection: {shadow_name} (向量来源 {embedding_key})")
+    doc_ids, names, vector_chunks = [], [], []
+    reused_total = 0
+    started = time.time()
+    try:
+        batches = _batched(iter_documents(SOURCE_FILE, embedding_key), INGEST_BATCH_SIZE)
+        for batch, vectors, reused in embed_batches(batches, embedder, active):
+            ids = [row[0] for row in batch]
+            for start in range(0, len(batch), max_batch):
+                rows = batch[start:start + max_batch]
+                collection.upsert(
+                    ids=ids[start:start + max_batch],
+                    embeddings=vectors[start:start + max_batch],
+                    documents=[row[1] for row in rows],
+                    metadatas=[row[2] for row in rows],
+                )
+            recipe_store.stage_batch(
+                [row[3] for row in batch if row[3]],
+                [row[4] for row in batch if row[4]],
+            )
+            doc_ids.extend(ids)
+            names.extend(row[2].get('canonical_name', '') for row in batch)
+            vector_chunks.append(vectors)
+            reused_total += reused
+
+            elapsed = max(time.time() - started, 1e-6)
+            print(f"⏳ 已处理 {len(doc_ids)} 条 (复用 {reused_total}，新编码 {len(doc_ids) - reused_total})，"
+                  f"{len(doc_ids) / elapsed:.1f} 条/秒")
+    except BaseException:
+        client.delete_collection(shadow_name)
+        raise
+    finally:
+        embedder.close()
+
+    if not doc_ids:
+        client.delete_collection(shadow_name)
+        print("❌ 源文件里没有菜谱，保留当前在线数据")
+        return
+
+    elapsed = max(time.time() - started, 1e-6)
+    print(f"🧮 共 {len(doc_ids)} 条：复用 {reused_total} 条，新增/变化 {len(doc_ids) - reused_total} 条，"
+          f"用时 {elapsed:.1f} 秒 ({len(doc_ids) / elapsed:.1f} 条/秒)")
+
+    # 近重复菜谱聚类：每条记录所属的簇 (以代表菜谱的 ID 作为 cluster_id)，写回影子 collection 的 metadata
+    print("🔗 正在聚类近重复菜谱...")
+    vectors = np.vstack(vector_chunks)
+    del vector_chunks
+    representative = cluster_recipes(vectors, names)
+    cluster_sizes = {}
+    for rep in representative:
+        cluster_sizes[rep] = cluster_sizes.get(rep, 0) + 1
+    cluster_meta = [
+        {
+            'cluster_id': doc_ids[representative[i]],
+            'is_representative': representative[i] == i,
+            'cluster_size': cluster_sizes[representative[i]],
+        }
+        for i in range(len(doc_ids))
+    ]
+    for idx in _in_chunks(list(range(len(doc_ids))), max_batch):
+        collection.update(ids=[doc_ids[i] for i in idx], metadatas=[cluster_meta[i] for i in idx])
+    print(f"   {len(doc_ids)} 道菜归为 {len(cluster_sizes)} 个簇")
+
+    if INGEST_REPRESENTATIVES_ONLY:
+        dropped = [doc_ids[i] for i, meta in enumerate(cluster_meta) if not meta['is_representative']]
+        for ids in _in_chunks(dropped, max_batch):
+            collection.delete(ids=ids)
+        print(f"✂️ 只保留每簇的代表菜谱：{len(doc_ids) - len(dropped)} 条")
+
+    # BM25 关键词索引在这里建好落盘，在线各 worker 直接加载 (见 VectorDBManager.get_lexical_index)
+    if HYBRID_RETRIEVAL:
+        print("🔤 正在构建 BM25 关键词索引...")
+        data = collection.get(include=["documents", "metadatas"])
+        save_index(lexical_index_path(shadow_name), data["documents"], data["metadatas"])
+        print(f"   已写入 {lexical_index_path(shadow_name)} ({len(data['ids'])} 条)")
+        del data
+
+    # 原子切换指针，紧接着换上食材倒排索引和菜谱详情，再通知在线服务：向量库已更新，相关缓存需要失效
+    # 详情表换上线失败时指针切回旧 collection，不会出现新 collection 配旧详情 (或反过来) 长期在线
+    write_active_collection(shadow_name)
+    try:
+        indexed, details = recipe_store.commit_replace()
+    except BaseException:
+        write_active_collection(active_name)
+        raise
+    print(f"📇 食材倒排索引已更新：{indexed} 道菜")
+    print(f"📚 菜谱详情已更新：{details} 道菜")
+    version = bump_index_version()
+    print(f"✅ 入库完成！已切换到 {shadow_name} (索引版本: {version})")
+
+    # 上一代 collection 保留 (可能还有请求在读)，更早的清理掉
+    for name in _collection_names(client):
+        if name.startswith(COLLECTION_NAME) and name not in (shadow_name, active_name):
+            client.delete_collection(name)
+            if os.path.exists(lexical_index_path(name)):
+                os.remove(lexical_index_path(name))
+            print(f"🗑️ 已清理旧 collection: {name}")
+
+    # 生图 Prompt 按 (菜名, 标签, 模型) 的指纹续跑：只有新增 / 变化的菜谱会调用 LLM
+    if prompts:
+        from core.precompute_prompts import precompute_image_prompts
+        precompute_image_prompts(SOURCE_FILE)
+
+
+def _collection_names(client) -> list:
+    # chromadb 新版本 list_collections 返回名字，旧版本返回 Collection 对象
+    return [getattr(c, "name", c) for c in client.list_collections()]
 
-    print(f"📖 正在读取数据: {SOURCE_FILE}")
-    with open(SOURCE_FILE, 'r', encoding='utf-8') as f:
-        raw_data = json.load(f)
-
-    # 转换格式
-    documents = []
-    for item in raw_data:
-        meta = item['metadata'].copy()
-        
-        # -------------------------------------------------------
-        # ✅ 核心修复：把 List/Dict 类型的数据转成 JSON 字符串
-        # -------------------------------------------------------
-        
-        # 1. 处理 tags (List -> String)
-        # 例如: ['菌菇', '海鲜'] -> "['菌菇', '海鲜']"
-        if 'tags' in meta and isinstance(meta['tags'], list):
-            meta['tags'] = json.dumps(meta['tags'], ensure_ascii=False)
-            
-        # 2. 处理 instructions (List of Dicts -> String)
-        # 这一步非常关键！否则 instructions 也会报错
-        if 'instructions' in meta and isinstance(meta['instructions'], list):
-            meta['instructions'] = json.dumps(meta['instructions'], ensure_ascii=False)
-
-        doc = Document(
-            page_content=item['page_content'],
-            metadata=meta 
-        )
-        documents.append(doc)
-
-    print(f"📦 正在将 {len(documents)} 条数据写入向量库...")
-    
-    Chroma.from_documents(
-        documents=documents,
-        embedding=embeddings,
-        persist_directory=DB_PATH_V3,
-        collection_name=COLLECTION_NAME
-    )
-    
-    print("✅ 入库完成！复杂数据已序列化存储。")
 
 if __name__ == "__main__":
-    ingest_data()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="菜谱入库 (增量：只为新增 / 变化的菜谱计算向量)")
+    parser.add_argument("--full", action="store_true", help="忽略已有向量，全部重新编码")
+    parser.add_argument("--skip-prompts", action="store_true", help="入库后不预计算生图 Prompt")
+    args = parser.parse_args()
+    ingest_data(full=args.full, prompts=not args.skip_prompts)
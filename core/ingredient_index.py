@@ -0,0 +1,123 @@
+import threading
+from typing import Optional
+
+from core.cache import read_index_version
+from core.recipe_store import recipe_store
+
+# 同义词组：任意一个词命中，整组都算 (第一个为规范名)
+SYNONYM_GROUPS = [
+    ("香菜", "芫荽", "盐荽"),
+    ("土豆", "马铃薯", "洋芋"),
+    ("西红柿", "番茄"),
+    ("红薯", "地瓜", "番薯"),
+    ("玉米", "苞米", "苞谷"),
+    ("洋葱", "葱头"),
+    ("茄子", "矮瓜"),
+    ("荸荠", "马蹄"),
+    ("香菇", "冬菇"),
+    ("黄豆", "大豆"),
+    ("莴笋", "莴苣"),
+    ("西兰花", "西蓝花", "绿花菜"),
+    ("甜椒", "彩椒", "灯笼椒"),
+    ("辣椒", "尖椒", "朝天椒", "小米椒", "海椒"),
+    ("花椒", "麻椒"),
+    ("芝麻", "胡麻"),
+    ("淀粉", "生粉", "太白粉"),
+    ("鱿鱼", "柔鱼"),
+]
+
+# 过敏源大类：用户填的是类别时展开成具体食材
+ALLERGEN_GROUPS = {
+    # 词条按子串匹配食材，单字只放不会误伤的 (不能放 "贝"：会命中 "贝贝南瓜")
+    "海鲜": ("虾", "蟹", "蛤", "蚝", "牡蛎", "扇贝", "干贝", "贝类", "贝柱", "青口贝", "北极贝", "鲍鱼", "花甲", "蛏子",
+             "鱿鱼", "墨鱼", "章鱼", "海参", "海带"),
+    "坚果": ("花生", "核桃", "杏仁", "腰果", "榛子", "开心果", "松子", "碧根果"),
+    "乳制品": ("牛奶", "奶酪", "芝士", "黄油", "奶油", "酸奶", "炼乳"),
+}
+
+_SYNONYMS = {}
+for _group in SYNONYM_GROUPS:
+    for _word in _group:
+        _SYNONYMS[_word] = _group
+
+
+def normalize_term(name: str) -> str:
+    return str(name or "").strip().lower()
+
+
+def expand_term(word: str) -> set:
+    """忌口词 -> 需要匹配的词集合 (本身 + 同义词 + 过敏源大类展开)"""
+    word = normalize_term(word)
+    if not word:
+        return set()
+    expanded = {word}
+    expanded.update(_SYNONYMS.get(word, ()))
+    for member in ALLERGEN_GROUPS.get(word, ()):
+        expanded.add(member)
+        expanded.update(_SYNONYMS.get(member, ()))
+    return expanded
+
+
+class IngredientIndex:
+    """
+    食材 -> 菜谱 ID 的倒排索引 (ingest 时写入 recipe_store，这里按索引版本懒加载到内存)
+    忌口过滤变成集合查找：只看结构化的食材 / 调料，不再扫步骤文本，也就没有 "步骤里提到一句" 的误杀
+    """
+
+    def __init__(self, store=recipe_store):
+        self.store = store
+        self._postings = None
+        self._version = None
+        self._match_cache = {}
+        self._lock = threading.Lock()
+
+    def _load(self) -> dict:
+        version = read_index_version()
+        if self._postings is not None and self._version == version:
+            return self._postings
+        with self._lock:
+            if self._postings is None or self._version != version:
+                try:
+                    self._postings = self.store.ingredient_postings()
+                except Exception as e:
+                    print(f"⚠️ [IngredientIndex] 加载失败，退回全文过滤: {e}")
+                    self._postings = {}
+                self._match_cache = {}
+                self._version = version
+                if self._postings:
+                    print(f"📇 [IngredientIndex] 已加载 {len(self._postings)} 个食材词条")
+        return self._postings
+
+    def available(self) -> bool:
+        return bool(self._load())
+
+    def matching_terms(self, word: str) -> set:
+        """
+        索引里命中该忌口词的食材词条 (子串匹配，"虾" 能命中 "虾仁"、"基围虾")
+        只在词表上扫一次，结果按词缓存
+        """
+        postings = self._load()
+        key = normalize_term(word)
+        terms = self._match_cache.get(key)
+        if terms is None:
+            expanded = expand_term(key)
+            terms = {term for term in postings if any(token in term for token in expanded)}
+            self._match_cache[key] = terms
+        return terms
+
+    def excluded_ids(self, words: list) -> Optional[set]:
+        """
+        含有任一忌口食材的菜谱 ID；索引还没建 (旧数据未重新入库) 时返回 None
+        """
+        postings = self._load()
+        if not postings:
+            return None
+        excluded = set()
+        for word in words:
+            for term in self.matching_terms(word):
+                excluded |= postings[term]
+        return excluded
+
+
+# 全局单例
+ingredient_index = IngredientIndex()
@@ -0,0 +1,195 @@
+import json
+import os
+import re
+
+# 每次从文件读入的字符数；单条记录超过这个长度时缓冲区会自动成倍扩大
+_CHUNK_SIZE = 1 << 20
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+# 紧跟在数字后面时说明数字还没读完
+_NUMBER_TAIL = frozenset('0123456789.eE+-')
+
+
+class _StreamParser:
+    """
+    增量 JSON 解析：文件按块读入缓冲区，用 JSONDecoder.raw_decode 逐个解出顶层容器里的元素
+    内存里只保留当前这一块，和文件总大小无关
+    """
+
+    def __init__(self, f, chunk_size: int = _CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self, grow: bool = False) -> bool:
+        # 连续解析失败说明一条记录比缓冲区还长，成倍读入，避免反复从头解析
+        size = max(self.chunk_size, len(self.buf) - self.pos) if grow else self.chunk_size
+        chunk = self.f.read(size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """跳过空白，返回下一个字符 (文件结束时返回空串)"""
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, chars: str) -> str:
+        char = self.peek()
+        if not char or char not in chars:
+            raise json.JSONDecodeError(f"Expecting one of {chars!r}", self.buf, self.pos)
+        self.pos += 1
+        return char
+
+    def value(self):
+        self.peek()
+        grow = False
+        while True:
+            try:
+                obj, end = self.decoder.raw_decode(self.buf, self.pos)
+                # 数字可能在缓冲区末尾被截断 ("12" 只读到 "1"，"1.5e3" 只读到 "1." / "1.5e")，
+                # raw_decode 会只解出前半截；要看到后面不是数字的一部分才算完整
+                if self.eof or (end < len(self.buf) and not (
+                        isinstance(obj, (int, float)) and self.buf[end] in _NUMBER_TAIL)):
+                    self.pos = end
+                    return obj
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill(grow)
+            grow = True
+
+
+def iter_json_array(path: str, chunk_size: int = _CHUNK_SIZE):
+    """逐条产出顶层 JSON 数组里的元素: [item, item, ...]"""
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        parser = _StreamParser(f, chunk_size)
+        parser.expect('[')
+        if parser.peek() == ']':
+            return
+        while True:
+            yield parser.value()
+            if parser.expect(',]') == ']':
+                return
+
+
+def iter_json_object(path: str, chunk_size: int = _CHUNK_SIZE):
+    """逐条产出顶层 JSON 对象里的 (key, value): {"recipe_1": {...}, ...}"""
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        parser = _StreamParser(f, chunk_size)
+        parser.expect('{')
+        if parser.peek() == '}':
+            return
+        while True:
+            key = parser.value()
+            parser.expect(':')
+            yield key, parser.value()
+            if parser.expect(',}') == '}':
+                return
+
+
+def iter_jsonl(path: str):
+    """逐行产出 JSONL 记录，跳过空行"""
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def iter_records(path: str):
+    """
+    按文件格式自动选择：.jsonl 逐行读；JSON 数组逐个元素；JSON 对象逐个 value
+    """
+    if path.endswith('.jsonl'):
+        yield from iter_jsonl(path)
+        return
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        first = _StreamParser(f).peek()
+    if first == '{':
+        yield from (value for _, value in iter_json_object(path))
+    else:
+        yield from iter_json_array(path)
+
+
+def _open_atomic(path: str):
+    # 先写临时文件，完成后再替换，中途失败不会留下半截的输出文件
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    return tmp_path, open(tmp_path, 'w', encoding='utf-8')
+
+
+class JsonArrayWriter:
+    """
+    逐条写出 JSON 数组 (每个元素占一行)；路径以 .jsonl 结尾时写成一行一条
+    用 with 语句：正常退出才替换目标文件，出错时丢弃临时文件
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.jsonl = path.endswith('.jsonl')
+        self.count = 0
+        self._tmp_path = None
+        self._f = None
+
+    def __enter__(self):
+        self._tmp_path, self._f = _open_atomic(self.path)
+        if not self.jsonl:
+            self._f.write('[')
+        return self
+
+    def write(self, item):
+        line = json.dumps(item, ensure_ascii=False)
+        if self.jsonl:
+            self._f.write(line + '\n')
+        else:
+            self._f.write((',\n' if self.count else '\n') + line)
+        self.count += 1
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None and not self.jsonl:
+            self._f.write('\n]\n')
+        self._f.close()
+        if exc_type is None:
+            os.replace(self._tmp_path, self.path)
+        else:
+            os.remove(self._tmp_path)
+        return False
+
+
+def write_json_array(path: str, items) -> int:
+    """边生成边写出 (格式见 JsonArrayWriter)，返回条数"""
+    with JsonArrayWriter(path) as writer:
+        for item in items:
+            writer.write(item)
+    return writer.count
+
+
+def write_json_object(path: str, pairs) -> int:
+    """边生成边写出 (key, value)，每个成员占一行的 JSON 对象，返回条数"""
+    tmp_path, f = _open_atomic(path)
+    count = 0
+    try:
+        with f:
+            f.write('{')
+            for key, value in pairs:
+                line = f"{json.dumps(str(key), ensure_ascii=False)}: {json.dumps(value, ensure_ascii=False)}"
+                f.write((',\n' if count else '\n') + line)
+                count += 1
+            f.write('\n}\n')
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+    return count
@@ -0,0 +1,124 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from core.config import LLM_MEMO_PATH, LLM_MEMO_MAX_ROWS, LLM_MEMO_TOUCH_INTERVAL, LLM_MODEL_NAME
+
+
+def messages_fingerprint(messages: list) -> list:
+    """把 LangChain 消息 / (role, content) 元组统一转成可序列化的列表，作为记忆键的一部分"""
+    result = []
+    for m in messages:
+        if isinstance(m, tuple):
+            result.append(list(m))
+        else:
+            result.append([m.type, m.content])
+    return result
+
+
+class LLMMemo:
+    """
+    LLM 小变换的持久化记忆表 (SQLite, WAL 模式，多进程共享)
+    键 = 命名空间 + 模型名 + 完整输入 (含 Prompt 模板，模板改动后自动失效)
+    超过 max_rows 时按最近使用时间淘汰；命中时最近使用时间每条最多隔 touch_interval 秒才写一次，
+    读多写少的记忆表不会因为每次命中都写库而在多个 worker 之间抢写锁
+    """
+
+    def __init__(self, path: str = LLM_MEMO_PATH, max_rows: int = LLM_MEMO_MAX_ROWS, model_name: str = LLM_MODEL_NAME,
+                 touch_interval: float = LLM_MEMO_TOUCH_INTERVAL):
+        self.path = path
+        self.max_rows = max_rows
+        self.touch_interval = touch_interval
+        self.model_name = model_name
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._local = threading.local()
+        self._disabled = False
+
+    def _conn(self) -> Optional[sqlite3.Connection]:
+        if self._disabled:
+            return None
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                conn = sqlite3.connect(self.path, timeout=5)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS llm_memo ("
+                    " key TEXT PRIMARY KEY, namespace TEXT NOT NULL, value TEXT NOT NULL,"
+                    " created_at REAL NOT NULL, last_used REAL NOT NULL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_memo_last_used ON llm_memo (last_used)")
+                conn.commit()
+            except Exception as e:
+                print(f"⚠️ [Memo] 记忆表不可用，将直接调用 LLM: {e}")
+                self._disabled = True
+                return None
+            self._local.conn = conn
+        return conn
+
+    def make_key(self, namespace: str, payload) -> str:
+        raw = json.dumps([namespace, self.model_name, payload], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, namespace: str, payload) -> Optional[str]:
+        conn = self._conn()
+        if conn is None:
+            return None
+        key = self.make_key(namespace, payload)
+        try:
+            row = conn.execute("SELECT value, last_used FROM llm_memo WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            now = time.time()
+            if now - row[1] >= self.touch_interval:
+                conn.execute("UPDATE llm_memo SET last_used = ? WHERE key = ?", (now, key))
+                conn.commit()
+            self.hits += 1
+            return row[0]
+        except sqlite3.Error as e:
+            print(f"⚠️ [Memo] 读取失败: {e}")
+            return None
+
+    def set(self, namespace: str, payload, value: str):
+        conn = self._conn()
+        if conn is None or not value:
+            return
+        key = self.make_key(namespace, payload)
+        now = time.time()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_memo (key, namespace, value, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, namespace, value, now, now)
+            )
+            self._writes += 1
+            # 定期淘汰最久未使用的记录
+            if self.max_rows > 0 and self._writes % 200 == 0:
+                conn.execute(
+                    "DELETE FROM llm_memo WHERE key IN ("
+                    " SELECT key FROM llm_memo ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                    (self.max_rows,)
+                )
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"⚠️ [Memo] 写入失败: {e}")
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "enabled": not self._disabled,
+        }
+
+
+# 全局单例
+llm_memo = LLMMemo()
@@ -0,0 +1,76 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from core.config import LLM_MODEL_NAME, INGEST_SOURCE_FILE as SOURCE_FILE
+from core.generator import get_llm, refine_prompt_with_llm
+from core.json_stream import iter_records
+from core.recipe_store import recipe_store, prompt_source_hash
+
+
+def iter_recipes(source_file: str):
+    """从入库源文件中流式取出 (id, 菜名, 标签)，JSON 数组和 JSONL 都支持"""
+    for item in iter_records(source_file):
+        meta = item.get('metadata', {})
+        tags = meta.get('tags', [])
+        if isinstance(tags, str):
+            try: tags = json.loads(tags)
+            except: tags = []
+        if meta.get('id') is None:
+            continue
+        yield str(meta['id']), meta.get('name', ''), tags
+
+
+def precompute_image_prompts(source_file: str = SOURCE_FILE, workers: int = 4, batch_size: int = 50, limit: int = None):
+    """
+    离线批量生成生图 Prompt，写入 recipe_store.image_prompts
+    - 断点续跑：已生成且菜名 / 标签 / 模型都没变的菜谱直接跳过，每批提交一次，中途退出不丢进度
+    - 有界并发：最多 workers 个 LLM 请求同时进行
+    """
+    if not get_llm():
+        print("⚠️ 未配置 SiliconFlow API Key，跳过生图 Prompt 预计算")
+        return
+    if not os.path.exists(source_file):
+        print(f"❌ 错误：找不到源文件 {source_file}")
+        return
+
+    done = recipe_store.image_prompt_hashes()
+    pending = [
+        (recipe_id, name, tags, source_hash)
+        for recipe_id, name, tags in iter_recipes(source_file)
+        for source_hash in [prompt_source_hash(name, tags, LLM_MODEL_NAME)]
+        if done.get(recipe_id) != source_hash
+    ]
+    if limit:
+        pending = pending[:limit]
+    print(f"📋 已有 {len(done)} 条，本次待处理 (新增 / 变化) {len(pending)} 条 (并发 {workers})")
+
+    def refine(recipe):
+        recipe_id, name, tags, source_hash = recipe
+        return recipe_id, name, refine_prompt_with_llm(name, tags, fallback=False), source_hash
+
+    start = time.time()
+    finished, failed = 0, 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for i in range(0, len(pending), batch_size):
+            batch = pending[i:i + batch_size]
+            rows = [row for row in pool.map(refine, batch) if row[2]]
+            recipe_store.save_image_prompts(rows, model_name=LLM_MODEL_NAME)
+            finished += len(rows)
+            failed += len(batch) - len(rows)
+            rate = finished / max(time.time() - start, 1e-6)
+            print(f"   ✅ {finished}/{len(pending)} 完成，失败 {failed}，{rate:.1f} 条/秒")
+
+    print(f"🎉 Prompt 预计算结束：成功 {finished} 条，失败 {failed} 条 (失败的下次运行会重试)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="离线预计算全部菜谱的生图 Prompt")
+    parser.add_argument("--source", default=SOURCE_FILE, help="入库源文件")
+    parser.add_argument("--workers", type=int, default=4, help="并发 LLM 请求数")
+    parser.add_argument("--batch-size", type=int, default=50, help="每批提交条数")
+    parser.add_argument("--limit", type=int, default=None, help="本次最多处理条数")
+    args = parser.parse_args()
+    precompute_image_prompts(args.source, args.workers, args.batch_size, args.limit)
@@ -0,0 +1,252 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from core.cache import VersionedCache
+from core.config import RECIPE_STORE_PATH, RECIPE_DETAIL_CACHE_SIZE
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS image_prompts (
+    recipe_id TEXT PRIMARY KEY,
+    name TEXT,
+    prompt TEXT NOT NULL,
+    model_name TEXT,
+    source_hash TEXT,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ingredient_index (
+    term TEXT NOT NULL,
+    recipe_id TEXT NOT NULL,
+    PRIMARY KEY (term, recipe_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS recipe_details (
+    recipe_id TEXT PRIMARY KEY,
+    name TEXT,
+    tags TEXT NOT NULL,
+    steps TEXT NOT NULL
+);
+"""
+
+
+def normalize_tags(tags) -> list:
+    """标签统一成字符串列表 (兼容旧数据里的 JSON 字符串)"""
+    if isinstance(tags, str):
+        try:
+            tags = json.loads(tags)
+        except ValueError:
+            return []
+    return [str(t) for t in tags or [] if t]
+
+
+def normalize_steps(instructions) -> list:
+    """
+    步骤统一成 RecipeStep 的字段结构 (入库时做一次，在线请求直接 model_construct，不再逐条校验)
+    [{"step_index": 1, "description": "...", "image_url": None}, ...]
+    """
+    if isinstance(instructions, str):
+        try:
+            instructions = json.loads(instructions)
+        except ValueError:
+            return []
+    steps = []
+    for step in instructions or []:
+        if not isinstance(step, dict):
+            continue
+        img_link = step.get('image_url') or step.get('imgLink')
+        if not img_link or img_link == "null":
+            img_link = None
+        description = step.get('description')
+        steps.append({
+            "step_index": len(steps) + 1,
+            "description": str(description) if description is not None else "",
+            "image_url": str(img_link) if img_link else None,
+        })
+    return steps
+
+
+def prompt_source_hash(name: str, tags, model_name: str = None) -> str:
+    """生图 Prompt 的来源指纹：菜名 + 标签 + 模型，任何一项变化预计算的 Prompt 就作废"""
+    payload = json.dumps([name or "", normalize_tags(tags), model_name or ""], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class RecipeStore:
+    """
+    菜谱离线数据存储 (SQLite)，按菜谱 ID 索引
+    由离线任务写入，在线请求只读
+    """
+
+    def __init__(self, path: str = RECIPE_STORE_PATH):
+        self.path = path
+        self._local = threading.local()
+        # 解析好的菜谱详情，重新入库 (索引版本变化) 后自动清空
+        self._detail_cache = VersionedCache(maxsize=RECIPE_DETAIL_CACHE_SIZE)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            # 旧库的 image_prompts 没有来源指纹列：补上，旧行指纹为空，视为过期
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(image_prompts)")}
+            if "source_hash" not in columns:
+                conn.execute("ALTER TABLE image_prompts ADD COLUMN source_hash TEXT")
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    # --- 预计算的生图 Prompt ---
+    def get_image_prompt(self, recipe_id: str, source_hash: str) -> Optional[str]:
+        """按菜谱 ID 取预计算的 Prompt；菜名 / 标签 / 模型变过 (来源指纹对不上) 的返回 None"""
+        if not recipe_id:
+            return None
+        try:
+            row = self._conn().execute(
+                "SELECT prompt FROM image_prompts WHERE recipe_id = ? AND source_hash = ?",
+                (str(recipe_id), source_hash)
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"⚠️ [RecipeStore] 读取 Prompt 失败: {e}")
+            return None
+        return row[0] if row else None
+
+    def image_prompt_hashes(self) -> dict:
+        """已经生成过 Prompt 的 {菜谱 ID: 来源指纹} (断点续跑用，指纹对不上的重新生成)"""
+        return dict(self._conn().execute("SELECT recipe_id, source_hash FROM image_prompts"))
+
+    def save_image_prompts(self, rows: list, model_name: str = None):
+        """批量写入 [(recipe_id, name, prompt, source_hash), ...]"""
+        now = time.time()
+        conn = self._conn()
+        conn.executemany(
+            "INSERT OR REPLACE INTO image_prompts (recipe_id, name, prompt, model_name, source_hash, created_at)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            [(str(rid), name, prompt, model_name, source_hash, now) for rid, name, prompt, source_hash in rows]
+        )
+        conn.commit()
+
+    # --- 食材倒排索引 (入库时生成) ---
+    def replace_ingredient_index(self, rows):
+        """整表替换 [(recipe_id, [食材名, ...]), ...]，在一个事务里完成，在线读不到半截索引"""
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM ingredient_index")
+            conn.executemany(
+                "INSERT OR IGNORE INTO ingredient_index (term, recipe_id) VALUES (?, ?)",
+                ((term, str(rid)) for rid, terms in rows for term in terms)
+            )
+
+    def ingredient_postings(self) -> dict:
+        """食材 -> 菜谱 ID 集合"""
+        postings = {}
+        for term, rid in self._conn().execute("SELECT term, recipe_id FROM ingredient_index"):
+            postings.setdefault(term, set()).add(rid)
+        return postings
+
+
+    # --- 菜谱详情 (入库时解析好的标签 / 步骤，替代向量库 metadata 里的 JSON 字符串) ---
+    def save_recipe_details(self, rows, replace: bool = False):
+        """
+        批量写入 [(recipe_id, name, tags, steps), ...]，tags / steps 需已经过 normalize_*
+        replace=True 时整表替换 (全量入库)
+        """
+        conn = self._conn()
+        with conn:
+            if replace:
+                conn.execute("DELETE FROM recipe_details")
+            conn.executemany(
+                "INSERT OR REPLACE INTO recipe_details (recipe_id, name, tags, steps) VALUES (?, ?, ?, ?)",
+                (
+                    (str(rid), name, json.dumps(tags, ensure_ascii=False), json.dumps(steps, ensure_ascii=False))
+                    for rid, name, tags, steps in rows
+                )
+            )
+        self._detail_cache.clear()
+
+    # --- 流式整表替换 (入库时分批写暂存表，全部写完后在一个短事务里换上线) ---
+    def begin_replace(self):
+        """清空暂存表，准备接收新一轮入库数据"""
+        self._conn().executescript(
+            "DROP TABLE IF EXISTS ingredient_index_staging;"
+            "DROP TABLE IF EXISTS recipe_details_staging;"
+            "CREATE TABLE ingredient_index_staging ("
+            " term TEXT NOT NULL, recipe_id TEXT NOT NULL, PRIMARY KEY (term, recipe_id)) WITHOUT ROWID;"
+            "CREATE TABLE recipe_details_staging ("
+            " recipe_id TEXT PRIMARY KEY, name TEXT, tags TEXT NOT NULL, steps TEXT NOT NULL);"
+        )
+
+    def stage_batch(self, index_rows, detail_rows):
+        """
+        写入一批暂存数据 (格式同 replace_ingredient_index / save_recipe_details)
+        同一个菜谱 ID 以第一次写入为准；每批单独提交，不长时间占用写锁
+        """
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO ingredient_index_staging (term, recipe_id) VALUES (?, ?)",
+                ((term, str(rid)) for rid, terms in index_rows for term in terms)
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO recipe_details_staging (recipe_id, name, tags, steps) VALUES (?, ?, ?, ?)",
+                (
+                    (str(rid), name, json.dumps(tags, ensure_ascii=False), json.dumps(steps, ensure_ascii=False))
+                    for rid, name, tags, steps in detail_rows
+                )
+            )
+
+    def commit_replace(self) -> tuple:
+        """暂存表整体替换线上表，返回 (有食材索引的菜谱数, 详情条数)"""
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM ingredient_index")
+            conn.execute("INSERT INTO ingredient_index (term, recipe_id) SELECT term, recipe_id FROM ingredient_index_staging")
+            conn.execute("DELETE FROM recipe_details")
+            conn.execute(
+                "INSERT INTO recipe_details (recipe_id, name, tags, steps)"
+                " SELECT recipe_id, name, tags, steps FROM recipe_details_staging"
+            )
+            indexed = conn.execute("SELECT COUNT(DISTINCT recipe_id) FROM ingredient_index").fetchone()[0]
+            details = conn.execute("SELECT COUNT(*) FROM recipe_details").fetchone()[0]
+        conn.executescript("DROP TABLE IF EXISTS ingredient_index_staging; DROP TABLE IF EXISTS recipe_details_staging;")
+        self._detail_cache.clear()
+        return indexed, details
+
+    def get_recipe_details(self, recipe_ids: list) -> dict:
+        """
+        按 ID 批量读取菜谱详情 {recipe_id: {"recipe_id", "name", "tags", "steps"}}
+        热门菜谱命中内存缓存，未命中的一条 SQL 取回；不存在的 ID 不出现在结果里
+        """
+        details, missing = {}, []
+        for rid in dict.fromkeys(str(r) for r in recipe_ids if r not in (None, "")):
+            detail = self._detail_cache.get(rid)
+            if detail is not None:
+                details[rid] = detail
+            else:
+                missing.append(rid)
+
+        conn = self._conn()
+        for start in range(0, len(missing), 500):  # SQLite 参数个数有上限，分批查询
+            chunk = missing[start:start + 500]
+            try:
+                rows = conn.execute(
+                    f"SELECT recipe_id, name, tags, steps FROM recipe_details WHERE recipe_id IN ({','.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall()
+            except sqlite3.Error as e:
+                print(f"⚠️ [RecipeStore] 读取菜谱详情失败: {e}")
+                break
+            for rid, name, tags, steps in rows:
+                detail = {"recipe_id": rid, "name": name, "tags": json.loads(tags), "steps": json.loads(steps)}
+                self._detail_cache.set(rid, detail)
+                details[rid] = detail
+        return details
+
+
+# 全局单例
+recipe_store = RecipeStore()
@@ -0,0 +1,66 @@
+import threading
+
+from core.config import RERANKER_MODEL_NAME, RERANKER_MAX_LENGTH, RERANKER_BATCH_SIZE
+
+
+class Reranker:
+    """
+    本地 Cross-Encoder 精排 (bge-reranker 一类模型)，可选
+    把 (查询, 菜谱文本) 成对打分，一次批量前向就能给所有候选排好序，不再为挑一道菜走一次远程 LLM
+    """
+
+    def __init__(self, model_name: str = RERANKER_MODEL_NAME, max_length: int = RERANKER_MAX_LENGTH,
+                 batch_size: int = RERANKER_BATCH_SIZE):
+        self.model_name = model_name
+        self.max_length = max_length
+        self.batch_size = batch_size
+        self._model = None
+        self._failed = False
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.model_name) and not self._failed
+
+    def _load(self):
+        if self._model is not None or not self.enabled:
+            return self._model
+        with self._lock:
+            if self._model is None and not self._failed:
+                try:
+                    from sentence_transformers import CrossEncoder
+                    from core.embeddings import detect_device
+
+                    print(f"🔄 [Reranker] 正在加载精排模型: {self.model_name}")
+                    self._model = CrossEncoder(self.model_name, max_length=self.max_length, device=detect_device())
+                    print("✅ [Reranker] 精排模型加载完成")
+                except Exception as e:
+                    # 模型下载失败 / 依赖缺失时关闭精排，检索照常返回融合排序
+                    print(f"⚠️ [Reranker] 精排模型不可用，已关闭精排: {e}")
+                    self._failed = True
+        return self._model
+
+    def warmup(self) -> bool:
+        """提前加载精排模型 (服务启动预热用)，返回模型是否可用"""
+        return self._load() is not None
+
+    def rerank(self, query: str, candidates: list) -> list:
+        """
+        按相关度从高到低重排候选 (每条附带 rerank_score)；模型不可用时原样返回
+        """
+        if len(candidates) < 2:
+            return candidates
+        model = self._load()
+        if model is None:
+            return candidates
+
+        pairs = [(query, doc.get('content', '')) for doc in candidates]
+        scores = model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False)
+        ranked = [dict(doc, rerank_score=float(score)) for doc, score in zip(candidates, scores)]
+        ranked.sort(key=lambda doc: doc['rerank_score'], reverse=True)
+        print(f"🏅 [Reranker] 精排完成，首选: {ranked[0].get('name')} ({ranked[0]['rerank_score']:.3f})")
+        return ranked
+
+
+# 全局单例：模型在第一次精排时才加载
+reranker = Reranker()
@@ -1,7 +1,18 @@
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_chroma import Chroma
-from core.config import DB_PATH_V3, EMBEDDING_MODEL_NAME, COLLECTION_NAME
-import torch
+from core.config import DB_PATH_V3, RETRIEVAL_WORKERS, RETRIEVAL_MAX_FETCH, RETRIEVAL_NIN_MAX, HYBRID_RETRIEVAL, RRF_K, BM25_MIN_SCORE_RATIO
+from core.embeddings import build_embeddings, CachedQueryEmbeddings
+from core.cache import read_index_version, read_active_collection, lexical_index_path
+from core.ingredient_index import ingredient_index
+from core.bm25 import BM25Index, load_index
+from core.reranker import reranker
+from langchain_core.documents import Document
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import asyncio
+import threading
+import numpy as np
+
+# 检索专用线程池：只跑 CPU 密集的 Embedding + 向量查询
+_retrieval_executor = ThreadPoolExecutor(max_workers=RETRIEVAL_WORKERS, thread_name_prefix="retriever")
 
 class VectorDBManager:
     """
@@ -9,94 +20,357 @@ class VectorDBManager:
     """
     _instance = None
     _vector_store = None
+    _embeddings = None
+    _version = None
+    _collection = None  # 向量库当前打开的 collection 名
+    _lock = threading.Lock()
+    _lexical = None  # (索引版本, BM25Index, 文档列表)
+    _lexical_lock = threading.Lock()
 
     @classmethod
     def get_vector_store(cls):
-        if cls._vector_store is None:
-            print(f"🔄 [Retriever] 正在初始化向量库: {DB_PATH_V3}")
+        # 重新入库后 (索引版本变化) 重新打开向量库，Embedding 模型和查询向量缓存继续复用
+        if cls._vector_store is not None and cls._version == read_index_version():
+            return cls._vector_store
+        # 检索线程池里可能同时有多个请求触发初始化，加锁保证只加载一次模型
+        with cls._lock:
+            return cls._load_vector_store()
+
+    @classmethod
+    def _load_vector_store(cls):
+        version = read_index_version()
+        if cls._vector_store is None or cls._version != version:
+            print(f"🔄 [Retriever] 正在初始化向量库: {DB_PATH_V3}/{read_active_collection()} (索引版本: {version or '-'})")
             try:
-                if torch.backends.mps.is_available():
-                    device = "mps"
-                elif torch.cuda.is_available():
-                    device = "cuda"
-                else:
-                    device = "cpu"
-                embeddings = HuggingFaceEmbeddings(
-                    model_name=EMBEDDING_MODEL_NAME,
-                    model_kwargs={'device': device},
-                    encode_kwargs={'normalize_embeddings': True}
-                )
+                # langchain_chroma (连带 chromadb) 在第一次打开向量库时才导入，不拖慢服务启动
+                from langchain_chroma import Chroma
+
+                # 查询向量走缓存，热门搜索词不再重复编码
+                if cls._embeddings is None:
+                    cls._embeddings = CachedQueryEmbeddings(build_embeddings())
                 # ⚠️ collection_name 必须和你 ingest 入库时的一致！
-                # 之前我们用的是 "recipe_collection_v3"
+                # 增量入库会在影子 collection 里建好再切换指针，这里按指针打开 (默认 "recipe_collection_v3")
+                collection_name = read_active_collection()
                 cls._vector_store = Chroma(
-                    collection_name=COLLECTION_NAME, 
-                    embedding_function=embeddings,
+                    collection_name=collection_name, 
+                    embedding_function=cls._embeddings,
                     persist_directory=DB_PATH_V3
                 )
+                cls._collection = collection_name
+                cls._version = version
                 print("✅ [Retriever] 向量库加载完成")
             except Exception as e:
                 print(f"❌ [Retriever] 数据库加载失败: {e}")
                 return None
         return cls._vector_store
 
+    @classmethod
+    def get_lexical_index(cls):
+        """
+        BM25 关键词索引：优先加载入库时落盘的索引 (core.bm25.save_index)，索引版本变化后重新加载
+        没有索引文件 (旧数据 / 关闭混合检索时入库) 才从向量库里读出全部文档现场构建
+        返回 (BM25Index, [Document, ...])；向量库不可用时返回 None
+        """
+        db = cls.get_vector_store()
+        if db is None:
+            return None
+        version = cls._version
+        if cls._lexical is not None and cls._lexical[0] == version:
+            return cls._lexical[1:]
+        with cls._lexical_lock:
+            if cls._lexical is None or cls._lexical[0] != version:
+                loaded = load_index(lexical_index_path(cls._collection))
+                if loaded is not None:
+                    index, texts, metadatas = loaded
+                    source = "已加载"
+                else:
+                    print("🔄 [Retriever] 没有入库时的 BM25 索引文件，正在现场构建...")
+                    data = db.get(include=["documents", "metadatas"])
+                    texts = [text or "" for text in data.get("documents", [])]
+                    metadatas = [meta or {} for meta in data.get("metadatas", [])]
+                    index = BM25Index(texts)
+                    source = "构建完成"
+                docs = [Document(page_content=text, metadata=meta) for text, meta in zip(texts, metadatas)]
+                cls._lexical = (version, index, docs)
+                print(f"✅ [Retriever] BM25 索引{source}: {len(docs)} 条")
+        return cls._lexical[1:]
+
+    @classmethod
+    def warmup(cls) -> bool:
+        """
+        预热：打开向量库、加载 Embedding 模型并跑一次查询 (顺带把 HNSW 索引读进内存)
+        开启混合检索时构建 BM25 索引，配置了精排模型时加载精排模型；向量库不可用时返回 False
+        """
+        db = cls.get_vector_store()
+        if db is None:
+            return False
+        db.similarity_search_with_score("家常菜", k=1)
+        if HYBRID_RETRIEVAL:
+            cls.get_lexical_index()
+        if reranker.enabled:
+            reranker.warmup()
+        return True
+
+    @classmethod
+    def embedding_cache_stats(cls) -> dict:
+        """查询向量缓存的命中统计"""
+        if cls._embeddings is None:
+            return {}
+        return cls._embeddings.stats()
+
+
+def avoid_words(preferences: dict = None) -> list:
+    """合并用户的忌口和过敏源，去空去重 (保持原有顺序)"""
+    if not preferences:
+        return []
+    words = (preferences.get("dislikes", []) or []) + (preferences.get("allergies", []) or [])
+    return list(dict.fromkeys(str(w).strip() for w in words if w and str(w).strip()))
+
+
+def build_exclusion_filter(words: list) -> dict:
+    """
+    把忌口词转成 Chroma 的 where_document 条件，在向量查询内部排除
+    (文档内容以 "菜名 / 标签 / 食材" 开头，和原来的后置过滤检查范围一致)
+    """
+    if not words:
+        return None
+    clauses = [{"$not_contains": word} for word in words]
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def _format_doc(doc, score: float) -> dict:
+    res = {
+        "id": doc.metadata.get('id', ''),          # 建议加上 ID
+        "name": doc.metadata.get('name', '未知'),
+        "canonical_name": doc.metadata.get('canonical_name', ''),  # 入库时生成的去重键
+        "cluster_id": doc.metadata.get('cluster_id', ''),          # 入库时离线聚类的簇 (近重复菜谱同簇)
+        "tags": doc.metadata.get('tags', ''),
+        "image": doc.metadata.get('image', ''),
+        "content": doc.page_content,
+        "score": score
+    }
+    # 步骤由 recipe_store 按 ID 取回；只有旧版入库的数据 (步骤还在 metadata 里) 才带上，给 _recipe_payload 兜底
+    if 'instructions' in doc.metadata:
+        res["instructions"] = doc.metadata['instructions']
+    return res
+
 
-def retrieve_docs(query: str, top_k: int = 4, score_threshold: float = 1.0, preferences: dict = None):
+def _cluster_key(res: dict) -> str:
+    """同一个簇的菜谱视为同一道菜 (没有聚类信息的旧数据按菜谱 ID)"""
+    return str(res.get('cluster_id') or res.get('id') or res.get('name'))
+
+
+def _is_safe(res: dict, avoid_list: list, excluded_ids: set = None) -> bool:
+    """
+    后置兜底检查 (大小写不敏感)
+    有倒排索引时：菜名 / 标签子串 + 食材集合查找；没有索引时退回原来的全文扫描
+    """
+    if excluded_ids is not None:
+        if str(res['id']) in excluded_ids:
+            print(f"   -> 剔除 '{res['name']}' (食材命中忌口)")
+            return False
+        text_to_check = (res['name'] + str(res['tags'])).lower()
+    else:
+        text_to_check = (res['name'] + str(res['tags']) + res['content']).lower()
+    for word in avoid_list:
+        if word in text_to_check:
+            print(f"   -> 剔除 '{res['name']}' (包含忌口: {word})")
+            return False
+    return True
+
+
+def build_query_filters(words: list):
+    """
+    忌口 -> (where, where_document, excluded_ids)
+    有食材倒排索引时按菜谱 ID 排除 (数量不多时下推为 $nin)，否则退回文档内容的 $not_contains
+    """
+    if not words:
+        return None, None, None
+    excluded_ids = ingredient_index.excluded_ids(words)
+    if excluded_ids is None:
+        return None, build_exclusion_filter(words), None
+    where = None
+    if 0 < len(excluded_ids) <= RETRIEVAL_NIN_MAX:
+        where = {"id": {"$nin": sorted(excluded_ids)}}
+    return where, None, excluded_ids
+
+
+def _vector_search(db, query: str, top_k: int, score_threshold: float, avoid_list: list,
+                   where: dict = None, where_document: dict = None, excluded_ids: set = None) -> list:
+    """
+    向量召回：过滤条件下推到 Chroma；安全结果不够 top_k 时按倍数扩大召回重查，
+    直到凑够、库里没有更多、超出阈值或达到上限
+    """
+    fetch_k = max(1, top_k)
+    while True:
+        try:
+            results = db.similarity_search_with_score(query, k=fetch_k, filter=where, where_document=where_document)
+        except Exception as e:
+            if where is None and where_document is None:
+                raise
+            # 向量库不支持该过滤条件时退回纯后置过滤
+            print(f"⚠️ [Retriever] 过滤条件下推失败，改为后置过滤: {e}")
+            where, where_document = None, None
+            continue
+
+        print(f"🔎 [Retriever] 检索到 {len(results)} 条 (k={fetch_k})，阈值: {score_threshold}")
+        filtered_results = []
+        seen_clusters = set()
+        for doc, score in results:
+            print(f"   - {doc.metadata.get('name')} (Score: {score:.4f})")
+            # 恢复正常的阈值过滤
+            if score > score_threshold:
+                continue
+            res = _format_doc(doc, score)
+            # 每个簇只保留排名最高的一条，top_k 不会被同一道菜的多个版本占满
+            if _cluster_key(res) in seen_clusters:
+                continue
+            if not avoid_list or _is_safe(res, avoid_list, excluded_ids):
+                filtered_results.append(res)
+                seen_clusters.add(_cluster_key(res))
+
+        exhausted = len(results) < fetch_k                                  # 库里没有更多了
+        beyond_threshold = bool(results) and results[-1][1] > score_threshold  # 再往后只会更不相关
+        if len(filtered_results) >= top_k or exhausted or beyond_threshold or fetch_k >= RETRIEVAL_MAX_FETCH:
+            return filtered_results[:top_k]
+        fetch_k = min(fetch_k * 2, RETRIEVAL_MAX_FETCH)
+
+
+def _lexical_search(query: str, top_k: int, avoid_list: list, excluded_ids: set = None) -> list:
+    """
+    BM25 关键词召回 (食材名类查询如 "土豆 牛肉" 向量模型容易排偏)，忌口过滤与向量召回一致
+    只共享单字或得分过低的文档不算命中 (见 BM25Index.search)，无关查询仍然可以走 "暂未收录"
+    关键词命中的文档没有向量距离，score 为 None
+    """
+    lexical = VectorDBManager.get_lexical_index()
+    if not lexical:
+        return []
+    index, docs = lexical
+
+    fetch_k = max(1, top_k) * 2
+    while True:
+        hits = index.search(query, k=fetch_k, min_score_ratio=BM25_MIN_SCORE_RATIO)
+        results = []
+        seen_clusters = set()
+        for doc_id, _ in hits:
+            res = _format_doc(docs[doc_id], None)
+            if _cluster_key(res) in seen_clusters:
+                continue
+            if not avoid_list or _is_safe(res, avoid_list, excluded_ids):
+                results.append(res)
+                seen_clusters.add(_cluster_key(res))
+        if len(results) >= top_k or len(hits) < fetch_k or fetch_k >= RETRIEVAL_MAX_FETCH:
+            print(f"🔤 [Retriever] BM25 命中 {len(results)} 条")
+            return results[:top_k]
+        fetch_k = min(fetch_k * 2, RETRIEVAL_MAX_FETCH)
+
+
+def reciprocal_rank_fusion(result_lists: list, k: int = RRF_K) -> list:
+    """
+    RRF 融合：每个文档得分 = Σ 1 / (k + 排名)，多路都排前面的文档胜出
+    同一文档 (同一个簇) 以先出现的那一路 (向量召回，带距离分数) 的记录为准
+    rrf_top_routes 记录该文档在几路召回里排第一 (见 is_confident_top)
+    """
+    fused = {}
+    for results in result_lists:
+        for rank, res in enumerate(results):
+            key = _cluster_key(res)
+            entry = fused.get(key)
+            if entry is None:
+                entry = fused[key] = dict(res, rrf_score=0.0, rrf_top_routes=0)
+            entry['rrf_score'] += 1.0 / (k + rank + 1)
+            if rank == 0:
+                entry['rrf_top_routes'] += 1
+    return sorted(fused.values(), key=lambda res: res['rrf_score'], reverse=True)
+
+
+def is_confident_top(results: list) -> bool:
+    """
+    第一名是否足够确定：只有一个候选，或融合后的第一名在向量和 BM25 两路里都排第一
+    确定时直接选它，不必再让 LLM 从候选里挑
+    """
+    if len(results) == 1:
+        return True
+    return bool(results) and results[0].get('rrf_top_routes', 0) >= 2
+
+
+def retrieve_docs(query: str, top_k: int = 4, score_threshold: float = 1.0, preferences: dict = None,
+                  rerank: bool = True):
     """
     检索核心函数
     :param preferences: 用户偏好字典，例如 {"dislikes": ["香菜", "辣"]}
+    :param rerank: 配置了本地精排模型时，是否对最终候选做 Cross-Encoder 重排
+    忌口过滤下推到 Chroma 查询里 (食材倒排索引 -> id $nin，或 where_document)，一次就能拿到 top_k 条安全结果；
+    开启混合检索时再与 BM25 关键词召回做 RRF 融合
     """
     db = VectorDBManager.get_vector_store()
     if not db:
         return []
 
-    # 执行检索
-    results = db.similarity_search_with_score(query, k=top_k)
-    
-    # 格式化结果
-    filtered_results = []
-    print(f"🔎 [Retriever] 检索到 {len(results)} 条，阈值: {score_threshold}")
-    
-    for doc, score in results:
-        print(f"   - {doc.metadata.get('name')} (Score: {score:.4f})")
-        # 恢复正常的阈值过滤
-        if score <= score_threshold:
-            filtered_results.append({
-                "id": doc.metadata.get('id', ''),          # 建议加上 ID
-                "name": doc.metadata.get('name', '未知'),
-                "tags": doc.metadata.get('tags', ''),
-                "image": doc.metadata.get('image', ''),
-                
-                # ✅【新增关键修改】提取步骤数据
-                "instructions": doc.metadata.get('instructions', []), 
-                
-                "content": doc.page_content,
-                "score": score
-            })
-            
-    # --- 后置过滤 (Post-Retrieval Filtering) based on User Preferences ---
-    if preferences:
-        final_results = []
-        dislikes = preferences.get("dislikes", [])
-        allergies = preferences.get("allergies", [])
-        
-        # 将不喜欢和过敏源合并检查
-        avoid_list = [x.lower() for x in (dislikes + allergies) if x]
-        
-        if avoid_list:
-            print(f"🛑 [Retriever] 正在过滤用户忌口: {avoid_list}")
-            for res in filtered_results:
-                # 检查菜品名称、标签和内容是否包含忌口词
-                text_to_check = (res['name'] + str(res['tags']) + res['content']).lower()
-                
-                is_safe = True
-                for word in avoid_list:
-                    if word in text_to_check:
-                        print(f"   -> 剔除 '{res['name']}' (包含忌口: {word})")
-                        is_safe = False
-                        break
-                
-                if is_safe:
-                    final_results.append(res)
-            return final_results
-
-    return filtered_results
\ No newline at end of file
+    words = avoid_words(preferences)
+    avoid_list = [w.lower() for w in words]
+    where, where_document, excluded_ids = build_query_filters(words)
+    if words:
+        mode = f"食材索引排除 {len(excluded_ids)} 道" if excluded_ids is not None else "全文过滤"
+        print(f"🛑 [Retriever] 正在过滤用户忌口: {avoid_list} ({mode})")
+
+    results = _vector_search(db, query, top_k, score_threshold, avoid_list, where, where_document, excluded_ids)
+    if HYBRID_RETRIEVAL:
+        try:
+            lexical_results = _lexical_search(query, top_k, avoid_list, excluded_ids)
+            results = reciprocal_rank_fusion([results, lexical_results])[:top_k]
+        except Exception as e:
+            print(f"⚠️ [Retriever] BM25 召回失败，仅使用向量结果: {e}")
+
+    if rerank and reranker.enabled:
+        try:
+            results = reranker.rerank(query, results)
+        except Exception as e:
+            print(f"⚠️ [Retriever] 精排失败，保留原排序: {e}")
+    return results
+
+
+def fetch_doc_embeddings(ids: list) -> dict:
+    """
+    按菜谱 ID 取回入库时存的文档向量 (已归一化)，去重时直接算余弦相似度，不用重新编码
+    """
+    db = VectorDBManager.get_vector_store()
+    ids = [str(i) for i in ids if i not in (None, "")]
+    if not db or not ids:
+        return {}
+    try:
+        data = db.get(where={"id": {"$in": ids}}, include=["embeddings", "metadatas"])
+    except Exception as e:
+        print(f"⚠️ [Retriever] 读取文档向量失败，仅按菜名去重: {e}")
+        return {}
+    embeddings = data.get("embeddings")
+    if embeddings is None:
+        return {}
+    return {
+        str(meta.get('id')): np.asarray(vector, dtype=np.float32)
+        for meta, vector in zip(data.get("metadatas", []), embeddings)
+        if meta
+    }
+
+
+async def afetch_doc_embeddings(ids: list) -> dict:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_retrieval_executor, fetch_doc_embeddings, ids)
+
+
+async def aretrieve_docs(query: str, top_k: int = 4, score_threshold: float = 1.0, preferences: dict = None,
+                        rerank: bool = True):
+    """
+    检索核心函数 (异步版)：在检索专用线程池中执行，不阻塞事件循环
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _retrieval_executor,
+        partial(retrieve_docs, query, top_k=top_k, score_threshold=score_threshold, preferences=preferences, rerank=rerank)
+    )
+
+
+async def awarmup() -> bool:
+    """预热 (异步版)：在检索线程池里执行，服务启动时后台调用"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_retrieval_executor, VectorDBManager.warmup)
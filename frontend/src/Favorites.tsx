@@ -1,10 +1,13 @@
 import React, { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { ArrowLeft, Clock, Gauge, Heart, ChefHat } from 'lucide-react';
-import type { Recipe } from './types';
+import type { Recipe, RecipeResponse } from './types';
 import { useUser } from './context/UserContext';
 import { getNamespacedKey } from './lib/storage';
-import axios from 'axios';
+import api from './lib/api'; // Use our custom api client
+
+// Matches MAX_RECIPE_IDS in app/main.py
+const MAX_IDS_PER_REQUEST = 100;
 
 const FavoritesPage = () => {
     const navigate = useNavigate();
@@ -24,34 +27,45 @@ const FavoritesPage = () => {
                 return;
             }
 
-            try {
-                // In a real backend we would have an endpoint like /api/recipes?ids=...
-                // Only for demo: we simulate fetching by searching or handling ID individually 
-                // Since our backend is limited, we might not be able to fetch details easily by ID list 
-                // without n+1 calls. Let's try to fetch them one by one for now (optimization for later).
-
-                // Note: The current backend /api/search returns 'candidates'. 
-                // To fetch a specific recipe by ID, we might not have a direct endpoint yet.
-                // However, the Detail page works by passing status. If we reload Detail page directly, does it work?
-                // Actually the current Detail page relies on `location.state`. It crashes if refreshed.
-                // WE NEED TO FIX THIS: To support Favorites properly, best is to store the *entire* recipe object in localStorage 
-                // for this prototype, to avoid backend complexity of fetching by ID.
-
-                // Let's check what Detail.tsx does. It saves ONLY ID.
-                // Change of Plan: To make this robust without backend changes, let's load what we can.
-                // BUT, if we only have ID, we can't show title/image easily.
+            // Locally saved copies (written by Detail.tsx) are the fallback when the backend is unreachable
+            const savedMap = JSON.parse(localStorage.getItem(savedMapKey) || '{}');
 
-                // ALTERNATIVE: Since we want a "high end" experience, let's assume valid data.
-                // I'll update Detail.tsx to save the WHOLE recipe object to 'aichef_saved_recipes' map.
-
-                // I'll update Detail.tsx to save the WHOLE recipe object to 'aichef_saved_recipes' map.
+            // The backend caps ?ids= at MAX_RECIPE_IDS (100) per request, so large collections are fetched in chunks
+            const chunks: string[][] = [];
+            for (let i = 0; i < favIds.length; i += MAX_IDS_PER_REQUEST) {
+                chunks.push(favIds.slice(i, i + MAX_IDS_PER_REQUEST));
+            }
 
-                const savedMap = JSON.parse(localStorage.getItem(savedMapKey) || '{}');
-                const loadedRecipes = favIds.map((id: string) => savedMap[id]).filter(Boolean);
+            try {
+                // One indexed read per chunk instead of N searches; a failed chunk falls back to saved copies
+                const results = await Promise.allSettled(chunks.map((chunk) =>
+                    api.get<RecipeResponse>('/api/recipes', { params: { ids: chunk.join(',') } })
+                ));
+                const byId = new Map<string, Recipe>();
+                results.forEach((result) => {
+                    if (result.status === 'fulfilled') {
+                        result.value.data.candidates.forEach((recipe) => byId.set(recipe.recipe_id, recipe));
+                    } else {
+                        console.error("Failed to load favorites", result.reason);
+                    }
+                });
+                const loadedRecipes = favIds
+                    .map((id: string) => {
+                        const fresh = byId.get(String(id));
+                        const saved = savedMap[id];
+                        if (!fresh) return saved;
+                        // The backend has no cover yet (or the remote one expired): keep the cover saved with the copy
+                        if (!fresh.cover_image && saved?.cover_image) {
+                            return { ...fresh, cover_image: saved.cover_image, cover_thumbnail: saved.cover_thumbnail };
+                        }
+                        return fresh;
+                    })
+                    .filter(Boolean);
                 setRecipes(loadedRecipes);
 
             } catch (err) {
                 console.error("Failed to load favorites", err);
+                setRecipes(favIds.map((id: string) => savedMap[id]).filter(Boolean));
             } finally {
                 setLoading(false);
             }
@@ -105,7 +119,7 @@ const FavoritesPage = () => {
                                 <div className="aspect-[4/3] relative bg-slate-100 overflow-hidden">
                                     {recipe.cover_image ? (
                                         <img
-                                            src={recipe.cover_image}
+                                            src={recipe.cover_thumbnail || recipe.cover_image}
                                             alt={recipe.recipe_name}
                                             className="w-full h-full object-cover group-hover:scale-105 transition-transform duration-500"
                                         />
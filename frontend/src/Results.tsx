@@ -229,7 +229,7 @@ const ResultsPage = () => {
                                     <div className="aspect-[4/3] bg-slate-100 relative overflow-hidden flex items-center justify-center">
                                         {recipe.cover_image ? (
                                             <img
-                                                src={recipe.cover_image}
+                                                src={recipe.cover_thumbnail || recipe.cover_image}
                                                 alt={recipe.recipe_name}
                                                 className="w-full h-full object-cover group-hover:scale-105 transition-transform duration-500"
                                                 onError={(e) => {
@@ -10,6 +10,7 @@ export interface Recipe {
     recipe_name: string;
     tags: string[];
     cover_image: string | null;
+    cover_thumbnail?: string | null; // Local WebP thumbnail for cards (when mirrored)
     steps: RecipeStep[];
     message: string;
     match_score?: number; // Optional, for frontend display
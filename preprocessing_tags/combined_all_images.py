@@ -1,5 +1,11 @@
-import json
 import os
+import sys
+from collections import OrderedDict
+
+# 在项目根目录下运行 (python preprocessing_tags/combined_all_images.py)，core 包需要在导入路径里
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.json_stream import iter_json_array, iter_json_object, write_json_array
 
 # --- 配置文件路径 ---
 # RAG 准备好的数据路径
@@ -9,47 +15,62 @@ raw_file_path = 'data/raw/recipeData_with_tags.json'
 # 输出文件路径
 output_file_path = 'data/rag_ready_final.json'
 
-print(f"正在读取文件...\n1. {rag_file_path}\n2. {raw_file_path}")
-
-# 1. 读取两个文件
-try:
-    with open(rag_file_path, 'r', encoding='utf-8') as f:
-        rag_data = json.load(f)
-
-    with open(raw_file_path, 'r', encoding='utf-8') as f:
-        raw_data = json.load(f)
-except FileNotFoundError as e:
-    print(f"\n❌ 错误：找不到文件 - {e.filename}")
-    print("请检查文件路径是否正确，或者脚本是否在根目录下运行。")
-    exit()
-
-print(f"读取成功，开始合并 {len(rag_data)} 条数据...")
-
-# 2. 循环合并
-count = 0
-for item in rag_data:
-    # 获取 RAG 数据里的 id (确保转换为字符串以防万一)
-    rec_id = str(item['metadata']['id'])
-    
-    # 构造原始数据里的 key (例如 "recipe_10001")
-    raw_key = f"recipe_{rec_id}"
-    
-    # 如果在原始数据里找到了这个菜谱
-    if raw_key in raw_data:
-        # 提取 instructions
-        steps = raw_data[raw_key].get('instructions', [])
-        
-        # 【关键】新增一个字段存步骤，不要覆盖 image
-        item['metadata']['instructions'] = steps
-        count += 1
-
-# 3. 保存为新文件
-# 确保存放输出文件的目录存在
-os.makedirs(os.path.dirname(output_file_path), exist_ok=True)
-
-with open(output_file_path, 'w', encoding='utf-8') as f:
-    json.dump(rag_data, f, ensure_ascii=False, indent=4)
-
-print("-" * 30)
-print(f"✅ 合并完成！成功更新了 {count} 条数据。")
-print(f"📁 新文件已保存为: {output_file_path}")
\ No newline at end of file
+
+def merge_instructions(rag_items, raw_items, stats: dict, window: int = 1000):
+    """
+    把原始数据里的 instructions 合并进 RAG 数据 (按 "recipe_{id}" 对应)
+    两份文件由同一条流水线生成，顺序一致，所以边读边对齐即可；
+    顺序对不上的记录先暂存步骤，等 RAG 数据读到它时再取出
+    暂存最多 window 条 (超出时丢掉最早的)，原始数据里没有的菜谱最多往后找 window 条就放弃，内存不随文件大小增长
+    """
+    raw_iter = iter(raw_items)
+    pending = OrderedDict()
+    for item in rag_items:
+        # 构造原始数据里的 key (例如 "recipe_10001")，id 转成字符串以防万一
+        raw_key = f"recipe_{item['metadata']['id']}"
+
+        steps = pending.pop(raw_key, None)
+        scanned = 0
+        while steps is None and scanned < window:
+            entry = next(raw_iter, None)
+            if entry is None:
+                break
+            scanned += 1
+            key, recipe = entry
+            if key == raw_key:
+                steps = recipe.get('instructions', [])
+            else:
+                pending[key] = recipe.get('instructions', [])
+                if len(pending) > window:
+                    pending.popitem(last=False)
+
+        # 如果在原始数据里找到了这个菜谱
+        if steps is not None:
+            # 【关键】新增一个字段存步骤，不要覆盖 image
+            item['metadata']['instructions'] = steps
+            stats['merged'] += 1
+        yield item
+
+
+def main():
+    print(f"正在流式读取文件...\n1. {rag_file_path}\n2. {raw_file_path}")
+    for path in (rag_file_path, raw_file_path):
+        if not os.path.exists(path):
+            print(f"\n❌ 错误：找不到文件 - {path}")
+            print("请检查文件路径是否正确，或者脚本是否在根目录下运行。")
+            return
+
+    # 边读边合并边写出，内存里只保留当前这一条
+    stats = {'merged': 0}
+    total = write_json_array(
+        output_file_path,
+        merge_instructions(iter_json_array(rag_file_path), iter_json_object(raw_file_path), stats),
+    )
+
+    print("-" * 30)
+    print(f"✅ 合并完成！共 {total} 条，成功更新了 {stats['merged']} 条数据。")
+    print(f"📁 新文件已保存为: {output_file_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,15 @@
-import json
+import argparse
 import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+# 在项目根目录下运行 (python preprocessing_tags/convert_haodou.py)，core 包需要在导入路径里
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.json_stream import iter_json_object, write_json_object
+from tag_engine import TagEngine
 
 # ================= 配置区域 =================
 # 输入文件名 (请确保该文件在同一目录下)
@@ -7,8 +17,9 @@ INPUT_FILE = 'data/recipeData-new1.json'
 # 输出文件名
 OUTPUT_FILE = 'data/recipeData_with_tags.json'
 
-# 标签规则字典：关键词 -> 对应的 Tag
-# 你可以在这里随意添加自己的规则
+# 标签规则字典：关键词 -> 对应的 Tag，或 关键词 -> (Tag, 优先级)
+# 你可以在这里随意添加自己的规则；只要关键词出现在文本里就打上对应 Tag
+# 优先级默认都是 0；想让长词盖住它里面的短词时显式调高，例如 "豆腐": ("豆制品", 1) 后 "豆腐" 不再算 "豆"
 TAG_RULES = {
     # --- 食材类 ---
     "虾": "海鲜", "鱼": "海鲜", "蟹": "海鲜", "贝": "海鲜", "鱿": "海鲜", "海鲜": "海鲜",
@@ -34,11 +45,15 @@ TAG_RULES = {
     "清淡": "清淡"
 }
 
-def generate_tags(recipe_name, ingredients_list):
-    """根据菜名和食材列表生成标签"""
-    tags = set()
-    
-    # 1. 准备搜索文本：菜名 + 所有食材名
+# 否定 / 排除词 (可选，默认不启用)：关键词 -> 要否决的 Tag，或 -> (要否决的 Tag, 优先级)
+# 例如 "不辣": "辣味" 命中时去掉 "辣味"；"芝麻": (None, 1) 只盖住里面的 "麻"，不否决任何 Tag
+TAG_NEGATIONS = {}
+
+# 规则编译成 Aho-Corasick 自动机，进程内只构建一次；每条菜谱只扫描一遍文本，耗时和规则数量无关
+TAG_ENGINE = TagEngine(TAG_RULES, TAG_NEGATIONS)
+
+def build_search_text(recipe_name, ingredients_list):
+    """打标签用的检索文本：菜名 + 所有食材名"""
     name_str = recipe_name if recipe_name else ""
     ing_str = ""
     
@@ -52,57 +67,87 @@ def generate_tags(recipe_name, ingredients_list):
                 ing_str += item + " "
     
     # 拼接成一个大字符串方便检索
-    full_search_text = name_str + " " + ing_str
-    
-    # 2. 遍历规则进行匹配
-    for keyword, tag in TAG_RULES.items():
-        if keyword in full_search_text:
-            tags.add(tag)
-            
-    # 3. 兜底策略：如果没有匹配到任何标签，标记为"其他"或"家常菜"
-    if not tags:
-        tags.add("家常菜")
-        
-    return list(tags)
+    return name_str + " " + ing_str
+
+
+def tag_text(text):
+    """检索文本 -> 标签列表 (按规则顺序排列，同样的输入每次结果一致，下游的内容指纹才稳定)"""
+    tags = TAG_ENGINE.tags(text)
+    # 兜底策略：如果没有匹配到任何标签，标记为"其他"或"家常菜"
+    return tags or ["家常菜"]
+
+
+def generate_tags(recipe_name, ingredients_list):
+    """根据菜名和食材列表生成标签"""
+    return tag_text(build_search_text(recipe_name, ingredients_list))
+
+
+def _tag_texts(texts):
+    # 子进程里执行：模块导入时已经构建好自动机
+    return [tag_text(text) for text in texts]
+
+
+def _attach_tags(batch, tags_list):
+    for (key, recipe), tags in zip(batch, tags_list):
+        recipe['tags'] = tags
+        yield key, recipe
+
+
+def iter_tagged(pairs, workers: int = 1, batch_size: int = 2000):
+    """
+    批量打标签，逐条产出 (key, 写好 tags 的菜谱)，顺序和输入一致
+    workers > 1 时多进程并行 (0 = 使用全部 CPU 核)，只把检索文本发给子进程；
+    在途批次不超过 2 倍进程数，内存不随数据量增长
+    """
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    if workers == 1:
+        for key, recipe in pairs:
+            recipe['tags'] = generate_tags(recipe.get('recipeName', ''), recipe.get('ingredients', []))
+            yield key, recipe
+        return
+
+    pairs = iter(pairs)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        while True:
+            batch = list(islice(pairs, batch_size))
+            if not batch:
+                break
+            texts = [build_search_text(r.get('recipeName', ''), r.get('ingredients', [])) for _, r in batch]
+            pending.append((batch, pool.submit(_tag_texts, texts)))
+            if len(pending) > workers * 2:
+                batch, future = pending.popleft()
+                yield from _attach_tags(batch, future.result())
+        while pending:
+            batch, future = pending.popleft()
+            yield from _attach_tags(batch, future.result())
 
 def main():
+    parser = argparse.ArgumentParser(description="根据菜名和食材给菜谱打标签")
+    parser.add_argument("--workers", type=int, default=1, help="并行打标签的进程数，0 = 使用全部 CPU 核")
+    args = parser.parse_args()
+
     # 检查文件是否存在
     if not os.path.exists(INPUT_FILE):
         print(f"错误：找不到文件 '{INPUT_FILE}'。请确保json文件在当前脚本运行目录下。")
         return
 
-    print(f"正在读取 {INPUT_FILE} ...")
-    try:
-        with open(INPUT_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-    except Exception as e:
-        print(f"读取 JSON 失败: {e}")
-        return
+    # 流式读取 / 写出：内存里只保留在途的几批菜谱
+    def tagged_recipes():
+        # 遍历字典结构
+        for count, (key, recipe) in enumerate(iter_tagged(iter_json_object(INPUT_FILE), args.workers), 1):
+            yield key, recipe
+            if count % 1000 == 0:
+                print(f"已处理 {count} 条...")
 
-    print(f"开始处理 {len(data)} 条数据...")
-    
-    count = 0
-    # 遍历字典结构
-    for key, recipe in data.items():
-        r_name = recipe.get('recipeName', '')
-        r_ingredients = recipe.get('ingredients', [])
-        
-        # 生成并写入 tags
-        recipe['tags'] = generate_tags(r_name, r_ingredients)
-        
-        count += 1
-        if count % 1000 == 0:
-            print(f"已处理 {count} 条...")
-
-    print("处理完成，正在保存...")
-    
+    print(f"正在流式处理 {INPUT_FILE} ...")
     try:
-        with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
-            # ensure_ascii=False 保证中文不乱码
-            json.dump(data, f, ensure_ascii=False, indent=4)
-        print(f"成功！文件已保存为: {OUTPUT_FILE}")
+        count = write_json_object(OUTPUT_FILE, tagged_recipes())
     except Exception as e:
-        print(f"保存文件失败: {e}")
+        print(f"处理失败: {e}")
+        return
+    print(f"成功！共处理 {count} 条，文件已保存为: {OUTPUT_FILE}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,9 +1,14 @@
-import json
 import os
+import sys
+
+# 在项目根目录下运行 (python preprocessing_tags/data_trans_rag.py)，core 包需要在导入路径里
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.json_stream import iter_json_object, write_json_array
 
 # ================= 配置 =================
 INPUT_FILE = 'data/recipeData_with_tags.json'  # 上一步生成的文件
-OUTPUT_FILE = 'data/recipe_rag_ready.json'     # 处理好准备入库的文件
+OUTPUT_FILE = 'data/recipe_rag_ready.json'     # 处理好准备入库的文件 (改成 .jsonl 结尾则一行一条)
 
 def serialize_recipe(recipe):
     """
@@ -68,58 +73,63 @@ def serialize_recipe(recipe):
     
     return serialized_text
 
+def build_rag_doc(recipe):
+    """单个菜谱 -> RAG 标准对象 {"page_content", "metadata"}"""
+    # A. 生成用于向量化的文本 (Content)
+    text_content = serialize_recipe(recipe)
+    
+    # B. 提取用于过滤的元数据 (Metadata)
+    # 比如：用户搜“不辣的菜”，就可以用 metadata 中的 tags 过滤
+    metadata = {
+        "id": recipe.get('recipeID'),
+        "name": recipe.get('recipeName'),
+        "tags": recipe.get('tags', []),
+        # 结构化食材 / 调料名称，入库后用于忌口过滤
+        "ingredients": [i.get('name', '') for i in recipe.get('ingredients', []) or [] if isinstance(i, dict) and i.get('name')],
+        "seasonings": [str(s) for s in recipe.get('seasonings', []) or [] if s],
+        # 这里提取第一张图作为封面图，前端展示用
+        "image": "" 
+    }
+    
+    # 尝试提取图片链接
+    insts = recipe.get('instructions', [])
+    if insts and isinstance(insts[0], dict):
+        metadata['image'] = insts[0].get('imgLink', '')
+    
+    # C. 组合成 RAG 标准对象
+    entry = {
+        "page_content": text_content, # 这是喂给 AI 看的
+        "metadata": metadata          # 这是给数据库过滤用的
+    }
+    return entry
+
 def main():
     if not os.path.exists(INPUT_FILE):
         print(f"找不到 {INPUT_FILE}，请确认文件名。")
         return
 
-    print("正在读取数据...")
-    with open(INPUT_FILE, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    # 流式读取 / 写出：内存里一次只保留一条菜谱
+    sample = []
 
-    rag_docs = []
-    
-    print("正在序列化文本...")
-    count = 0
-    for key, recipe in data.items():
-        # A. 生成用于向量化的文本 (Content)
-        text_content = serialize_recipe(recipe)
-        
-        # B. 提取用于过滤的元数据 (Metadata)
-        # 比如：用户搜“不辣的菜”，就可以用 metadata 中的 tags 过滤
-        metadata = {
-            "id": recipe.get('recipeID'),
-            "name": recipe.get('recipeName'),
-            "tags": recipe.get('tags', []),
-            # 这里提取第一张图作为封面图，前端展示用
-            "image": "" 
-        }
-        
-        # 尝试提取图片链接
-        insts = recipe.get('instructions', [])
-        if insts and isinstance(insts[0], dict):
-            metadata['image'] = insts[0].get('imgLink', '')
-
-        # C. 组合成 RAG 标准对象
-        entry = {
-            "page_content": text_content, # 这是喂给 AI 看的
-            "metadata": metadata          # 这是给数据库过滤用的
-        }
-        rag_docs.append(entry)
-        count += 1
+    def rag_docs():
+        for key, recipe in iter_json_object(INPUT_FILE):
+            entry = build_rag_doc(recipe)
+            if not sample:
+                sample.append(entry)
+            yield entry
 
-    # 保存
-    with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
-        json.dump(rag_docs, f, ensure_ascii=False, indent=4)
+    print("正在序列化文本...")
+    count = write_json_array(OUTPUT_FILE, rag_docs())
 
     print(f"成功转换 {count} 条数据！")
     print(f"文件已保存为: {OUTPUT_FILE}")
-    
+
     # 打印一个示例给用户看
-    print("\n====== [示例] 序列化后的文本内容 ======")
-    print(rag_docs[0]['page_content'])
-    print("\n====== [示例] 提取的 Metadata ======")
-    print(rag_docs[0]['metadata'])
+    if sample:
+        print("\n====== [示例] 序列化后的文本内容 ======")
+        print(sample[0]['page_content'])
+        print("\n====== [示例] 提取的 Metadata ======")
+        print(sample[0]['metadata'])
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,155 @@
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import sys
+import time
+from contextlib import ExitStack
+
+# 在项目根目录下运行 (python preprocessing_tags/pipeline.py)，core 包需要在导入路径里
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tag_engine
+from convert_haodou import TAG_RULES, TAG_NEGATIONS, build_search_text, tag_text, iter_tagged
+from data_trans_rag import serialize_recipe, build_rag_doc
+from core.config import INGEST_SOURCE_FILE
+from core.json_stream import JsonArrayWriter, iter_json_object
+
+# ================= 配置 =================
+INPUT_FILE = 'data/recipeData-new1.json'   # 原始菜谱数据 {"recipe_<id>": {...}, ...}
+OUTPUT_FILE = INGEST_SOURCE_FILE           # 入库源文件 (.jsonl 结尾则一行一条)
+
+
+def file_hash(path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def code_fingerprint() -> str:
+    """打标签规则 + 各步转换代码的源码指纹：规则或逻辑改了，即使输入没变也要重跑"""
+    parts = [
+        json.dumps([TAG_RULES, TAG_NEGATIONS], ensure_ascii=False, sort_keys=True),
+        inspect.getsource(tag_engine),
+    ]
+    parts.extend(
+        inspect.getsource(func)
+        for func in (build_search_text, tag_text, serialize_recipe, build_rag_doc, process_recipe)
+    )
+    return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+
+
+def process_recipe(key: str, recipe: dict) -> tuple:
+    """
+    已打好标签的菜谱在内存里走完后两步：序列化成 RAG 文档 -> 合并做法步骤
+    返回 (打好标签的原始菜谱, 不含步骤的 RAG 文档, 入库用的最终文档)
+    """
+    rag_doc = build_rag_doc(recipe)
+    # 步骤直接取自同一条原始记录，不用再按 "recipe_{id}" 回查整份原始文件
+    final_doc = {
+        "page_content": rag_doc['page_content'],
+        "metadata": dict(rag_doc['metadata'], instructions=recipe.get('instructions', [])),
+    }
+    return recipe, rag_doc, final_doc
+
+
+def _manifest_path(output_file: str) -> str:
+    return f"{output_file}.manifest.json"
+
+
+def _output_state(path: str) -> list:
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _load_manifest(output_file: str) -> dict:
+    try:
+        with open(_manifest_path(output_file), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def is_up_to_date(manifest: dict, input_hash: str, fingerprint: str, outputs: list) -> bool:
+    """输入内容和转换逻辑都没变，且这次要的每个产物都还是上次写出的那份"""
+    if manifest.get('input_hash') != input_hash or manifest.get('code') != fingerprint:
+        return False
+    recorded = manifest.get('outputs', {})
+    return all(os.path.exists(path) and recorded.get(path) == _output_state(path) for path in outputs)
+
+
+def run_pipeline(input_file: str = INPUT_FILE, output_file: str = OUTPUT_FILE,
+                 tagged_file: str = None, rag_file: str = None, force: bool = False, workers: int = 1) -> bool:
+    """
+    流式单遍预处理：原始数据读一遍，打标签 (workers > 1 时多进程并行) 后每条菜谱在内存里走完其余步骤，直接写出
+    中间产物 (打标签后的原始数据 / 不含步骤的 RAG 文档) 只在指定路径时才写；
+    所有产物的格式都由扩展名决定：.jsonl 一行一条，其余写成 JSON 数组 (每个元素占一行)
+    输入和转换逻辑都没变时整体跳过；下游 ingest 还会按单条菜谱的内容指纹跳过没变的记录
+    返回是否真的重新生成了产物
+    """
+    if not os.path.exists(input_file):
+        print(f"❌ 找不到原始数据 {input_file}，请确认在项目根目录下运行。")
+        return False
+
+    outputs = [path for path in (output_file, tagged_file, rag_file) if path]
+    input_hash = file_hash(input_file)
+    fingerprint = code_fingerprint()
+    if not force and is_up_to_date(_load_manifest(output_file), input_hash, fingerprint, outputs):
+        print(f"⏭️ 输入和处理逻辑都没有变化，跳过预处理: {output_file}")
+        return False
+
+    print(f"🚀 开始预处理: {input_file} -> {output_file}")
+    started = time.time()
+    with ExitStack() as stack:
+        final_writer = stack.enter_context(JsonArrayWriter(output_file))
+        tagged_writer = stack.enter_context(JsonArrayWriter(tagged_file)) if tagged_file else None
+        rag_writer = stack.enter_context(JsonArrayWriter(rag_file)) if rag_file else None
+
+        for key, recipe in iter_tagged(iter_json_object(input_file), workers):
+            tagged, rag_doc, final_doc = process_recipe(key, recipe)
+            final_writer.write(final_doc)
+            if tagged_writer is not None:
+                tagged_writer.write({"key": key, "recipe": tagged})
+            if rag_writer is not None:
+                rag_writer.write(rag_doc)
+
+            if final_writer.count % 1000 == 0:
+                elapsed = max(time.time() - started, 1e-6)
+                print(f"⏳ 已处理 {final_writer.count} 条，{final_writer.count / elapsed:.0f} 条/秒")
+
+    manifest = {
+        'input_file': input_file,
+        'input_hash': input_hash,
+        'code': fingerprint,
+        'outputs': {path: _output_state(path) for path in outputs},
+        'count': final_writer.count,
+        'created_at': time.time(),
+    }
+    with open(_manifest_path(output_file), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    elapsed = max(time.time() - started, 1e-6)
+    print(f"✅ 预处理完成：{final_writer.count} 条，用时 {elapsed:.1f} 秒")
+    for path in outputs:
+        print(f"📁 {path}")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="菜谱预处理流水线 (打标签 + 序列化 + 合并步骤，一遍完成)")
+    parser.add_argument("--input", default=INPUT_FILE, help="原始菜谱数据 (JSON 对象)")
+    parser.add_argument("--output", default=OUTPUT_FILE, help="入库源文件 (.json / .jsonl)")
+    parser.add_argument("--tagged", help="可选：另存打好标签的原始数据 (.jsonl 一行一条，否则 JSON 数组)")
+    parser.add_argument("--rag", help="可选：另存不含步骤的 RAG 文档 (.jsonl 一行一条，否则 JSON 数组)")
+    parser.add_argument("--force", action="store_true", help="忽略缓存，强制重新生成")
+    parser.add_argument("--workers", type=int, default=1, help="并行打标签的进程数，0 = 使用全部 CPU 核")
+    args = parser.parse_args()
+    run_pipeline(args.input, args.output, tagged_file=args.tagged, rag_file=args.rag, force=args.force,
+                 workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
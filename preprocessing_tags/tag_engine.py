@@ -0,0 +1,110 @@
+from collections import deque
+
+
+class AhoCorasick:
+    """
+    多模式匹配自动机：构建一次，之后每段文本只扫描一遍就能找出所有关键词的出现位置
+    匹配耗时和文本长度、命中数成正比，和关键词数量无关
+    """
+
+    def __init__(self, patterns: list):
+        self.patterns = list(patterns)
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [()]
+
+        for pattern_id, pattern in enumerate(self.patterns):
+            state = 0
+            for char in pattern:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append(())
+                state = next_state
+            self._output[state] += (pattern_id,)
+
+        # BFS 建失败指针，输出集合沿失败指针合并 ("土豆" 的终点同时输出 "豆")
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] += self._output[self._fail[next_state]]
+
+    def iter_matches(self, text: str):
+        """产出 (起始下标, 结束下标, 关键词编号)，结束下标不含"""
+        goto, fail, output, patterns = self._goto, self._fail, self._output, self.patterns
+        state = 0
+        for end, char in enumerate(text, 1):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for pattern_id in output[state]:
+                yield end - len(patterns[pattern_id]), end, pattern_id
+
+
+def _has_priority(negation) -> bool:
+    # (要否决的标签, 优先级)；否则整个值就是要否决的标签 (单个 / 元组 / None)
+    return isinstance(negation, tuple) and len(negation) == 2 and isinstance(negation[1], int)
+
+
+class TagEngine:
+    """
+    基于 Aho-Corasick 的规则打标签，默认结果和逐条规则做子串判断完全一致 (每条命中都算)
+    - rules: 关键词 -> 标签，或 关键词 -> (标签, 优先级)；优先级默认 0
+    - negations: 否定 / 排除词 -> 要否决的标签 (None 表示不否决任何标签)，或 -> (要否决的标签, 优先级)
+    以下行为都要按规则显式开启：
+    - 给规则设了更高的优先级，它的命中片段完整覆盖的低优先级命中作废 ("水煮": ("麻辣", 1) 盖住 "煮")
+    - 否定词命中时否决对应标签；设了优先级的否定词还会盖住里面的短词 ("芝麻": (None, 1) 盖住 "麻")
+    """
+
+    def __init__(self, rules: dict, negations: dict = None):
+        patterns, self._tags, self._priorities, self._vetoes = [], [], [], []
+        self._rank = {}
+        for keyword, rule in rules.items():
+            tag, priority = rule if isinstance(rule, tuple) else (rule, 0)
+            self._rank.setdefault(tag, len(self._rank))
+            patterns.append(keyword)
+            self._tags.append(tag)
+            self._priorities.append(priority)
+            self._vetoes.append(())
+        for keyword, negation in (negations or {}).items():
+            vetoed, priority = negation if _has_priority(negation) else (negation, 0)
+            if isinstance(vetoed, str):
+                vetoed = (vetoed,)
+            patterns.append(keyword)
+            self._tags.append(None)
+            self._priorities.append(priority)
+            self._vetoes.append(tuple(vetoed or ()))
+        self._automaton = AhoCorasick(patterns)
+
+        # 只有本身是更高优先级关键词子串的规则才可能被盖住，其余命中直接保留，不用逐个比较
+        # 把每个关键词当作文本跑一遍自动机，就能找出它包含的所有关键词
+        self._dominated = [False] * len(patterns)
+        for outer, keyword in enumerate(patterns):
+            for _, _, inner in self._automaton.iter_matches(keyword):
+                if inner != outer and self._priorities[outer] > self._priorities[inner]:
+                    self._dominated[inner] = True
+
+    def tags(self, text: str) -> list:
+        """文本命中的标签，按规则表里第一次出现的顺序排列 (结果稳定，下游内容指纹不抖动)"""
+        priorities = self._priorities
+        matches = list(self._automaton.iter_matches(text))
+        tags, vetoed = set(), set()
+        for start, end, pattern_id in matches:
+            # 被盖住的判断对所有命中做即可：盖住它的命中自己也被盖住时，外层那个同样盖住它
+            if self._dominated[pattern_id] and any(
+                s <= start and end <= e and priorities[p] > priorities[pattern_id] for s, e, p in matches
+            ):
+                continue
+            if self._tags[pattern_id] is not None:
+                tags.add(self._tags[pattern_id])
+            vetoed.update(self._vetoes[pattern_id])
+        return sorted(tags - vetoed, key=self._rank.__getitem__)
@@ -0,0 +1,26 @@
+"""
+ONNX 后端与 torch 版的向量一致性 (python -m core.embeddings --parity 的自动化版本)
+torch / onnxruntime / 导出的模型缺一样就跳过：先 pip install ".[onnx]"，再 python -m core.embeddings --export
+"""
+import importlib.util
+import os
+
+import pytest
+
+from core.config import EMBEDDING_ONNX_DIR
+from core.embeddings import ONNX_CONFIG_FILE, check_parity
+
+_MISSING = [m for m in ("torch", "langchain_huggingface", "onnxruntime", "tokenizers") if not importlib.util.find_spec(m)]
+
+pytestmark = [
+    pytest.mark.skipif(bool(_MISSING), reason=f"缺少 {', '.join(_MISSING)}"),
+    pytest.mark.skipif(not os.path.exists(os.path.join(EMBEDDING_ONNX_DIR, ONNX_CONFIG_FILE)),
+                       reason=f"还没有导出 ONNX 模型 ({EMBEDDING_ONNX_DIR})"),
+]
+
+
+def test_onnx_matches_torch():
+    result = check_parity(sample_size=8, min_cosine=0.98, top_k=5)
+    if result is None:
+        pytest.skip("ONNX FP32 / INT8 模型都无法加载")
+    assert result, "ONNX 向量与 torch 版不一致 (最低余弦低于 0.98)，详见上方输出"
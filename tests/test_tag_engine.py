@@ -0,0 +1,67 @@
+"""
+Aho-Corasick 打标签与原来逐条规则做子串判断的结果一致 (默认不启用覆盖 / 否定)
+有原始数据 (data/recipeData-new1.json) 时再抽样核对真实菜谱
+"""
+import os
+import random
+import sys
+from itertools import islice
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "preprocessing_tags"))
+
+from convert_haodou import INPUT_FILE, TAG_RULES, build_search_text, generate_tags  # noqa: E402
+from tag_engine import TagEngine  # noqa: E402
+
+
+def substring_tags(recipe_name, ingredients_list):
+    """旧实现：逐条规则做子串判断，没有命中时打 "家常菜" """
+    text = build_search_text(recipe_name, ingredients_list)
+    tags = {tag for keyword, tag in TAG_RULES.items() if keyword in text}
+    return tags or {"家常菜"}
+
+
+SAMPLES = [
+    ("麻婆豆腐", ["豆腐", "牛肉末", "豆瓣酱", "花椒"]),
+    ("香干炒肉", ["豆干", "五花肉", "青椒"]),
+    ("水煮鱼", ["草鱼", "辣椒", "花椒"]),
+    ("鸡蛋羹", ["鸡蛋", "鸡精"]),
+    ("不辣的辣椒炒肉", ["辣椒", "猪肉"]),
+    ("芝麻酱拌面", ["芝麻酱", "面条", "麻油"]),
+    ("无糖酸奶", ["酸奶"]),
+    ("清水", []),
+]
+
+
+@pytest.mark.parametrize("name, ingredients", SAMPLES)
+def test_matches_substring_scan(name, ingredients):
+    assert set(generate_tags(name, ingredients)) == substring_tags(name, ingredients)
+
+
+def test_random_texts_match_substring_scan():
+    alphabet = "".join(TAG_RULES) + "的和不无芝精酱油"
+    rng = random.Random(0)
+    for _ in range(2000):
+        name = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 12)))
+        assert set(generate_tags(name, [])) == substring_tags(name, [])
+
+
+def test_opt_in_priority_and_negation():
+    engine = TagEngine(
+        {"豆": "蔬菜", "豆腐": ("豆制品", 1), "辣": "辣味", "麻": "麻辣"},
+        {"不辣": "辣味", "芝麻": (None, 1)},
+    )
+    assert engine.tags("豆腐") == ["豆制品"]
+    assert engine.tags("豆腐 豆角") == ["蔬菜", "豆制品"]
+    assert engine.tags("不辣") == []
+    assert engine.tags("芝麻") == []
+
+
+@pytest.mark.skipif(not os.path.exists(INPUT_FILE), reason=f"没有原始数据 {INPUT_FILE}")
+def test_catalog_sample_unchanged():
+    from core.json_stream import iter_json_object
+
+    for _, recipe in islice(iter_json_object(INPUT_FILE), 2000):
+        name, ingredients = recipe.get("recipeName", ""), recipe.get("ingredients", [])
+        assert set(generate_tags(name, ingredients)) == substring_tags(name, ingredients)